@@ -4,6 +4,8 @@ from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import User, Post, Comment, Like, Follower, Repost
 from auth import hash_password
+from counters import reconcile_counters
+from timeline import rebuild_timelines
 import random
 
 def add_realistic_engagement():
@@ -132,10 +134,9 @@ def add_realistic_engagement():
     print("\nAdding reposts...")
     repost_count = 0
     for post in popular_posts:
-        # Each popular post gets 50-100 reposts
+        # Each popular post gets 50-100 reposts (at most one per user)
         num_reposts = random.randint(50, 100)
-        for i in range(num_reposts):
-            user = random.choice(users)
+        for user in random.sample(users, min(num_reposts, len(users))):
             existing = db.query(Repost).filter(
                 Repost.user_id == user.id,
                 Repost.post_id == post.id
@@ -147,6 +148,11 @@ def add_realistic_engagement():
     db.commit()
     print(f"Added {repost_count} reposts")
     
+    # Rows above were inserted directly - bring counters and timelines in line
+    drift = reconcile_counters(db)
+    print(f"Reconciled {len(drift)} engagement counters")
+    rebuild_timelines(db)
+    
     db.close()
     
     print("\n✅ Realistic engagement added!")
@@ -0,0 +1,166 @@
+# Async versions of the hot read routes, used when TECHTALK_ASYNC=1
+#
+# main.py registers this router ahead of its own handlers, so these take over
+# the same paths. Each route runs the existing sync query helpers through
+# AsyncSession.run_sync and builds the response models inside that call, so
+# any lazy load happens on the sync side. Writes stay on the sync handlers.
+# Routes served from the response cache (/feed/public, /users/{user_id}/posts,
+# /posts/{post_id}/comments, /users/{user_id}) have no async version - a hit
+# costs no SQL, and the cache lives on the sync path. ETag handling matches
+# the sync routes.
+# Mind route order: a path here shadows anything main.py declares for it,
+# e.g. adding /users/{user_id} would swallow /users/suggested.
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy import and_, or_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from database import get_async_db, dispose_async_engine
+from models import User, Post, Notification, Message
+from schemas import (
+    UserResponse, PostResponse, NotificationResponse,
+    MessageResponse, ConversationResponse
+)
+from auth import get_current_user_async
+from engagement import post_query, hydrate_posts, hydrate_post
+from etags import ETAG_HEADER, make_etag, etag_matches, not_modified, post_etag
+from pagination import next_cursor, set_next_cursor
+from conversations import conversation_page
+from chat import mark_thread_read
+import timeline
+
+router = APIRouter()
+
+@router.on_event("shutdown")
+async def shutdown_async_engine():
+    await dispose_async_engine()
+
+def _dump(schema, rows):
+    return [schema.model_validate(row) for row in rows]
+
+@router.get("/profile", response_model=UserResponse)
+async def get_profile(
+    response: Response,
+    current_user: User = Depends(get_current_user_async),
+    if_none_match: Optional[str] = Header(None)
+):
+    etag = make_etag("user", current_user.id, current_user.version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers[ETAG_HEADER] = etag
+    return current_user
+
+@router.get("/feed", response_model=List[PostResponse])
+async def get_feed(
+    response: Response,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50
+):
+    def load(session):
+        posts = timeline.read_timeline(session, current_user.id, cursor, skip, limit)
+        return _dump(PostResponse, hydrate_posts(session, posts, current_user.id)), next_cursor(posts, limit)
+
+    posts, cursor = await db.run_sync(load)
+    set_next_cursor(response, cursor)
+    return posts
+
+@router.get("/posts/{post_id}", response_model=PostResponse)
+async def get_post(
+    post_id: int,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
+    if_none_match: Optional[str] = Header(None)
+):
+    def load(session):
+        etag = post_etag(session, post_id, current_user.id)
+        if not etag or etag_matches(if_none_match, etag):
+            return etag, None
+        post = post_query(session).filter(Post.id == post_id).first()
+        if not post:
+            return None, None
+        return etag, PostResponse.model_validate(hydrate_post(session, post, current_user.id))
+
+    etag, post = await db.run_sync(load)
+    if not etag:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if post is None:
+        return not_modified(etag)
+    response.headers[ETAG_HEADER] = etag
+    return post
+
+@router.get("/notifications", response_model=List[NotificationResponse])
+async def get_notifications(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    def load(session):
+        notifications = session.query(Notification).filter(
+            Notification.user_id == current_user.id
+        ).order_by(Notification.timestamp.desc()).limit(50).all()
+        return _dump(NotificationResponse, notifications)
+
+    return await db.run_sync(load)
+
+@router.get("/notifications/unread-count")
+async def get_unread_count(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    count = await db.scalar(
+        select(func.count(Notification.id)).where(
+            Notification.user_id == current_user.id,
+            Notification.read == False
+        )
+    )
+    return {"unread_count": count}
+
+@router.get("/messages/conversations", response_model=List[ConversationResponse])
+async def get_conversations(
+    response: Response,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50
+):
+    def load(session):
+        rows = conversation_page(session, current_user.id, cursor, skip, limit)
+        conversations = [
+            ConversationResponse(
+                user=UserResponse.model_validate(row.partner),
+                last_message=row.last_message,
+                last_message_time=row.last_message_time,
+                unread_count=row.unread_count
+            )
+            for row in rows
+        ]
+        return conversations, next_cursor(rows, limit, "last_message_time")
+
+    conversations, cursor = await db.run_sync(load)
+    set_next_cursor(response, cursor)
+    return conversations
+
+@router.get("/messages/{user_id}", response_model=List[MessageResponse])
+async def get_messages(
+    user_id: int,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+    after_id: Optional[int] = None
+):
+    def load(session):
+        query = session.query(Message).filter(
+            or_(
+                and_(Message.sender_id == current_user.id, Message.receiver_id == user_id),
+                and_(Message.sender_id == user_id, Message.receiver_id == current_user.id)
+            )
+        )
+        if after_id is not None:
+            query = query.filter(Message.id > after_id)
+        mark_thread_read(session, current_user.id, user_id)
+        return _dump(MessageResponse, query.order_by(Message.timestamp.asc()).all())
+
+    return await db.run_sync(load)
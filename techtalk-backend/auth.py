@@ -1,25 +1,33 @@
 # Authentication utilities - JWT tokens and password hashing
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.orm.session import make_transient_to_detached
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import ReadSessionLocal, get_read_db, get_async_db
 from models import User
+from hashing import hash_password, verify_password
 
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-security = HTTPBearer()
+# Principal cache - authenticated users by id, so identity lookups skip the database
+PRINCIPAL_CACHE_TTL = float(os.getenv("TECHTALK_PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("TECHTALK_PRINCIPAL_CACHE_SIZE", "10000"))
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+# Operators allowed on /admin routes and to request profiles, comma-separated usernames
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("TECHTALK_ADMIN_USERS", "").split(",") if name.strip()}
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -31,30 +39,176 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    token = credentials.credentials
-    credentials_exception = HTTPException(
+# Bounded LRU of user column snapshots with a TTL. Each request gets its own
+# detached User built from the snapshot, so handlers can read it freely or
+# db.add() it back to write. Anything that changes a user row the app serves
+# from current_user must call invalidate_principal(user_id).
+#
+# A load that read the row before an invalidation must not be stored after
+# it, so loads take begin_load() first and pass it to put(). Invalidations are
+# numbered from a clock; the newest max_size are kept per user, and loads
+# older than the last one forgotten are never stored.
+class PrincipalCache:
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._invalidated_at = OrderedDict()
+        self._forgotten_at = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: int):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < now:
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            values = entry[1]
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    # Call before reading the user row; pass the result to put()
+    def begin_load(self) -> int:
+        with self._lock:
+            return self._epoch
+
+    def put(self, user: User, started: int):
+        values = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            if started < self._forgotten_at or self._invalidated_at.get(user.id, 0) > started:
+                return  # invalidated while loading
+            self._entries[user.id] = (expires, values)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._epoch += 1
+            self._entries.pop(user_id, None)
+            self._invalidated_at[user_id] = self._epoch
+            self._invalidated_at.move_to_end(user_id)
+            while len(self._invalidated_at) > self.max_size:
+                self._forgotten_at = self._invalidated_at.popitem(last=False)[1]
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._invalidated_at.clear()
+            self._forgotten_at = self._epoch
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL, PRINCIPAL_CACHE_SIZE)
+
+def invalidate_principal(user_id: int):
+    principal_cache.invalidate(user_id)
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
     )
+
+def _user_id_from_token(token: str) -> int:
+    credentials_exception = _credentials_exception()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id_str = payload.get("sub")
         if user_id_str is None:
             raise credentials_exception
-        user_id = int(user_id_str)  # Convert string back to int
+        return int(user_id_str)  # Convert string back to int
     except JWTError as e:
         print(f"JWT decode error: {e}")
         raise credentials_exception
     except Exception as e:
         print(f"Unexpected error: {e}")
         raise credentials_exception
+
+def _load_principal(db: Session, user_id: int) -> User:
+    user = principal_cache.get(user_id)
+    if user is not None:
+        return user
     
+    started = principal_cache.begin_load()
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         print(f"User {user_id} not found in database")
-        raise credentials_exception
+        raise _credentials_exception()
+    principal_cache.put(user, started)
+    # Loaded on the read session - detach so write routes can db.add() it
+    db.expunge(user)
+    return user
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_read_db)
+) -> User:
+    return _load_principal(db, _user_id_from_token(credentials.credentials))
+
+def is_admin(user: User) -> bool:
+    return user.username in ADMIN_USERNAMES
+
+def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    if not is_admin(current_user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+# For EventSource/WebSocket clients, which cannot set headers: the bearer
+# token may also come as ?token=
+def get_stream_user(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_read_db)
+) -> User:
+    raw_token = credentials.credentials if credentials else token
+    if not raw_token:
+        raise _credentials_exception()
+    return _load_principal(db, _user_id_from_token(raw_token))
+
+# Resolve a raw bearer token outside of a request (WebSocket handshakes)
+def authenticate_token(token: str) -> User:
+    if not token:
+        raise _credentials_exception()
+    db = ReadSessionLocal()
+    try:
+        return _load_principal(db, _user_id_from_token(token))
+    finally:
+        db.close()
+
+# Same as get_current_user, for the async routes
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    user_id = _user_id_from_token(credentials.credentials)
+    user = principal_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    started = principal_cache.begin_load()
+    user = await db.get(User, user_id)
+    if user is None:
+        print(f"User {user_id} not found in database")
+        raise _credentials_exception()
+    principal_cache.put(user, started)
     return user
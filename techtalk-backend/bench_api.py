@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# Endpoint benchmark - mixed workload against the in-process app, with baselines
+#
+# Runs the FastAPI app in this process (through httpx's ASGI transport, no
+# sockets) on a copy of a generated dataset (generate_dataset.py) and has
+# virtual users scroll feeds, open posts, like, comment, message and poll
+# notifications concurrently. Reports p50/p95/p99 latency, throughput and SQL
+# queries per request for every route.
+#
+# --save writes the results as a JSON baseline; later runs compare against it
+# and exit non-zero when a route got slower than --threshold allows or runs
+# more queries per request than before (an N+1 creeping into main.py).
+#
+#   python bench_api.py --db /tmp/techtalk-100k.db --seconds 30 --concurrency 32
+#   python bench_api.py --save                  # generates a small dataset first
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_db import copy_database
+from instrumentation import SERVER_TIMING_HEADER, queries_from_header
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# Scenario -> weight; each virtual user picks one per iteration
+WORKLOAD = {
+    "scroll_feed": 30,
+    "scroll_public_feed": 10,
+    "open_post": 20,
+    "visit_profile": 8,
+    "like": 12,
+    "comment": 5,
+    "message": 5,
+    "poll_notifications": 10,
+}
+
+# p95 slack below which a slowdown is noise, in ms
+MIN_REGRESSION_MS = 5.0
+# Extra queries per request tolerated before a route counts as regressed
+QUERY_SLACK = 0.5
+
+def percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def summarize(samples, seconds: float):
+    routes = {}
+    for route, entries in sorted(samples.items()):
+        latencies = [ms for ms, _, _ in entries]
+        routes[route] = {
+            "requests": len(entries),
+            "errors": sum(1 for _, status, _ in entries if status >= 500),
+            "rps": round(len(entries) / seconds, 1),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "queries": round(sum(queries for _, _, queries in entries) / len(entries), 2),
+        }
+    return routes
+
+# Regressions of `current` against `baseline`, as printable lines
+def compare(baseline: dict, current: dict, threshold: float):
+    problems = []
+    for route, before in baseline["routes"].items():
+        now = current["routes"].get(route)
+        if now is None:
+            continue
+        if now["queries"] > before["queries"] + QUERY_SLACK:
+            problems.append(f"{route}: {now['queries']:g} queries/request, baseline {before['queries']:g}")
+        limit = before["p95_ms"] * (1 + threshold)
+        if now["p95_ms"] > limit and now["p95_ms"] - before["p95_ms"] > MIN_REGRESSION_MS:
+            problems.append(f"{route}: p95 {now['p95_ms']:.1f}ms, baseline {before['p95_ms']:.1f}ms (+{threshold:.0%} allowed)")
+        if now["errors"] > before["errors"]:
+            problems.append(f"{route}: {now['errors']} server errors, baseline {before['errors']}")
+    return problems
+
+class VirtualUser:
+    def __init__(self, client, number: int, seed: int, user_count: int, post_count: int, samples):
+        from auth import create_access_token
+        self.client = client
+        self.rng = random.Random(seed * 100003 + number)
+        self.user_count = user_count
+        self.post_count = post_count
+        self.user_id = self.rng.randint(1, user_count)
+        self.headers = {"Authorization": f"Bearer {create_access_token({'sub': self.user_id})}"}
+        self.samples = samples
+        self.recording = False
+
+    async def request(self, route: str, method: str, url: str, auth=True, **kwargs):
+        started = time.perf_counter()
+        response = await self.client.request(method, url, headers=self.headers if auth else None, **kwargs)
+        if self.recording:
+            elapsed = (time.perf_counter() - started) * 1000
+            queries = queries_from_header(response.headers.get(SERVER_TIMING_HEADER)) or 0
+            self.samples.setdefault(f"{method} {route}", []).append((elapsed, response.status_code, queries))
+        return response
+
+    def _post_id(self):
+        return self.rng.randint(1, self.post_count)
+
+    def _other_user(self):
+        other = self.rng.randint(1, self.user_count)
+        return other if other != self.user_id else other % self.user_count + 1
+
+    async def scroll_feed(self):
+        cursor = None
+        for _ in range(3):
+            response = await self.request("/feed", "GET", "/feed", params={"limit": 20, **({"cursor": cursor} if cursor else {})})
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+
+    async def scroll_public_feed(self):
+        cursor = None
+        for _ in range(2):
+            response = await self.request("/feed/public", "GET", "/feed/public", auth=False,
+                                          params={"limit": 20, **({"cursor": cursor} if cursor else {})})
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+
+    async def open_post(self):
+        post_id = self._post_id()
+        await self.request("/posts/{post_id}", "GET", f"/posts/{post_id}")
+        await self.request("/posts/{post_id}/comments", "GET", f"/posts/{post_id}/comments", auth=False)
+
+    async def visit_profile(self):
+        user_id = self._other_user()
+        await self.request("/users/{user_id}", "GET", f"/users/{user_id}", auth=False)
+        await self.request("/users/{user_id}/posts", "GET", f"/users/{user_id}/posts", auth=False)
+
+    async def like(self):
+        post_id = self._post_id()
+        await self.request("/posts/{post_id}/likes", "POST", f"/posts/{post_id}/likes")
+        if self.rng.random() < 0.3:
+            await self.request("/posts/{post_id}/likes", "DELETE", f"/posts/{post_id}/likes")
+
+    async def comment(self):
+        post_id = self._post_id()
+        await self.request("/posts/{post_id}/comments", "POST", f"/posts/{post_id}/comments",
+                           json={"content": "Benchmark comment"})
+
+    async def message(self):
+        partner = self._other_user()
+        sent = await self.request("/messages", "POST", "/messages", json={"receiver_id": partner, "content": "Benchmark message"})
+        after_id = sent.json().get("id", 0) - 1 if sent.status_code == 200 else 0
+        await self.request("/messages/{user_id}", "GET", f"/messages/{partner}", params={"after_id": after_id})
+        await self.request("/messages/conversations", "GET", "/messages/conversations")
+
+    async def poll_notifications(self):
+        await self.request("/notifications/unread-count", "GET", "/notifications/unread-count")
+        if self.rng.random() < 0.3:
+            await self.request("/notifications", "GET", "/notifications")
+
+    async def run(self, warmup_until: float, stop_at: float):
+        scenarios = list(WORKLOAD)
+        weights = [WORKLOAD[name] for name in scenarios]
+        while time.monotonic() < stop_at:
+            self.recording = time.monotonic() >= warmup_until
+            await getattr(self, self.rng.choices(scenarios, weights)[0])()
+
+async def run_workload(args):
+    import httpx
+    from sqlalchemy import func
+    import database
+    from main import app
+    from models import Post, User
+
+    await app.router.startup()
+    try:
+        db = database.ReadSessionLocal()
+        try:
+            user_count = db.query(func.max(User.id)).scalar() or 0
+            post_count = db.query(func.max(Post.id)).scalar() or 0
+        finally:
+            db.close()
+        if not user_count or not post_count:
+            raise SystemExit("❌ The dataset has no users or posts")
+
+        samples = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            users = [VirtualUser(client, number, args.seed, user_count, post_count, samples) for number in range(args.concurrency)]
+            warmup_until = time.monotonic() + args.warmup
+            stop_at = warmup_until + args.seconds
+            await asyncio.gather(*(user.run(warmup_until, stop_at) for user in users))
+        return samples, user_count, post_count
+    finally:
+        await app.router.shutdown()
+
+# Runs in a child process with TECHTALK_DATABASE_URL already pointing at the copy
+def run_child(args):
+    samples, user_count, post_count = asyncio.run(run_workload(args))
+    routes = summarize(samples, args.seconds)
+    total = sum(route["requests"] for route in routes.values())
+    print(json.dumps({
+        "meta": {
+            "users": user_count, "posts": post_count, "seconds": args.seconds,
+            "concurrency": args.concurrency, "seed": args.seed,
+            "total_rps": round(total / args.seconds, 1),
+        },
+        "routes": routes,
+    }))
+
+def prepare_dataset(args, workdir: str) -> str:
+    copy = os.path.join(workdir, "bench.db")
+    if args.db:
+        copy_database(args.db, copy)
+        return copy
+    print(f"Generating a {args.users}-user dataset (pass --db to reuse one)...")
+    subprocess.run(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "generate_dataset.py"),
+         "--db", copy, "--users", str(args.users), "--seed", str(args.seed)],
+        check=True, stdout=subprocess.DEVNULL,
+    )
+    return copy
+
+def print_results(result: dict):
+    meta = result["meta"]
+    print(f"\n{meta['users']} users / {meta['posts']} posts, {meta['concurrency']} virtual users, "
+          f"{meta['seconds']:g}s: {meta['total_rps']} requests/s\n")
+    print(f"{'route':42} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'5xx':>5}")
+    for route, r in result["routes"].items():
+        print(f"{route:42} {r['rps']:7.1f} {r['p50_ms']:6.1f}ms {r['p95_ms']:6.1f}ms {r['p99_ms']:6.1f}ms "
+              f"{r['queries']:8.2f} {r['errors']:5d}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed-workload endpoint benchmark with regression gates")
+    parser.add_argument("--db", help="generated dataset to copy (default: generate one)")
+    parser.add_argument("--users", type=int, default=2000, help="dataset size when generating")
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.5, help="allowed p95 slowdown per route (0.5 = 50%%)")
+    parser.add_argument("--run-child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_child:
+        run_child(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="techtalk-bench-")
+    try:
+        copy = prepare_dataset(args, workdir)
+        env = dict(os.environ, TECHTALK_DATABASE_URL=f"sqlite:///{copy}")
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-child", "--seconds", str(args.seconds),
+             "--warmup", str(args.warmup), "--concurrency", str(args.concurrency), "--seed", str(args.seed)],
+            env=env, capture_output=True, text=True,
+        )
+        if child.returncode:
+            sys.stderr.write(child.stderr)
+            sys.exit(child.returncode)
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(result)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"\n✅ Saved baseline to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline} - run with --save to create one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    setup = ("users", "posts", "concurrency")
+    if any(baseline["meta"].get(key) != result["meta"][key] for key in setup):
+        print("\nWarning: the baseline was recorded with " + ", ".join(f"{key}={baseline['meta'].get(key)}" for key in setup)
+              + " - latencies are not comparable")
+    problems = compare(baseline, result, args.threshold)
+    if problems:
+        print(f"\n❌ {len(problems)} regressions against {args.baseline}:")
+        for problem in problems:
+            print(f"   {problem}")
+        sys.exit(1)
+    print(f"\n✅ No regressions against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
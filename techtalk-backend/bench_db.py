@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# Concurrent read/write throughput per SQLite connection profile
+#
+# Copies the database once per profile (the original is never touched), then
+# runs reader threads paging the public feed on the read engine against writer
+# threads liking/unliking posts on the write engine, and reports throughput,
+# p95 latency and "database is locked" failures.
+#
+#   python bench_db.py [--db techtalk.db] [--seconds 10] [--readers 8] [--writers 4]
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = ["legacy", "production"]
+
+# Copy through SQLite's backup API - a plain file copy misses rows still in
+# the -wal file of a WAL-mode database
+def copy_database(source: str, target: str):
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+def _p95(samples):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[int(len(samples) * 0.95) - 1] * 1000
+
+# Runs inside a child process, with the profile already selected via env
+def run_profile(seconds: float, readers: int, writers: int):
+    from sqlalchemy.exc import OperationalError
+    from database import SessionLocal, ReadSessionLocal, init_db
+    from engagement import post_query
+    from models import Like, Post, User
+    from pagination import paginate_desc
+
+    init_db()
+    db = SessionLocal()
+    user_ids = [row[0] for row in db.query(User.id)]
+    post_ids = [row[0] for row in db.query(Post.id)]
+    db.close()
+
+    stop = time.monotonic() + seconds
+    lock = threading.Lock()
+    stats = {"reads": [], "writes": [], "read_errors": 0, "write_errors": 0}
+
+    def reader():
+        while time.monotonic() < stop:
+            started = time.monotonic()
+            db = ReadSessionLocal()
+            try:
+                paginate_desc(post_query(db), Post.timestamp, Post.id, limit=20)
+                with lock:
+                    stats["reads"].append(time.monotonic() - started)
+            except OperationalError:
+                with lock:
+                    stats["read_errors"] += 1
+            finally:
+                db.close()
+
+    def writer(user_id):
+        while time.monotonic() < stop:
+            started = time.monotonic()
+            db = SessionLocal()
+            try:
+                post_id = random.choice(post_ids)
+                db.query(Like).filter(Like.user_id == user_id, Like.post_id == post_id).delete()
+                db.add(Like(user_id=user_id, post_id=post_id))
+                db.commit()
+                with lock:
+                    stats["writes"].append(time.monotonic() - started)
+            except OperationalError:
+                db.rollback()
+                with lock:
+                    stats["write_errors"] += 1
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(random.choice(user_ids),)) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "reads_per_sec": len(stats["reads"]) / seconds,
+        "writes_per_sec": len(stats["writes"]) / seconds,
+        "read_p95_ms": _p95(stats["reads"]),
+        "write_p95_ms": _p95(stats["writes"]),
+        "read_errors": stats["read_errors"],
+        "write_errors": stats["write_errors"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite connection profile benchmark")
+    parser.add_argument("--db", default="techtalk.db")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--run-profile", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        print(json.dumps(run_profile(args.seconds, args.readers, args.writers)))
+        return
+
+    if not os.path.exists(args.db):
+        print(f"{args.db} not found. Run seed.py first!")
+        return
+
+    print(f"Benchmarking {args.readers} readers / {args.writers} writers for {args.seconds:g}s per profile\n")
+    results = {}
+    for profile in PROFILES:
+        workdir = tempfile.mkdtemp(prefix="techtalk-bench-")
+        try:
+            copy = os.path.join(workdir, "bench.db")
+            copy_database(args.db, copy)
+            env = dict(os.environ, TECHTALK_SQLITE_PROFILE=profile, TECHTALK_DATABASE_URL=f"sqlite:///{copy}")
+            output = subprocess.run(
+                [sys.executable, __file__, "--run-profile", profile, "--seconds", str(args.seconds),
+                 "--readers", str(args.readers), "--writers", str(args.writers)],
+                env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            results[profile] = json.loads(output.strip().splitlines()[-1])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'profile':12} {'reads/s':>9} {'writes/s':>9} {'read p95':>10} {'write p95':>10} {'locked':>7}")
+    for profile, r in results.items():
+        print(f"{profile:12} {r['reads_per_sec']:9.1f} {r['writes_per_sec']:9.1f} "
+              f"{r['read_p95_ms']:8.1f}ms {r['write_p95_ms']:8.1f}ms {r['read_errors'] + r['write_errors']:7d}")
+
+    legacy, production = results["legacy"], results["production"]
+    if legacy["reads_per_sec"]:
+        print(f"\n✅ production profile: {production['reads_per_sec'] / legacy['reads_per_sec']:.1f}x reads, "
+              f"{production['writes_per_sec'] / max(legacy['writes_per_sec'], 0.1):.1f}x writes")
+
+if __name__ == "__main__":
+    main()
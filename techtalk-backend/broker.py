@@ -0,0 +1,98 @@
+# Pub/sub broker for pushing events to connected clients (SSE, WebSockets)
+#
+# Handlers publish from threadpool threads; subscribers are asyncio queues
+# living on the event loop. LocalBroker only reaches subscribers inside this
+# process - a multi-worker deployment installs a Broker backed by something
+# shared (e.g. Redis pub/sub) with set_broker(), keeping the same interface.
+import asyncio
+import threading
+from typing import Optional
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Put on a subscriber's queue when it fell behind and events were dropped -
+# the client should refetch instead of trusting its incremental state
+RESYNC = {"event": "resync", "data": {}}
+
+class Subscription:
+    def __init__(self, broker, channel: str):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    # Runs on the event loop
+    def deliver(self, event: dict):
+        if self.overflowed:
+            return
+        if self.queue.full():
+            self.overflowed = True
+            return
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None):
+        if self.overflowed and self.queue.empty():
+            self.overflowed = False
+            return RESYNC
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class Broker:
+    # Must be called on the event loop that will consume the subscription
+    def subscribe(self, channel: str) -> Subscription:
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: Subscription):
+        raise NotImplementedError
+
+    # Safe to call from any thread
+    def publish(self, channel: str, event: dict):
+        raise NotImplementedError
+
+class LocalBroker(Broker):
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel: str, event: dict):
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Loop already closed - the connection is gone
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self, channel: str) -> int:
+        with self._lock:
+            return len(self._subscriptions.get(channel, ()))
+
+_broker = LocalBroker()
+
+def set_broker(broker: Broker):
+    global _broker
+    _broker = broker
+
+def get_broker() -> Broker:
+    return _broker
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
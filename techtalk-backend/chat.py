@@ -0,0 +1,158 @@
+# Real-time direct messages - shared send/read logic and the /ws/messages hub
+#
+# Messages are still Message rows; sending and reading also publish events on
+# the user's chat channel through broker.py, so every open socket of both
+# participants (in any worker, given a shared broker) sees them at once.
+#
+# Client frames:  {"type": "send", "receiver_id": 2, "content": "hi", "client_id": "x"}
+#                 {"type": "read", "partner_id": 2}
+#                 {"type": "ping"}
+# Server frames:  {"type": "message", "message": {...}, "client_id": "x"}  (client_id on the sender's copy)
+#                 {"type": "read", "reader_id": 1, "partner_id": 2}
+#                 {"type": "error", "detail": "...", "client_id": "x"}
+#                 {"type": "pong"} / {"type": "resync"}
+import asyncio
+import json
+import threading
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect, status
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import User, Message
+from schemas import MessageResponse
+from auth import authenticate_token
+from broker import get_broker, RESYNC
+from conversations import record_message, mark_read
+from notifications import enqueue_notification
+
+def chat_channel(user_id: int) -> str:
+    return f"chat:{user_id}"
+
+def _publish(user_id: int, frame: dict):
+    get_broker().publish(chat_channel(user_id), frame)
+
+# Store a message, update both conversation summaries, queue the receiver's
+# notification and push the message to both participants. Commits.
+def send_direct_message(db: Session, sender: User, receiver_id: int, content: str, client_id=None) -> Message:
+    receiver = db.query(User).filter(User.id == receiver_id).first()
+    if not receiver:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    message = Message(sender_id=sender.id, receiver_id=receiver_id, content=content)
+    db.add(message)
+    db.flush()
+    record_message(db, message)
+    enqueue_notification(db, receiver_id, "message", f"{sender.username} sent you a message")
+    db.commit()
+
+    payload = MessageResponse.model_validate(message).model_dump(mode="json")
+    _publish(sender.id, {"type": "message", "message": payload, "client_id": client_id})
+    if receiver_id != sender.id:
+        _publish(receiver_id, {"type": "message", "message": payload})
+    return message
+
+# `reader_id` has read everything `partner_id` sent them - mark it, zero the
+# summary and send a read receipt to both sides. Commits.
+def mark_thread_read(db: Session, reader_id: int, partner_id: int):
+    updated = db.query(Message).filter(
+        and_(Message.sender_id == partner_id, Message.receiver_id == reader_id, Message.read == False)
+    ).update({"read": True})
+    mark_read(db, reader_id, partner_id)
+    db.commit()
+    if updated:
+        receipt = {"type": "read", "reader_id": reader_id, "partner_id": partner_id}
+        _publish(partner_id, receipt)
+        _publish(reader_id, receipt)
+
+# Open sockets per user in this worker
+class ConnectionHub:
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_id: int, websocket: WebSocket):
+        with self._lock:
+            self._connections.setdefault(user_id, set()).add(websocket)
+
+    def remove(self, user_id: int, websocket: WebSocket):
+        with self._lock:
+            sockets = self._connections.get(user_id)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self._connections[user_id]
+
+    def is_online(self, user_id: int) -> bool:
+        with self._lock:
+            return user_id in self._connections
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._connections),
+                "connections": sum(len(sockets) for sockets in self._connections.values()),
+            }
+
+hub = ConnectionHub()
+
+def _run(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+async def _handle_frame(user: User, frame: dict):
+    kind = frame.get("type")
+    if kind == "send":
+        await run_in_threadpool(
+            _run, send_direct_message, user, int(frame["receiver_id"]), str(frame["content"]), frame.get("client_id")
+        )
+    elif kind == "read":
+        await run_in_threadpool(_run, mark_thread_read, user.id, int(frame["partner_id"]))
+    elif kind == "ping":
+        return {"type": "pong"}
+    else:
+        raise HTTPException(status_code=400, detail="Unknown frame type")
+
+# Forward this user's chat events to one socket
+async def _pump(websocket: WebSocket, subscription):
+    while True:
+        event = await subscription.get()
+        await websocket.send_json({"type": "resync"} if event is RESYNC else event)
+
+async def chat_socket(websocket: WebSocket):
+    token = websocket.query_params.get("token") or websocket.headers.get("authorization", "").removeprefix("Bearer ")
+    try:
+        user = await run_in_threadpool(authenticate_token, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = get_broker().subscribe(chat_channel(user.id))
+    hub.add(user.id, websocket)
+    pump = asyncio.create_task(_pump(websocket, subscription))
+    try:
+        while True:
+            text = await websocket.receive_text()
+            frame = {}
+            try:
+                frame = json.loads(text)
+                if not isinstance(frame, dict):
+                    raise ValueError(text)
+                reply = await _handle_frame(user, frame)
+            except HTTPException as e:
+                reply = {"type": "error", "detail": e.detail, "client_id": frame.get("client_id")}
+            except (KeyError, TypeError, ValueError):
+                reply = {"type": "error", "detail": "Malformed frame", "client_id": frame.get("client_id")}
+            if reply:
+                await websocket.send_json(reply)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        pump.cancel()
+        hub.remove(user.id, websocket)
+        subscription.close()
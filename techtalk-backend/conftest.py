@@ -0,0 +1,85 @@
+# Shared pytest fixtures - runs the app against a throwaway SQLite database
+import itertools
+import os
+import tempfile
+
+# Must be set before database.py is imported anywhere
+_tmpdir = tempfile.mkdtemp(prefix="techtalk-test-")
+os.environ.setdefault("TECHTALK_DATABASE_URL", f"sqlite:///{_tmpdir}/test.db")
+os.environ.setdefault("TECHTALK_BCRYPT_ROUNDS", "4")
+# Repeated statement shapes within a request fail the request (instrumentation.py)
+os.environ.setdefault("TECHTALK_NPLUSONE", "raise")
+
+import pytest
+from fastapi.testclient import TestClient
+
+from auth import create_access_token
+from database import SessionLocal
+from instrumentation import SERVER_TIMING_HEADER, queries_from_header
+from models import User
+
+# test_auth.py is a manual script against the local techtalk.db, not a pytest module
+collect_ignore = ["test_auth.py"]
+
+USERNAMES = ["alice", "bob", "carol"]
+
+@pytest.fixture(scope="session")
+def client():
+    from main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+# Three users (alice, bob, carol) inserted directly, with bearer headers for each
+@pytest.fixture(scope="session")
+def users(client):
+    db = SessionLocal()
+    try:
+        created = {}
+        for name in USERNAMES:
+            user = db.query(User).filter(User.username == name).first()
+            if user is None:
+                user = User(username=name, email=f"{name}@example.com", password="not-a-real-hash")
+                db.add(user)
+                db.commit()
+            created[name] = {
+                "id": user.id,
+                "headers": {"Authorization": f"Bearer {create_access_token({'sub': user.id})}"},
+            }
+        return created
+    finally:
+        db.close()
+
+_fresh_ids = itertools.count(1)
+
+# make_user() inserts a new user per call - for tests that need a follow
+# graph or counters nobody else touches. Same shape as users["alice"].
+@pytest.fixture
+def make_user(client):
+    def create():
+        db = SessionLocal()
+        try:
+            name = f"user{os.getpid()}x{next(_fresh_ids)}"
+            user = User(username=name, email=f"{name}@example.com", password="not-a-real-hash")
+            db.add(user)
+            db.commit()
+            return {
+                "id": user.id,
+                "username": name,
+                "headers": {"Authorization": f"Bearer {create_access_token({'sub': user.id})}"},
+            }
+        finally:
+            db.close()
+    return create
+
+# query_budget(method, path, budget, **kwargs) makes the request and fails if
+# it ran more than `budget` SQL statements. Cached responses run none, so
+# measure a route on fresh data.
+@pytest.fixture
+def query_budget(client):
+    def request(method, path, budget, **kwargs):
+        response = client.request(method, path, **kwargs)
+        queries = queries_from_header(response.headers.get(SERVER_TIMING_HEADER))
+        assert queries is not None, f"{method} {path} sent no Server-Timing header"
+        assert queries <= budget, f"{method} {path} ran {queries} SQL statements, budget is {budget}"
+        return response
+    return request
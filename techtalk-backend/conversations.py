@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# Conversation summaries behind /messages/conversations
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from models import Message, Conversation
+from pagination import paginate_desc
+
+def _upsert_side(db: Session, user_id: int, partner_id: int, message: Message, unread_delta: int):
+    stmt = insert(Conversation).values(
+        user_id=user_id,
+        partner_id=partner_id,
+        last_message=message.content,
+        last_message_time=message.timestamp,
+        unread_count=unread_delta,
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "partner_id"],
+        set_={
+            "last_message": stmt.excluded.last_message,
+            "last_message_time": stmt.excluded.last_message_time,
+            "unread_count": Conversation.unread_count + unread_delta,
+        },
+    ))
+
+# New message: refresh both sides of the pair, in the caller's transaction
+def record_message(db: Session, message: Message):
+    _upsert_side(db, message.sender_id, message.receiver_id, message, 0)
+    _upsert_side(db, message.receiver_id, message.sender_id, message, 1)
+
+# `user_id` read everything `partner_id` sent them
+def mark_read(db: Session, user_id: int, partner_id: int):
+    db.query(Conversation).filter(
+        Conversation.user_id == user_id, Conversation.partner_id == partner_id
+    ).update({Conversation.unread_count: 0}, synchronize_session=False)
+
+# Most recent conversations first - one indexed range scan, partners joined in
+def conversation_page(db: Session, user_id: int, cursor=None, skip: int = 0, limit: int = 50):
+    query = db.query(Conversation).options(joinedload(Conversation.partner)).filter(
+        Conversation.user_id == user_id
+    )
+    return paginate_desc(query, Conversation.last_message_time, Conversation.id, cursor, skip, limit)
+
+# Rebuild every summary from the messages table (existing databases, repairs)
+def rebuild_conversations(db: Session):
+    db.query(Conversation).delete(synchronize_session=False)
+    summaries = {}
+    for message in db.query(Message).order_by(Message.timestamp, Message.id).yield_per(1000):
+        for user_id, partner_id in ((message.sender_id, message.receiver_id), (message.receiver_id, message.sender_id)):
+            summary = summaries.setdefault((user_id, partner_id), {"unread_count": 0})
+            summary["last_message"] = message.content
+            summary["last_message_time"] = message.timestamp
+        if not message.read:
+            summaries[(message.receiver_id, message.sender_id)]["unread_count"] += 1
+    db.add_all(
+        Conversation(user_id=user_id, partner_id=partner_id, **summary)
+        for (user_id, partner_id), summary in summaries.items()
+    )
+    db.commit()
+    return db.query(func.count(Conversation.id)).scalar()
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt conversations: {rebuild_conversations(db)} summaries")
+    finally:
+        db.close()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Denormalized counters on Post and User - write-path helpers and reconciliation job
+import argparse
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, or_, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError
+
+from models import User, Post, Comment, Like, Repost, Follower
+
+# Counter column -> foreign key of the rows it counts
+COUNTED = [
+    (Post.likes_count, Like.post_id),
+    (Post.comments_count, Comment.post_id),
+    (Post.reposts_count, Repost.post_id),
+    (User.followers_count, Follower.followed_id),
+]
+
+# Adjust a counter in the caller's transaction - commit together with the row
+# change. The row's version moves with it so ETags change.
+def bump_counter(db: Session, row_id: int, column, delta: int):
+    owner = column.class_
+    db.query(owner).filter(owner.id == row_id).update(
+        {column: column + delta, owner.version: owner.version + 1}, synchronize_session=False
+    )
+
+# Insert a like/repost/follow row and bump `column` on row `row_id`, in the
+# caller's transaction. A repeat hits the pair's unique index and is skipped,
+# so double submits can't race. A missing target fails the foreign key (or,
+# with SQLite foreign keys off, matches no row to bump) and raises
+# LookupError - the caller's session must then be rolled back.
+# Returns (created, `returning` read from the bumped row).
+def add_counted(db: Session, model, values: dict, column, row_id: int, returning=None):
+    try:
+        result = db.execute(insert(model).values(**values).on_conflict_do_nothing())
+    except IntegrityError:
+        raise LookupError(row_id)
+    if result.rowcount == 0:
+        return False, None
+    owner = column.class_
+    value = db.execute(
+        update(owner).where(owner.id == row_id)
+        .values({column: column + 1, owner.version: owner.version + 1})
+        .returning(owner.id if returning is None else returning)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if value is None:
+        raise LookupError(row_id)
+    return True, value
+
+# Delete the rows matching `criteria` in one statement and take them off the
+# counter. Returns whether anything was deleted.
+def remove_counted(db: Session, model, criteria, column, row_id: int) -> bool:
+    deleted = db.query(model).filter(*criteria).delete(synchronize_session=False)
+    if deleted:
+        bump_counter(db, row_id, column, -deleted)
+    return deleted > 0
+
+def _actual_count(column, foreign_key):
+    return select(func.count()).where(foreign_key == column.class_.id).scalar_subquery()
+
+# Recompute every counter from the source tables. Returns the drifted rows as
+# (table, row_id, column_name, stored, actual); only those rows are rewritten.
+def reconcile_counters(db: Session, fix: bool = True):
+    drift = []
+    for column, foreign_key in COUNTED:
+        owner = column.class_
+        actual = _actual_count(column, foreign_key)
+        drifted = or_(column.is_(None), column != actual)
+        rows = db.query(owner.id, column, actual).filter(drifted).all()
+        drift.extend((owner.__tablename__, row_id, column.key, stored, count) for row_id, stored, count in rows)
+        if fix and rows:
+            db.query(owner).filter(drifted).update(
+                {column: actual, owner.version: owner.version + 1}, synchronize_session=False
+            )
+    if fix:
+        db.commit()
+    return drift
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute post and follower counters and report drift")
+    parser.add_argument("--dry-run", action="store_true", help="only report drift, do not rewrite counters")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        drift = reconcile_counters(db, fix=not args.dry_run)
+    finally:
+        db.close()
+
+    for table, row_id, column, stored, actual in drift:
+        print(f"  {table} {row_id}: {column} stored={stored} actual={actual}")
+    verb = "Found" if args.dry_run else "Fixed"
+    print(f"{verb} {len(drift)} drifted counters")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,111 @@
 # Database connection and session management
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from models import Base
 
-DATABASE_URL = "sqlite:///./techtalk.db"
+DATABASE_URL = os.getenv("TECHTALK_DATABASE_URL", "sqlite:///./techtalk.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# SQLite connection profiles, applied as PRAGMAs on every new connection.
+# "production" uses WAL so readers never block behind the writer, waits on a
+# locked database instead of failing, and turns foreign keys on. "legacy" is
+# SQLite's defaults, kept for benchmarking. They are spelled out because WAL
+# is stored in the file and outlives the connection that set it. Any pragma
+# can be overridden with TECHTALK_SQLITE_<NAME>, e.g.
+# TECHTALK_SQLITE_BUSY_TIMEOUT=10000.
+SQLITE_PROFILES = {
+    "production": {
+        "journal_mode": "WAL",
+        "busy_timeout": "5000",
+        "synchronous": "NORMAL",
+        "foreign_keys": "ON",
+        "mmap_size": str(256 * 1024 * 1024),
+        "cache_size": "-20000",
+        "temp_store": "MEMORY",
+    },
+    "legacy": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "foreign_keys": "OFF",
+        "mmap_size": "0",
+        "cache_size": "-2000",
+        "temp_store": "DEFAULT",
+    },
+}
+SQLITE_PROFILE = os.getenv("TECHTALK_SQLITE_PROFILE", "production")
+SQLITE_PRAGMAS = {
+    name: os.getenv(f"TECHTALK_SQLITE_{name.upper()}", value)
+    for name, value in SQLITE_PROFILES[SQLITE_PROFILE].items()
+}
+
+# Pool sizes - writes go through one small pool (SQLite has a single writer),
+# GET routes through a larger read-only one
+WRITE_POOL_SIZE = int(os.getenv("TECHTALK_WRITE_POOL_SIZE", "5"))
+WRITE_MAX_OVERFLOW = int(os.getenv("TECHTALK_WRITE_MAX_OVERFLOW", "5"))
+READ_POOL_SIZE = int(os.getenv("TECHTALK_READ_POOL_SIZE", "10"))
+READ_MAX_OVERFLOW = int(os.getenv("TECHTALK_READ_MAX_OVERFLOW", "20"))
+
+def _apply_pragmas(engine, read_only=False):
+    if not IS_SQLITE:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in SQLITE_PRAGMAS.items():
+                # journal_mode is stored in the file - only the writer sets it
+                if read_only and name == "journal_mode":
+                    continue
+                cursor.execute(f"PRAGMA {name}={value}")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+        finally:
+            cursor.close()
+
+def _create_engine(pool_size, max_overflow, read_only=False):
+    kwargs = {"pool_size": pool_size, "max_overflow": max_overflow} if IS_SQLITE else {}
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, **kwargs)
+    _apply_pragmas(engine, read_only)
+    return engine
+
+# `engine` is the write engine - migrations, scripts and every mutation use it
+engine = write_engine = _create_engine(WRITE_POOL_SIZE, WRITE_MAX_OVERFLOW)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+read_engine = _create_engine(READ_POOL_SIZE, READ_MAX_OVERFLOW, read_only=True)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Async mode (TECHTALK_ASYNC=1) - the hot read routes in async_routes.py run on
+# an AsyncEngine so waiting requests hold no threadpool thread. The engine is
+# created on first use; sqlite URLs get the aiosqlite driver.
+ASYNC_MODE = os.getenv("TECHTALK_ASYNC", "0") == "1"
+ASYNC_DATABASE_URL = os.getenv(
+    "TECHTALK_ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+)
+async_engine = None
+AsyncSessionLocal = None
+
+def init_async_engine():
+    global async_engine, AsyncSessionLocal
+    if async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        async_engine = create_async_engine(ASYNC_DATABASE_URL)
+        _apply_pragmas(async_engine.sync_engine)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return async_engine
+
+async def dispose_async_engine():
+    global async_engine, AsyncSessionLocal
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine = AsyncSessionLocal = None
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    from migrations import run_migrations
+    run_migrations(SessionLocal)
 
 def get_db():
     db = SessionLocal()
@@ -17,3 +113,16 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Read-only session for GET routes - never blocks behind a writer under WAL
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    init_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,37 @@
+# Engagement hydration - fills computed PostResponse fields for a page of posts
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional
+
+from models import Post, Like, Repost
+
+# Base query for post lists - loads the author in the same SELECT
+def post_query(db: Session):
+    return db.query(Post).options(joinedload(Post.author))
+
+def _viewer_post_ids(db: Session, model, post_ids, viewer_id):
+    rows = db.query(model.post_id).filter(
+        model.user_id == viewer_id, model.post_id.in_(post_ids)
+    ).all()
+    return {r[0] for r in rows}
+
+# Fill the viewer's is_liked/is_reposted flags for a page of posts - two
+# queries per page for logged-in viewers, none for anonymous ones. The
+# likes/comments/reposts counts are columns on Post (see counters.py).
+def hydrate_posts(db: Session, posts: List[Post], viewer_id: Optional[int] = None) -> List[Post]:
+    if not posts:
+        return posts
+    post_ids = [post.id for post in posts]
+
+    liked, reposted = set(), set()
+    if viewer_id is not None:
+        liked = _viewer_post_ids(db, Like, post_ids, viewer_id)
+        reposted = _viewer_post_ids(db, Repost, post_ids, viewer_id)
+
+    for post in posts:
+        post.is_liked = post.id in liked
+        post.is_reposted = post.id in reposted
+    return posts
+
+# Single-post convenience wrapper used by detail/update routes
+def hydrate_post(db: Session, post: Post, viewer_id: Optional[int] = None) -> Post:
+    return hydrate_posts(db, [post], viewer_id)[0]
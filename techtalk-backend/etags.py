@@ -0,0 +1,52 @@
+# Strong ETags from row version counters, and If-None-Match handling
+from datetime import datetime
+from fastapi import Response
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from models import Comment, Post, User
+
+ETAG_HEADER = "ETag"
+
+# e.g. make_etag("post", 12, 7, 3) -> "post-12-7-3"
+def make_etag(*parts) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+# If-None-Match uses the weak comparison, so W/ prefixes are ignored
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={ETAG_HEADER: etag})
+
+# SQLite hands the id of a deleted newest row to the next insert, so a
+# recreated post would repeat "post-<id>-1-..." - its creation time goes in too
+def created_part(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y%m%d%H%M%S%f")
+
+# Post and author versions cover a post's payload; likes/reposts bump the
+# post's version, so the viewer's is_liked/is_reposted flags are covered too.
+# None when the post does not exist.
+def post_etag(db: Session, post_id: int, viewer_id: int) -> Optional[str]:
+    row = db.query(Post.timestamp, Post.version, User.version).join(User, Post.user_id == User.id).filter(
+        Post.id == post_id
+    ).first()
+    if row is None:
+        return None
+    timestamp, post_version, author_version = row
+    return make_etag("post", post_id, created_part(timestamp), post_version, author_version, viewer_id)
+
+# Every comment added or deleted bumps the post's version (counters.py), and
+# the authors' versions cover their names and pictures. All empty threads
+# look the same.
+def comments_etag(post_id: int, comments: List[Comment]) -> str:
+    if not comments:
+        return make_etag("comments", post_id, 0)
+    post = comments[0].post
+    return make_etag(
+        "comments", post_id, created_part(post.timestamp), post.version,
+        sum(comment.author.version for comment in comments)
+    )
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# Synthetic production-scale dataset for benchmarks
+#
+# Fills an empty database with users, follows, posts, likes, comments,
+# reposts, messages and notifications using Core executemany inserts in large
+# transactions - no ORM objects and no per-row existence checks. Afterwards
+# the derived data the API maintains (counters, timelines, tag buckets,
+# conversation summaries) is rebuilt with the usual repair helpers.
+#
+# Popularity follows power laws: a few accounts get most of the followers and
+# post the most, a few posts get most of the likes. The same --seed and --end
+# always produce the same rows. Every account's password is "password123".
+#
+#   python generate_dataset.py --db /tmp/techtalk-1m.db --users 1000000
+import argparse
+import json
+import os
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate
+from sqlalchemy import func, insert
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, User, Post, Comment, Like, Follower, Repost, Message, Notification
+
+WORDS = (
+    "python react fastapi sqlite rust kubernetes docker api database cache latency "
+    "deploy refactor bug feature test review release async query index migration "
+    "frontend backend cloud security performance benchmark design pattern team "
+    "learned shipped debugging today finally weekend project open source library"
+).split()
+TAGS = [
+    "python", "javascript", "react", "webdev", "devops", "rust", "go", "ai",
+    "machinelearning", "security", "cloud", "database", "opensource", "career",
+    "testing", "linux", "mobile", "design", "api", "performance",
+]
+BIOS = ["Backend engineer", "Frontend developer", "Data scientist", "DevOps", "Student", "Open source maintainer", ""]
+ACTOR_SAMPLE_SIZE = 3
+
+class Generator:
+    def __init__(self, engine, args):
+        self.engine = engine
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.end = args.end
+        self.span = args.days * 86400
+        self.users = args.users
+        self.counts = {}
+        self._add_notification = None
+
+    # Power-law weights over randomly ranked ids, as cumulative weights for choices()
+    def _popularity(self, alpha: float):
+        ranks = list(range(1, self.users + 1))
+        self.rng.shuffle(ranks)
+        return list(accumulate(1.0 / rank ** alpha for rank in ranks))
+
+    def _pick(self, cum_weights, k: int):
+        return self.rng.choices(range(1, self.users + 1), cum_weights=cum_weights, k=k)
+
+    # Pareto-distributed count with the given mean (shape > 1)
+    def _heavy_tail(self, mean: float, shape: float = 1.5) -> int:
+        return int((self.rng.paretovariate(shape) - 1) * mean * (shape - 1))
+
+    def _seconds_ago(self) -> float:
+        return self.rng.random() * self.span
+
+    def _at(self, seconds_ago: float) -> datetime:
+        return self.end - timedelta(seconds=seconds_ago)
+
+    def _text(self, low: int, high: int) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high))).capitalize()
+
+    def _insert(self, conn, model, rows):
+        if rows:
+            conn.execute(insert(model), rows)
+            self.counts[model.__tablename__] = self.counts.get(model.__tablename__, 0) + len(rows)
+            rows.clear()
+
+    # Buffer rows and write them a batch at a time, one transaction per phase
+    def _writer(self, conn, model):
+        rows = []
+        def add(row):
+            rows.append(row)
+            if len(rows) >= self.args.batch:
+                self._insert(conn, model, rows)
+        return add, lambda: self._insert(conn, model, rows)
+
+    # Notifications as the app would have left them - likes, reposts and
+    # follows already coalesced, everything older than --unread-days read
+    def _notify(self, user_id, type, message, seconds_ago, target_id=None, actors=None, count=1):
+        self._add_notification({
+            "user_id": user_id, "type": type, "message": message,
+            "read": seconds_ago > self.args.unread_days * 86400,
+            "timestamp": self._at(seconds_ago), "target_id": target_id,
+            "group_key": None if actors is None else (type if target_id is None else f"{type}:{target_id}"),
+            "actor_count": count,
+            "actor_sample": None if actors is None else json_actors(actors),
+            "window_start": None if actors is None else self._at(seconds_ago),
+        })
+
+    def users_phase(self, conn, password_hash: str):
+        add, flush = self._writer(conn, User)
+        for user_id in range(1, self.users + 1):
+            add({
+                "id": user_id, "username": username(user_id), "email": f"user{user_id}@example.com",
+                "password": password_hash, "bio": self.rng.choice(BIOS),
+                "profile_pic": f"https://i.pravatar.cc/150?img={user_id % 70 + 1}",
+                "created_at": self._at(self.span + self._seconds_ago()),
+            })
+        flush()
+
+    def follows_phase(self, conn, popularity):
+        add, flush = self._writer(conn, Follower)
+        # Ring of each account's newest followers, ACTOR_SAMPLE_SIZE slots per account
+        newest = array("i", bytes(4 * ACTOR_SAMPLE_SIZE * (self.users + 1)))
+        followers = array("i", bytes(4 * (self.users + 1)))
+        for follower_id in range(1, self.users + 1):
+            wanted = min(self.users - 1, int(self.rng.expovariate(1 / self.args.follows)))
+            followed = dict.fromkeys(
+                target for target in self._pick(popularity, wanted + wanted // 4 + 1) if target != follower_id
+            )
+            for followed_id in list(followed)[:wanted]:
+                add({"follower_id": follower_id, "followed_id": followed_id, "timestamp": self._at(self._seconds_ago())})
+                newest[followed_id * ACTOR_SAMPLE_SIZE + followers[followed_id] % ACTOR_SAMPLE_SIZE] = follower_id
+                followers[followed_id] += 1
+        flush()
+        for user_id in range(1, self.users + 1):
+            count = followers[user_id]
+            if count:
+                slots = [(count - 1 - back) % ACTOR_SAMPLE_SIZE for back in range(min(count, ACTOR_SAMPLE_SIZE))]
+                actors = [newest[user_id * ACTOR_SAMPLE_SIZE + slot] for slot in slots]
+                self._notify(user_id, "follow", activity_text("follow", actors, count),
+                             self._seconds_ago(), actors=actors, count=count)
+
+    def posts_phase(self, conn, activity):
+        add, flush = self._writer(conn, Post)
+        total = self.users * self.args.posts
+        authors = array("i", self._pick(activity, total))
+        ages = array("d", (self._seconds_ago() for _ in range(total)))
+        for post_id in range(1, total + 1):
+            tags = {TAGS[min(int(self.rng.paretovariate(1.2)) - 1, len(TAGS) - 1)] for _ in range(self.rng.randint(0, 3))}
+            add({
+                "id": post_id, "user_id": authors[post_id - 1], "content": self._text(6, 40),
+                "tags": ",".join(sorted(tags)), "timestamp": self._at(ages[post_id - 1]),
+            })
+        flush()
+        return authors, ages
+
+    def engagement_phase(self, conn, authors, ages):
+        add_like, flush_likes = self._writer(conn, Like)
+        add_comment, flush_comments = self._writer(conn, Comment)
+        add_repost, flush_reposts = self._writer(conn, Repost)
+        everyone = range(1, self.users + 1)
+        for post_id, author_id in enumerate(authors, start=1):
+            posted = ages[post_id - 1]
+            likers = [user for user in self.rng.sample(everyone, min(self.users, self._heavy_tail(self.args.likes)))
+                      if user != author_id]
+            for user_id in likers:
+                add_like({"user_id": user_id, "post_id": post_id, "timestamp": self._at(self.rng.uniform(0, posted))})
+            if likers:
+                actors = likers[-ACTOR_SAMPLE_SIZE:][::-1]
+                self._notify(author_id, "like", activity_text("like", actors, len(likers)),
+                             self.rng.uniform(0, posted), target_id=post_id, actors=actors, count=len(likers))
+
+            reposters = [user for user in self.rng.sample(everyone, min(self.users, int(len(likers) * self.args.repost_ratio + self.rng.random())))
+                         if user != author_id]
+            for user_id in reposters:
+                add_repost({"user_id": user_id, "post_id": post_id, "timestamp": self._at(self.rng.uniform(0, posted))})
+            if reposters:
+                actors = reposters[-ACTOR_SAMPLE_SIZE:][::-1]
+                self._notify(author_id, "repost", activity_text("repost", actors, len(reposters)),
+                             self.rng.uniform(0, posted), target_id=post_id, actors=actors, count=len(reposters))
+
+            for _ in range(int(len(likers) * self.args.comment_ratio + self.rng.random())):
+                commenter = self.rng.randint(1, self.users)
+                ago = self.rng.uniform(0, posted)
+                add_comment({"user_id": commenter, "post_id": post_id, "content": self._text(2, 20), "timestamp": self._at(ago)})
+                if commenter != author_id:
+                    self._notify(author_id, "comment", f"{username(commenter)} commented on your post", ago)
+        flush_likes()
+        flush_comments()
+        flush_reposts()
+
+    def messages_phase(self, conn, popularity):
+        add, flush = self._writer(conn, Message)
+        receivers = self._pick(popularity, self.args.messages)
+        for receiver_id in receivers:
+            sender_id = self.rng.randint(1, self.users)
+            if sender_id == receiver_id:
+                continue
+            ago = self._seconds_ago()
+            add({
+                "sender_id": sender_id, "receiver_id": receiver_id, "content": self._text(1, 25),
+                "read": ago > self.args.unread_days * 86400, "timestamp": self._at(ago),
+            })
+            self._notify(receiver_id, "message", f"{username(sender_id)} sent you a message", ago)
+        flush()
+
+    def run(self, password_hash: str):
+        popularity = self._popularity(self.args.alpha)
+        # Ranked independently of popularity - the most followed accounts
+        # aren't also the most prolific posters
+        activity = self._popularity(self.args.activity_alpha)
+        phases = [
+            ("users", lambda conn: self.users_phase(conn, password_hash)),
+            ("follows", lambda conn: self.follows_phase(conn, popularity)),
+            ("posts", lambda conn: setattr(self, "posts", self.posts_phase(conn, activity))),
+            ("likes, comments, reposts", lambda conn: self.engagement_phase(conn, *self.posts)),
+            ("messages", lambda conn: self.messages_phase(conn, popularity)),
+        ]
+        for name, phase in phases:
+            started = time.monotonic()
+            with self.engine.begin() as conn:
+                self._add_notification, flush_notifications = self._writer(conn, Notification)
+                phase(conn)
+                flush_notifications()
+            print(f"  {name}: {time.monotonic() - started:.1f}s")
+
+def username(user_id: int) -> str:
+    return f"user{user_id}"
+
+def json_actors(actor_ids):
+    return json.dumps([{"id": actor_id, "username": username(actor_id)} for actor_id in actor_ids])
+
+def activity_text(type: str, actor_ids, count: int) -> str:
+    from notifications import activity_message
+    return activity_message(type, [{"id": actor_id, "username": username(actor_id)} for actor_id in actor_ids], count)
+
+# Rebuild what the API routes would have maintained for these rows
+def rebuild_derived(session_factory):
+    from counters import reconcile_counters
+    from timeline import rebuild_timelines
+    from trending import rebuild_tags
+    from conversations import rebuild_conversations
+    from notifications import seed_notification_actors
+
+    db = session_factory()
+    try:
+        for name, step in [
+            ("counters", reconcile_counters), ("timelines", rebuild_timelines),
+            ("tags", rebuild_tags), ("conversations", rebuild_conversations),
+            ("notification actors", seed_notification_actors),
+        ]:
+            started = time.monotonic()
+            step(db)
+            print(f"  {name}: {time.monotonic() - started:.1f}s")
+    finally:
+        db.close()
+
+def generate(engine, args, password_hash: str):
+    from migrations import run_migrations
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(session_factory)
+
+    db = session_factory()
+    try:
+        if db.query(func.count(User.id)).scalar():
+            raise SystemExit("❌ The database already has users - point --db at a new file")
+    finally:
+        db.close()
+
+    generator = Generator(engine, args)
+    generator.run(password_hash)
+    rebuild_derived(session_factory)
+    return generator.counts
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fill an empty database with a reproducible synthetic dataset")
+    parser.add_argument("--db", required=True, help="SQLite file to create or fill (must have no users)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=5, help="posts per user, on average")
+    parser.add_argument("--follows", type=float, default=30, help="accounts followed per user, on average")
+    parser.add_argument("--likes", type=float, default=8, help="likes per post, on average")
+    parser.add_argument("--comment-ratio", type=float, default=0.15, help="comments per like")
+    parser.add_argument("--repost-ratio", type=float, default=0.05, help="reposts per like")
+    parser.add_argument("--messages", type=int, default=None, help="direct messages in total (default: 2 per user)")
+    parser.add_argument("--alpha", type=float, default=1.1, help="power-law exponent of account popularity")
+    parser.add_argument("--activity-alpha", type=float, default=0.6, help="power-law exponent of how much accounts post")
+    parser.add_argument("--days", type=int, default=90, help="how far back activity goes")
+    parser.add_argument("--unread-days", type=int, default=3, help="notifications and messages newer than this are unread")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="newest timestamp (default: today 00:00 UTC)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=50000, help="rows per executemany")
+    args = parser.parse_args(argv)
+    if args.messages is None:
+        args.messages = 2 * args.users
+    if args.end is None:
+        args.end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return args
+
+def main():
+    args = parse_args()
+    # database.py reads these at import - bulk loading doesn't need durability
+    os.environ["TECHTALK_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    os.environ.setdefault("TECHTALK_SQLITE_SYNCHRONOUS", "OFF")
+    from database import engine
+    from hashing import hash_password
+
+    started = time.monotonic()
+    print(f"Generating {args.users} users into {args.db} (seed {args.seed})")
+    counts = generate(engine, args, hash_password("password123"))
+    print(f"✅ Generated in {time.monotonic() - started:.0f}s:")
+    for table, count in counts.items():
+        print(f"   {table}: {count}")
+
+if __name__ == "__main__":
+    main()
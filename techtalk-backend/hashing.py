@@ -0,0 +1,69 @@
+# Password hashing - bcrypt in a bounded process pool with admission control
+#
+# A bcrypt call is ~250ms of CPU. Run inline in a sync route it pins one of
+# Starlette's threadpool slots for the whole time, so a login burst starves
+# every other endpoint. Routes use the *_offloaded variants instead: the work
+# runs in a small process pool, and at most HASH_WORKERS + HASH_QUEUE_DEPTH
+# requests may be hashing at once - the rest get an immediate 503 with
+# Retry-After, leaving the remaining threads free for normal reads.
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("TECHTALK_BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("TECHTALK_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_DEPTH = int(os.getenv("TECHTALK_HASH_QUEUE_DEPTH", str(HASH_WORKERS * 2)))
+RETRY_AFTER_SECONDS = 1
+
+# Hashes made with a different cost are reported by needs_rehash, so changing
+# TECHTALK_BCRYPT_ROUNDS upgrades passwords as users log in
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+def needs_rehash(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
+
+_pool = None
+_pool_lock = threading.Lock()
+_admission = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_DEPTH)
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: workers only import this module, never inherit server threads
+            _pool = ProcessPoolExecutor(HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+def _offload(fn, *args):
+    if not _admission.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in requests, try again shortly",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+    try:
+        return _get_pool().submit(fn, *args).result()
+    finally:
+        _admission.release()
+
+def hash_password_offloaded(password: str) -> str:
+    return _offload(hash_password, password)
+
+def verify_password_offloaded(plain_password: str, hashed_password: str) -> bool:
+    return _offload(verify_password, plain_password, hashed_password)
@@ -0,0 +1,253 @@
+# Per-request SQL instrumentation, Server-Timing headers and /metrics
+#
+# Every request gets a RequestStats in a context variable. Threadpool handlers
+# inherit the context, so the engine hooks below can charge each statement,
+# its rows and its time to the request that ran it. Background threads (job
+# workers, cache refreshes) have no RequestStats and are not charged.
+#
+# Rows are what the database reports as affected for writes plus the ORM
+# objects loaded for reads - plain column queries are not counted.
+#
+# N+1 detection (TECHTALK_NPLUSONE=log|raise, off by default; tests run with
+# raise): statements are fingerprinted with their literals and IN lists
+# collapsed, and a shape that runs more than TECHTALK_NPLUSONE_THRESHOLD times
+# in one request is reported with its route and the app line that issued it.
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models import Base
+
+SERVER_TIMING_HEADER = "Server-Timing"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+NPLUSONE_MODE = os.getenv("TECHTALK_NPLUSONE", "off")
+NPLUSONE_THRESHOLD = int(os.getenv("TECHTALK_NPLUSONE_THRESHOLD", "5"))
+_THIS_FILE = os.path.abspath(__file__)
+APP_DIR = os.path.dirname(_THIS_FILE)
+
+logger = logging.getLogger("techtalk.nplusone")
+
+class NPlusOneError(RuntimeError):
+    pass
+
+class RequestStats:
+    __slots__ = ("queries", "rows", "db_seconds", "scope", "shapes")
+
+    def __init__(self, scope=None):
+        self.queries = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+        self.scope = scope
+        self.shapes = {}
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info["query_started"] = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.pop("query_started", None)
+    if stats is None or started is None:
+        return
+    stats.queries += 1
+    stats.db_seconds += time.perf_counter() - started
+    if cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+    if NPLUSONE_MODE != "off":
+        _check_repeats(stats, statement)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+# Statement shape: literals become ?, IN lists of any length become (?)
+def fingerprint(statement: str) -> str:
+    shape = _LITERALS.sub("?", statement)
+    shape = _PLACEHOLDER_LISTS.sub("(?)", shape)
+    return " ".join(shape.split())
+
+# Innermost app frame that issued the statement; lazy loads during response
+# serialization have none, so fall back to the first frame outside SQLAlchemy
+def _origin() -> str:
+    fallback = None
+    for frame in reversed(traceback.extract_stack()):
+        path = os.path.abspath(frame.filename)
+        if "sqlalchemy" in path or path == _THIS_FILE:
+            continue
+        if os.path.dirname(path) == APP_DIR:
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+        fallback = fallback or f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return fallback or "unknown"
+
+def _check_repeats(stats: RequestStats, statement: str):
+    shape = fingerprint(statement)
+    count = stats.shapes[shape] = stats.shapes.get(shape, 0) + 1
+    # Reported once per shape and request
+    if count != NPLUSONE_THRESHOLD + 1:
+        return
+    scope = stats.scope or {}
+    route = route_template(scope["app"], scope) if "app" in scope else "unknown"
+    message = (f"N+1 query in {scope.get('method', '?')} {route}: statement ran more than "
+               f"{NPLUSONE_THRESHOLD} times, last from {_origin()}: {shape[:300]}")
+    if NPLUSONE_MODE == "raise":
+        raise NPlusOneError(message)
+    logger.warning(message)
+
+@event.listens_for(Base, "load", propagate=True)
+def _loaded(target, context):
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += 1
+
+def server_timing(stats: RequestStats, total_seconds: float) -> str:
+    return (
+        f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries, {stats.rows} rows", '
+        f"app;dur={total_seconds * 1000:.2f}"
+    )
+
+_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries')
+
+# Statement count from a Server-Timing header, or None
+def queries_from_header(value: Optional[str]) -> Optional[int]:
+    match = _QUERIES.search(value or "")
+    return int(match.group(1)) if match else None
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+# Per-route aggregates, keyed by (method, route template)
+class RouteMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.durations = {}
+        self.db_durations = {}
+        self.queries = {}
+        self.rows = {}
+
+    def record(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self._lock:
+            status_key = key + (str(status),)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            self.durations.setdefault(key, Histogram(DURATION_BUCKETS)).observe(seconds)
+            self.db_durations.setdefault(key, Histogram(DURATION_BUCKETS)).observe(stats.db_seconds)
+            self.queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(stats.queries)
+            self.rows[key] = self.rows.get(key, 0) + stats.rows
+
+    def clear(self):
+        with self._lock:
+            for table in (self.requests, self.durations, self.db_durations, self.queries, self.rows):
+                table.clear()
+
+metrics = RouteMetrics()
+
+# Extra gauges rendered on /metrics: name -> (help, fn returning a number or
+# a {label dict as tuple of pairs: value} mapping)
+_gauges = {}
+
+def register_gauge(name: str, help: str, fn):
+    _gauges[name] = (help, fn)
+
+def _labels(pairs) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}" if pairs else ""
+
+def _histogram_lines(name: str, help: str, histograms: dict):
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for (method, route), histogram in sorted(histograms.items()):
+        base = (("method", method), ("route", route))
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f"{name}_bucket{_labels(base + (('le', f'{bound:g}'),))} {count}")
+        lines.append(f"{name}_bucket{_labels(base + (('le', '+Inf'),))} {histogram.total}")
+        lines.append(f"{name}_sum{_labels(base)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{_labels(base)} {histogram.total}")
+    return lines
+
+# Prometheus text exposition format
+def render_metrics() -> str:
+    with metrics._lock:
+        lines = ["# HELP techtalk_http_requests_total Requests handled, by route and status",
+                 "# TYPE techtalk_http_requests_total counter"]
+        for (method, route, status), count in sorted(metrics.requests.items()):
+            lines.append(f"techtalk_http_requests_total{_labels((('method', method), ('route', route), ('status', status)))} {count}")
+        lines += _histogram_lines("techtalk_http_request_duration_seconds", "Time to first response byte", metrics.durations)
+        lines += _histogram_lines("techtalk_db_duration_seconds", "Time spent in SQL per request", metrics.db_durations)
+        lines += _histogram_lines("techtalk_db_queries_per_request", "SQL statements per request", metrics.queries)
+        lines += ["# HELP techtalk_db_rows_total Rows written or ORM objects loaded",
+                  "# TYPE techtalk_db_rows_total counter"]
+        for (method, route), rows in sorted(metrics.rows.items()):
+            lines.append(f"techtalk_db_rows_total{_labels((('method', method), ('route', route)))} {rows}")
+
+    for name, (help, fn) in sorted(_gauges.items()):
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        value = fn()
+        if isinstance(value, dict):
+            for labels, sample in sorted(value.items()):
+                lines.append(f"{name}{_labels(labels)} {sample}")
+        else:
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+# Route template for the matched endpoint, so /posts/12 and /posts/13 share a series
+def route_template(app, scope) -> str:
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    templates = getattr(app, "_route_templates", None)
+    if templates is None:
+        templates = app._route_templates = {
+            route.endpoint: route.path for route in app.routes if hasattr(route, "endpoint")
+        }
+    return templates.get(endpoint, "unmatched")
+
+# ASGI middleware: collects RequestStats, adds Server-Timing and records the
+# request in `metrics` once the response has started
+class InstrumentationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                headers = list(message.get("headers", []))
+                headers.append((SERVER_TIMING_HEADER.encode(), server_timing(stats, elapsed).encode()))
+                message["headers"] = headers
+                metrics.record(scope["method"], route_template(scope["app"], scope), message["status"], elapsed, stats)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# Durable background jobs for side-effects of write requests
+#
+# A handler calls enqueue() before its own commit, so the job row lands in the
+# jobs outbox atomically with the action and the request pays for one commit.
+# Worker threads pick jobs up right after that commit and run them on their
+# own session. A job handler only adds its writes to that session; the queue
+# deletes the job and commits both together, so a job that wrote its result
+# is never run again. Failures are retried with exponential backoff and kept
+# as "failed" after MAX_ATTEMPTS. Jobs left over from a crash or still
+# waiting for a retry survive restarts.
+#
+# Side-effects outside the database (pushes to open streams) run after that
+# commit and are at-most-once.
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Job
+
+JOB_WORKERS = int(os.getenv("TECHTALK_JOB_WORKERS", "1"))
+MAX_ATTEMPTS = int(os.getenv("TECHTALK_JOB_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = float(os.getenv("TECHTALK_JOB_RETRY_BASE", "2"))
+# Idle workers also wake up this often, for retries that came due
+POLL_SECONDS = 1.0
+SHUTDOWN_TIMEOUT_SECONDS = 10
+# A job still "running" this long after it was claimed is taken to belong to
+# a worker that died, and is handed out again on the next start()
+CLAIM_TIMEOUT_SECONDS = float(os.getenv("TECHTALK_JOB_CLAIM_TIMEOUT", "300"))
+
+logger = logging.getLogger("techtalk.jobs")
+
+_handlers = {}
+
+# Register fn(db, **payload) as the handler for `kind`. It must not commit -
+# its writes are committed with the job's deletion. It may return a function
+# to call once that commit is done.
+def handler(kind: str):
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+# Add a job to the caller's transaction; it becomes visible (and workers are
+# woken) when the caller commits
+def enqueue(db: Session, kind: str, **payload):
+    if kind not in _handlers:
+        raise ValueError(f"No job handler registered for {kind!r}")
+    db.add(Job(kind=kind, payload=json.dumps(payload)))
+    db.info["jobs_enqueued"] = True
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop("jobs_enqueued", False):
+        queue.wake()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("jobs_enqueued", None)
+
+def retry_delay(attempts: int) -> float:
+    return RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+
+class JobQueue:
+    def __init__(self, session_factory, workers: int):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.stats = {"processed": 0, "retried": 0, "failed": 0}
+        self._threads = []
+        self._wake = threading.Event()
+        self._stopping = False
+        self._stats_lock = threading.Lock()
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self._threads:
+            return
+        # Claims this old were interrupted by a crash or a hard stop; newer
+        # ones may belong to another live worker process
+        stale = datetime.utcnow() - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)
+        db = self.session_factory()
+        try:
+            db.query(Job).filter(
+                Job.status == "running", (Job.claimed_at == None) | (Job.claimed_at < stale)
+            ).update({"status": "pending"}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        self._stopping = False
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"jobs-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # Stop accepting new work once everything runnable now has been run
+    def shutdown(self, timeout: float = SHUTDOWN_TIMEOUT_SECONDS):
+        self._stopping = True
+        self._wake.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+
+    def _work(self):
+        while True:
+            self._wake.clear()
+            if self.run_once():
+                continue
+            if self._stopping:
+                return
+            self._wake.wait(POLL_SECONDS)
+
+    # Claim and run one due job; False when there was none
+    def run_once(self) -> bool:
+        db = self.session_factory()
+        try:
+            job = self._claim(db)
+            if job is None:
+                return False
+            self._execute(db, job)
+            return True
+        finally:
+            db.close()
+
+    # Run due jobs on the calling thread until none are left
+    def run_pending(self) -> int:
+        count = 0
+        while self.run_once():
+            count += 1
+        return count
+
+    def _claim(self, db: Session):
+        while True:
+            job = db.query(Job).filter(
+                Job.status == "pending", Job.run_after <= datetime.utcnow()
+            ).order_by(Job.run_after, Job.id).first()
+            if job is None:
+                db.rollback()
+                return None
+            # Another worker may have claimed it between the select and here
+            claimed = db.query(Job).filter(Job.id == job.id, Job.status == "pending").update(
+                {"status": "running", "attempts": Job.attempts + 1, "claimed_at": datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.commit()
+            if claimed:
+                return job
+
+    def _execute(self, db: Session, job: Job):
+        job_id, kind, attempts = job.id, job.kind, job.attempts
+        try:
+            after_commit = _handlers[kind](db, **json.loads(job.payload))
+            db.query(Job).filter(Job.id == job_id).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            update = {"last_error": f"{type(e).__name__}: {e}"}
+            if attempts >= MAX_ATTEMPTS:
+                update["status"] = "failed"
+                self._count("failed")
+            else:
+                update["status"] = "pending"
+                update["run_after"] = datetime.utcnow() + timedelta(seconds=retry_delay(attempts))
+                self._count("retried")
+            db.query(Job).filter(Job.id == job_id).update(update, synchronize_session=False)
+            db.commit()
+            return
+        self._count("processed")
+        if after_commit is not None:
+            try:
+                after_commit()
+            except Exception:
+                logger.exception("After-commit step of %s job %s failed", kind, job_id)
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    # Block until no job is due or running - for tests and scripts
+    def wait_idle(self, timeout: float = 5) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.backlog(due_only=True) == 0:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def backlog(self, due_only: bool = False) -> int:
+        db = self.session_factory()
+        try:
+            query = db.query(func.count(Job.id)).filter(Job.status.in_(["pending", "running"]))
+            if due_only:
+                query = query.filter((Job.status == "running") | (Job.run_after <= datetime.utcnow()))
+            return query.scalar()
+        finally:
+            db.close()
+
+queue = JobQueue(SessionLocal, JOB_WORKERS)
+
+if __name__ == "__main__":
+    # Run whatever is due once, e.g. after the API was stopped with jobs left over
+    import notifications  # registers the notification handlers
+    ran = queue.run_pending()
+    db = SessionLocal()
+    try:
+        counts = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    finally:
+        db.close()
+    print(f"✅ Ran {ran} jobs ({queue.stats['retried']} to retry, {queue.stats['failed']} failed)")
+    print(f"   Outbox now: {counts or 'empty'}")
@@ -1,20 +1,37 @@
 # Main FastAPI application with all routes
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
-from typing import List
-from datetime import datetime
+from fastapi.responses import FileResponse, PlainTextResponse
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, or_
+from typing import List, Optional
 
-from database import get_db, init_db
+from database import get_db, get_read_db, init_db, ASYNC_MODE, write_engine, read_engine
 from models import User, Post, Comment, Like, Follower, Notification, Repost, Message
 from schemas import (
     UserCreate, UserLogin, UserUpdate, UserResponse,
     PostCreate, PostUpdate, PostResponse,
     CommentCreate, CommentResponse,
-    NotificationResponse, Token, MessageCreate, MessageResponse
+    NotificationResponse, Token, MessageCreate, MessageResponse, ConversationResponse
 )
-from auth import hash_password, verify_password, create_access_token, get_current_user
+from auth import create_access_token, get_current_user, get_stream_user, get_admin_user, invalidate_principal, principal_cache
+from hashing import hash_password_offloaded, verify_password_offloaded, needs_rehash, shutdown_pool
+from engagement import post_query, hydrate_posts, hydrate_post
+from counters import bump_counter, add_counted, remove_counted
+from pagination import NEXT_CURSOR_HEADER, paginate_desc, next_cursor, set_next_cursor
+import timeline
+import trending
+import response_cache
+import jobs
+from notifications import enqueue_notification, enqueue_activity, publish_unread_count, unread_count, open_stream
+from etags import ETAG_HEADER, make_etag, etag_matches, not_modified, post_etag, comments_etag
+from search import search_post_page, search_user_page
+from conversations import conversation_page
+from chat import send_direct_message, mark_thread_read, chat_socket, hub
+from instrumentation import InstrumentationMiddleware, register_gauge, render_metrics
+import profiling
+from profiling import ProfilingMiddleware, PROFILE_ID_HEADER
+import anyio.to_thread
 
 app = FastAPI(title="TechTalk API")
 
@@ -25,18 +42,81 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER, PROFILE_ID_HEADER],
 )
 
+# Opt-in sampling profiles of single requests - see profiling.py
+app.add_middleware(ProfilingMiddleware)
+
+# SQL statements, rows and DB time per request - Server-Timing header on every
+# response, per-route histograms on /metrics
+app.add_middleware(InstrumentationMiddleware)
+
+def _pool_gauge():
+    samples = {}
+    for name, bound in (("write", write_engine), ("read", read_engine)):
+        pool = bound.pool
+        for state, value in (("checked_out", pool.checkedout()), ("idle", pool.checkedin()), ("size", pool.size())):
+            samples[(("engine", name), ("state", state))] = value
+    return samples
+
+def _threadpool_gauge():
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return {(("state", "busy"),): limiter.borrowed_tokens, (("state", "limit"),): limiter.total_tokens}
+
+register_gauge("techtalk_db_pool_connections", "SQLAlchemy pool connections per engine", _pool_gauge)
+register_gauge("techtalk_threadpool_threads", "Threadpool running sync handlers", _threadpool_gauge)
+register_gauge("techtalk_principal_cache", "Authenticated-user cache",
+               lambda: {(("stat", name),): value for name, value in principal_cache.stats().items()})
+register_gauge("techtalk_response_cache", "Response cache lookups by result",
+               lambda: {(("result", name),): value for name, value in response_cache.stats.items()})
+register_gauge("techtalk_jobs", "Background jobs by outcome",
+               lambda: {(("outcome", name),): value for name, value in jobs.queue.stats.items()})
+register_gauge("techtalk_websockets", "Open /ws/messages sockets",
+               lambda: {(("kind", name),): value for name, value in hub.stats().items()})
+
+# Async mode - the hot read routes in async_routes.py are registered first so
+# they take precedence over the sync handlers below
+if ASYNC_MODE:
+    import async_routes
+    app.include_router(async_routes.router)
+
 # Initialize database on startup
 @app.on_event("startup")
 def startup_event():
     init_db()
+    jobs.queue.start()
+
+# Run the jobs that are due, then stop the job and password hashing workers
+@app.on_event("shutdown")
+def shutdown_event():
+    jobs.queue.shutdown()
+    shutdown_pool()
 
 # Root endpoint
 @app.get("/")
 def root():
     return {"message": "TechTalk API"}
 
+# Prometheus scrape target. Async so the threadpool gauge reads the event
+# loop's limiter, and so a saturated threadpool can still be scraped.
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Stored request profiles, newest first
+@app.get("/admin/profiles")
+def list_profiles(admin: User = Depends(get_admin_user)):
+    return profiling.store.list()
+
+# One profile as collapsed stacks, ready for flamegraph.pl or speedscope
+@app.get("/admin/profiles/{profile_id}")
+def download_profile(profile_id: str, admin: User = Depends(get_admin_user)):
+    path = profiling.store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.collapsed")
+
 # Register new user
 @app.post("/register", response_model=Token)
 def register(user_data: UserCreate, db: Session = Depends(get_db)):
@@ -52,7 +132,7 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     new_user = User(
         username=user_data.username,
         email=user_data.email,
-        password=hash_password(user_data.password),
+        password=hash_password_offloaded(user_data.password),
         security_question=user_data.security_question,
         security_answer=user_data.security_answer
     )
@@ -71,16 +151,31 @@ def login(credentials: UserLogin, db: Session = Depends(get_db)):
     user = db.query(User).filter(
         or_(User.email == credentials.email, User.username == credentials.email)
     ).first()
-    if not user or not verify_password(credentials.password, user.password):
+    if not user or not verify_password_offloaded(credentials.password, user.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Upgrade hashes made with an old bcrypt cost while we have the plaintext
+    if needs_rehash(user.password):
+        user.password = hash_password_offloaded(credentials.password)
+        db.commit()
+        invalidate_principal(user.id)
+    
     # Create access token
     token = create_access_token({"sub": user.id})
     return {"access_token": token, "token_type": "bearer", "user": user}
 
 # Get current user profile
 @app.get("/profile", response_model=UserResponse)
-def get_profile(current_user: User = Depends(get_current_user)):
+def get_profile(
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
+):
+    # The principal carries the row version - a revalidation needs no query
+    etag = make_etag("user", current_user.id, current_user.version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers[ETAG_HEADER] = etag
     return current_user
 
 # Update user profile
@@ -90,27 +185,63 @@ def update_profile(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    # current_user may come detached from the principal cache - attach it to write
+    db.add(current_user)
     if profile_data.bio is not None:
         current_user.bio = profile_data.bio
     if profile_data.profile_pic is not None:
         current_user.profile_pic = profile_data.profile_pic
+    current_user.version = User.version + 1
     
     db.commit()
+    invalidate_principal(current_user.id)
+    response_cache.invalidate(f"user:{current_user.id}")
     db.refresh(current_user)
     return current_user
 
+# Get suggested users to follow - declared before /users/{user_id} so it is not shadowed
+@app.get("/users/suggested", response_model=List[UserResponse])
+def get_suggested_users(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    limit: int = 5
+):
+    # Get users current user is already following
+    following_ids = db.query(Follower.followed_id).filter(
+        Follower.follower_id == current_user.id
+    ).all()
+    following_ids = [f[0] for f in following_ids]
+    following_ids.append(current_user.id)
+    
+    # Get users not being followed, ordered by follower count
+    suggested = db.query(User).filter(
+        User.id.notin_(following_ids)
+    ).limit(limit).all()
+    
+    return suggested
+
 # Get user by ID (no auth required)
 @app.get("/users/{user_id}", response_model=UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
-
-# Search users by username (no auth required)
+def get_user(user_id: int, if_none_match: Optional[str] = Header(None)):
+    def load(db):
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        etag = make_etag("user", user.id, user.version)
+        return UserResponse.model_validate(user), [f"user:{user_id}"], {ETAG_HEADER: etag}
+    return response_cache.cached("/users/{user_id}", {"user_id": user_id}, load, if_none_match)
+
+# Search users by username and bio (no auth required) - ranked, prefix matching
 @app.get("/search/users", response_model=List[UserResponse])
-def search_users(q: str, db: Session = Depends(get_db)):
-    users = db.query(User).filter(User.username.contains(q)).limit(20).all()
+def search_users(
+    q: str,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100)
+):
+    users, cursor = search_user_page(db, q, cursor, limit)
+    set_next_cursor(response, cursor)
     return users
 
 # Create new post
@@ -127,145 +258,95 @@ def create_post(
         tags=post_data.tags or ""
     )
     db.add(new_post)
+    db.flush()
+    timeline.fan_out_post(db, new_post)
+    trending.index_post_tags(db, new_post)
     db.commit()
+    response_cache.invalidate("feed:public", f"user-posts:{current_user.id}")
     db.refresh(new_post)
     
     # Add computed fields
-    new_post.likes_count = 0
-    new_post.comments_count = 0
     new_post.is_liked = False
+    new_post.is_reposted = False
     return new_post
 
 # Get public feed - all recent posts (no auth required)
+# Pass the X-Next-Cursor header of a page back as ?cursor= to get the next one
 @app.get("/feed/public", response_model=List[PostResponse])
 def get_public_feed(
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 50
 ):
-    posts = db.query(Post).order_by(Post.timestamp.desc()).offset(skip).limit(limit).all()
-    
-    result = []
-    for post in posts:
-        post.likes_count = db.query(func.count(Like.id)).filter(Like.post_id == post.id).scalar()
-        post.comments_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post.id).scalar()
-        post.is_liked = False
-        result.append(post)
-    
-    return result
+    def load(db):
+        posts = hydrate_posts(db, paginate_desc(post_query(db), Post.timestamp, Post.id, cursor, skip, limit))
+        payload = [PostResponse.model_validate(post) for post in posts]
+        tags = response_cache.post_tags(posts) | {"feed:public"}
+        return payload, tags, {NEXT_CURSOR_HEADER: next_cursor(posts, limit)}
+    params = {"cursor": cursor, "skip": skip, "limit": limit}
+    return response_cache.cached("/feed/public", params, load)
 
 # Get feed - posts from followed users
 @app.get("/feed", response_model=List[PostResponse])
 def get_feed(
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 50
 ):
-    followed_ids = db.query(Follower.followed_id).filter(
-        Follower.follower_id == current_user.id
-    ).all()
-    followed_ids = [f[0] for f in followed_ids]
-    followed_ids.append(current_user.id)  # Include own posts
-    
-    posts = db.query(Post).filter(
-        Post.user_id.in_(followed_ids)
-    ).order_by(Post.timestamp.desc()).offset(skip).limit(limit).all()
-    
-    result = []
-    for post in posts:
-        likes_count = db.query(func.count(Like.id)).filter(Like.post_id == post.id).scalar()
-        comments_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post.id).scalar()
-        is_liked = db.query(Like).filter(
-            Like.post_id == post.id, Like.user_id == current_user.id
-        ).first() is not None
-        
-        post.likes_count = likes_count
-        post.comments_count = comments_count
-        post.is_liked = is_liked
-        result.append(post)
-    
-    return result
-
-# Get suggested users to follow
-@app.get("/users/suggested", response_model=List[UserResponse])
-def get_suggested_users(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    limit: int = 5
-):
-    # Get users current user is already following
-    following_ids = db.query(Follower.followed_id).filter(
-        Follower.follower_id == current_user.id
-    ).all()
-    following_ids = [f[0] for f in following_ids]
-    following_ids.append(current_user.id)
-    
-    # Get users not being followed, ordered by follower count
-    suggested = db.query(User).filter(
-        User.id.notin_(following_ids)
-    ).limit(limit).all()
-    
-    return suggested
+    # Own posts and followed users' posts, materialized by timeline.py
+    posts = timeline.read_timeline(db, current_user.id, cursor, skip, limit)
+    set_next_cursor(response, next_cursor(posts, limit))
+    return hydrate_posts(db, posts, current_user.id)
 
 # Get single post by ID
 @app.get("/posts/{post_id}", response_model=PostResponse)
 def get_post(
     post_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
-    post = db.query(Post).filter(Post.id == post_id).first()
+    etag = post_etag(db, post_id, current_user.id)
+    if not etag:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers[ETAG_HEADER] = etag
+    
+    post = post_query(db).filter(Post.id == post_id).first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
     # Add computed fields
-    post.likes_count = db.query(func.count(Like.id)).filter(Like.post_id == post.id).scalar()
-    post.comments_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post.id).scalar()
-    post.is_liked = db.query(Like).filter(
-        Like.post_id == post.id, Like.user_id == current_user.id
-    ).first() is not None
-    
-    return post
+    return hydrate_post(db, post, current_user.id)
 
 # Get posts by user ID (public - no auth required)
 @app.get("/users/{user_id}/posts", response_model=List[PostResponse])
-def get_user_posts(
-    user_id: int,
-    db: Session = Depends(get_db)
-):
-    posts = db.query(Post).filter(Post.user_id == user_id).order_by(Post.timestamp.desc()).all()
-    
-    result = []
-    for post in posts:
-        post.likes_count = db.query(func.count(Like.id)).filter(Like.post_id == post.id).scalar()
-        post.comments_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post.id).scalar()
-        post.is_liked = False  # Default to false for non-authenticated users
-        result.append(post)
-    
-    return result
+def get_user_posts(user_id: int):
+    def load(db):
+        posts = post_query(db).filter(Post.user_id == user_id).order_by(Post.timestamp.desc()).all()
+        posts = hydrate_posts(db, posts)  # is_liked stays false for non-authenticated users
+        payload = [PostResponse.model_validate(post) for post in posts]
+        return payload, response_cache.post_tags(posts) | {f"user-posts:{user_id}", f"user:{user_id}"}, {}
+    return response_cache.cached("/users/{user_id}/posts", {"user_id": user_id}, load)
 
 # Get user's reposts (public - no auth required)
 @app.get("/users/{user_id}/reposts", response_model=List[PostResponse])
 def get_user_reposts(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     # Get post IDs that user has reposted
     repost_ids = db.query(Repost.post_id).filter(Repost.user_id == user_id).all()
     repost_ids = [r[0] for r in repost_ids]
     
     # Get the actual posts
-    posts = db.query(Post).filter(Post.id.in_(repost_ids)).order_by(Post.timestamp.desc()).all()
-    
-    result = []
-    for post in posts:
-        post.likes_count = db.query(func.count(Like.id)).filter(Like.post_id == post.id).scalar()
-        post.comments_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post.id).scalar()
-        post.is_liked = False
-        result.append(post)
-    
-    return result
+    posts = post_query(db).filter(Post.id.in_(repost_ids)).order_by(Post.timestamp.desc()).all()
+    return hydrate_posts(db, posts)
 
 # Update post
 @app.put("/posts/{post_id}", response_model=PostResponse)
@@ -284,17 +365,16 @@ def update_post(
     post.content = post_data.content
     if post_data.image_url is not None:
         post.image_url = post_data.image_url
+    if post_data.tags is not None and post_data.tags != post.tags:
+        post.tags = post_data.tags
+        trending.reindex_post_tags(db, post)
+    post.version = Post.version + 1
     
     db.commit()
+    response_cache.invalidate(f"post:{post_id}")
     db.refresh(post)
     
-    post.likes_count = db.query(func.count(Like.id)).filter(Like.post_id == post.id).scalar()
-    post.comments_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post.id).scalar()
-    post.is_liked = db.query(Like).filter(
-        Like.post_id == post.id, Like.user_id == current_user.id
-    ).first() is not None
-    
-    return post
+    return hydrate_post(db, post, current_user.id)
 
 # Delete post
 @app.delete("/posts/{post_id}")
@@ -309,29 +389,26 @@ def delete_post(
     if post.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    timeline.remove_post(db, post.id)
+    trending.unindex_post_tags(db, post)
     db.delete(post)
     db.commit()
+    response_cache.invalidate(f"post:{post_id}", f"comments:{post_id}", "feed:public", f"user-posts:{current_user.id}")
     return {"message": "Post deleted"}
 
-# Search posts
+# Search posts by content and tags - ranked, prefix matching
 @app.get("/search/posts", response_model=List[PostResponse])
 def search_posts(
     q: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100)
 ):
-    posts = db.query(Post).filter(Post.content.contains(q)).order_by(Post.timestamp.desc()).limit(20).all()
-    
-    result = []
-    for post in posts:
-        post.likes_count = db.query(func.count(Like.id)).filter(Like.post_id == post.id).scalar()
-        post.comments_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post.id).scalar()
-        post.is_liked = db.query(Like).filter(
-            Like.post_id == post.id, Like.user_id == current_user.id
-        ).first() is not None
-        result.append(post)
-    
-    return result
+    posts, cursor = search_post_page(db, q, cursor, limit)
+    set_next_cursor(response, cursor)
+    return hydrate_posts(db, posts, current_user.id)
 
 # Create comment on post
 @app.post("/posts/{post_id}/comments", response_model=CommentResponse)
@@ -353,26 +430,28 @@ def create_comment(
         content=comment_data.content
     )
     db.add(new_comment)
+    bump_counter(db, post_id, Post.comments_count, 1)
+    # Notify the post author - runs in the background after this commit
+    if post.user_id != current_user.id:
+        enqueue_notification(db, post.user_id, "comment", f"{current_user.username} commented on your post")
     db.commit()
+    response_cache.invalidate(f"post:{post_id}", f"comments:{post_id}")
     db.refresh(new_comment)
     
-    # Create notification for post author
-    if post.user_id != current_user.id:
-        notification = Notification(
-            user_id=post.user_id,
-            type="comment",
-            message=f"{current_user.username} commented on your post"
-        )
-        db.add(notification)
-        db.commit()
-    
     return new_comment
 
 # Get comments for a post (PUBLIC - no auth required)
 @app.get("/posts/{post_id}/comments", response_model=List[CommentResponse])
-def get_comments(post_id: int, db: Session = Depends(get_db)):
-    comments = db.query(Comment).filter(Comment.post_id == post_id).order_by(Comment.timestamp.desc()).all()
-    return comments
+def get_comments(post_id: int, if_none_match: Optional[str] = Header(None)):
+    def load(db):
+        comments = db.query(Comment).options(joinedload(Comment.author), joinedload(Comment.post)).filter(
+            Comment.post_id == post_id
+        ).order_by(Comment.timestamp.desc()).all()
+        payload = [CommentResponse.model_validate(comment) for comment in comments]
+        tags = {f"comments:{post_id}"} | {f"user:{comment.user_id}" for comment in comments}
+        etag = comments_etag(post_id, comments)
+        return payload, tags, {ETAG_HEADER: etag}
+    return response_cache.cached("/posts/{post_id}/comments", {"post_id": post_id}, load, if_none_match)
 
 # Delete comment
 @app.delete("/comments/{comment_id}")
@@ -388,7 +467,9 @@ def delete_comment(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     db.delete(comment)
+    bump_counter(db, comment.post_id, Post.comments_count, -1)
     db.commit()
+    response_cache.invalidate(f"post:{comment.post_id}", f"comments:{comment.post_id}")
     return {"message": "Comment deleted"}
 
 # Like a post
@@ -398,34 +479,21 @@ def like_post(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Check if post exists
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    # Check if already liked
-    existing_like = db.query(Like).filter(
-        Like.post_id == post_id, Like.user_id == current_user.id
-    ).first()
-    if existing_like:
-        raise HTTPException(status_code=400, detail="Already liked")
-    
-    # Create like
-    new_like = Like(user_id=current_user.id, post_id=post_id)
-    db.add(new_like)
-    db.commit()
-    
-    # Create notification for post author
-    if post.user_id != current_user.id:
-        notification = Notification(
-            user_id=post.user_id,
-            type="like",
-            message=f"{current_user.username} liked your post"
+    # Idempotent - liking twice succeeds with created=false
+    try:
+        created, author_id = add_counted(
+            db, Like, {"user_id": current_user.id, "post_id": post_id}, Post.likes_count, post_id, Post.user_id
         )
-        db.add(notification)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if created:
+        # Notify the post author - runs in the background after this commit
+        if author_id != current_user.id:
+            enqueue_activity(db, author_id, "like", current_user, post_id)
         db.commit()
+        response_cache.invalidate(f"post:{post_id}")
     
-    return {"message": "Post liked"}
+    return {"message": "Post liked", "created": created}
 
 # Unlike a post
 @app.delete("/posts/{post_id}/likes")
@@ -434,14 +502,10 @@ def unlike_post(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    like = db.query(Like).filter(
-        Like.post_id == post_id, Like.user_id == current_user.id
-    ).first()
-    if not like:
+    if not remove_counted(db, Like, [Like.post_id == post_id, Like.user_id == current_user.id], Post.likes_count, post_id):
         raise HTTPException(status_code=404, detail="Like not found")
-    
-    db.delete(like)
     db.commit()
+    response_cache.invalidate(f"post:{post_id}")
     return {"message": "Post unliked"}
 
 # Follow a user
@@ -455,34 +519,20 @@ def follow_user(
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot follow yourself")
     
-    # Check if user exists
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    # Idempotent - following twice succeeds with created=false
+    try:
+        created, _ = add_counted(
+            db, Follower, {"follower_id": current_user.id, "followed_id": user_id}, User.followers_count, user_id
+        )
+    except LookupError:
         raise HTTPException(status_code=404, detail="User not found")
+    if created:
+        timeline.backfill(db, current_user.id, user_id)
+        enqueue_activity(db, user_id, "follow", current_user)
+        db.commit()
+        response_cache.invalidate("trending-users")
     
-    # Check if already following
-    existing_follow = db.query(Follower).filter(
-        Follower.follower_id == current_user.id,
-        Follower.followed_id == user_id
-    ).first()
-    if existing_follow:
-        raise HTTPException(status_code=400, detail="Already following")
-    
-    # Create follow relationship
-    new_follow = Follower(follower_id=current_user.id, followed_id=user_id)
-    db.add(new_follow)
-    db.commit()
-    
-    # Create notification
-    notification = Notification(
-        user_id=user_id,
-        type="follow",
-        message=f"{current_user.username} started following you"
-    )
-    db.add(notification)
-    db.commit()
-    
-    return {"message": "User followed"}
+    return {"message": "User followed", "created": created}
 
 # Unfollow a user
 @app.delete("/users/{user_id}/follow")
@@ -491,20 +541,18 @@ def unfollow_user(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    follow = db.query(Follower).filter(
-        Follower.follower_id == current_user.id,
-        Follower.followed_id == user_id
-    ).first()
-    if not follow:
+    following = [Follower.follower_id == current_user.id, Follower.followed_id == user_id]
+    if not remove_counted(db, Follower, following, User.followers_count, user_id):
         raise HTTPException(status_code=404, detail="Not following this user")
-    
-    db.delete(follow)
+    timeline.prune(db, current_user.id, user_id)
+    timeline.rejoin_fan_out(db, user_id)
     db.commit()
+    response_cache.invalidate("trending-users")
     return {"message": "User unfollowed"}
 
 # Get user's followers
 @app.get("/users/{user_id}/followers", response_model=List[UserResponse])
-def get_followers(user_id: int, db: Session = Depends(get_db)):
+def get_followers(user_id: int, db: Session = Depends(get_read_db)):
     followers = db.query(User).join(
         Follower, Follower.follower_id == User.id
     ).filter(Follower.followed_id == user_id).all()
@@ -512,7 +560,7 @@ def get_followers(user_id: int, db: Session = Depends(get_db)):
 
 # Get users that a user is following
 @app.get("/users/{user_id}/following", response_model=List[UserResponse])
-def get_following(user_id: int, db: Session = Depends(get_db)):
+def get_following(user_id: int, db: Session = Depends(get_read_db)):
     following = db.query(User).join(
         Follower, Follower.followed_id == User.id
     ).filter(Follower.follower_id == user_id).all()
@@ -523,7 +571,7 @@ def get_following(user_id: int, db: Session = Depends(get_db)):
 def is_following(
     user_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     follow = db.query(Follower).filter(
         Follower.follower_id == current_user.id,
@@ -535,13 +583,20 @@ def is_following(
 @app.get("/notifications", response_model=List[NotificationResponse])
 def get_notifications(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     notifications = db.query(Notification).filter(
         Notification.user_id == current_user.id
     ).order_by(Notification.timestamp.desc()).limit(50).all()
     return notifications
 
+# Live notifications and unread counts as Server-Sent Events - replaces polling
+# /notifications/unread-count. EventSource cannot set headers, so the token may
+# be passed as ?token= instead.
+@app.get("/notifications/stream")
+async def stream_notifications(request: Request, current_user: User = Depends(get_stream_user)):
+    return await open_stream(request, current_user.id)
+
 # Mark notification as read
 @app.put("/notifications/{notification_id}/read")
 def mark_notification_read(
@@ -557,6 +612,7 @@ def mark_notification_read(
     
     notification.read = True
     db.commit()
+    publish_unread_count(db, current_user.id)
     return {"message": "Notification marked as read"}
 
 # Mark all notifications as read
@@ -570,6 +626,7 @@ def mark_all_notifications_read(
         Notification.read == False
     ).update({"read": True})
     db.commit()
+    publish_unread_count(db, current_user.id)
     return {"message": "All notifications marked as read"}
 
 
@@ -580,30 +637,20 @@ def repost_post(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    existing_repost = db.query(Repost).filter(
-        Repost.post_id == post_id, Repost.user_id == current_user.id
-    ).first()
-    if existing_repost:
-        raise HTTPException(status_code=400, detail="Already reposted")
-    
-    new_repost = Repost(user_id=current_user.id, post_id=post_id)
-    db.add(new_repost)
-    db.commit()
-    
-    if post.user_id != current_user.id:
-        notification = Notification(
-            user_id=post.user_id,
-            type="repost",
-            message=f"{current_user.username} reposted your post"
+    # Idempotent - reposting twice succeeds with created=false
+    try:
+        created, author_id = add_counted(
+            db, Repost, {"user_id": current_user.id, "post_id": post_id}, Post.reposts_count, post_id, Post.user_id
         )
-        db.add(notification)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if created:
+        if author_id != current_user.id:
+            enqueue_activity(db, author_id, "repost", current_user, post_id)
         db.commit()
+        response_cache.invalidate(f"post:{post_id}")
     
-    return {"message": "Post reposted"}
+    return {"message": "Post reposted", "created": created}
 
 # Unrepost a post
 @app.delete("/posts/{post_id}/repost")
@@ -612,14 +659,10 @@ def unrepost_post(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    repost = db.query(Repost).filter(
-        Repost.post_id == post_id, Repost.user_id == current_user.id
-    ).first()
-    if not repost:
+    if not remove_counted(db, Repost, [Repost.post_id == post_id, Repost.user_id == current_user.id], Post.reposts_count, post_id):
         raise HTTPException(status_code=404, detail="Repost not found")
-    
-    db.delete(repost)
     db.commit()
+    response_cache.invalidate(f"post:{post_id}")
     return {"message": "Repost removed"}
 
 # Send a direct message
@@ -629,80 +672,61 @@ def send_message(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    receiver = db.query(User).filter(User.id == message_data.receiver_id).first()
-    if not receiver:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    new_message = Message(
-        sender_id=current_user.id,
-        receiver_id=message_data.receiver_id,
-        content=message_data.content
-    )
-    db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
-    
-    notification = Notification(
-        user_id=message_data.receiver_id,
-        type="message",
-        message=f"{current_user.username} sent you a message"
-    )
-    db.add(notification)
-    db.commit()
-    
-    return new_message
+    # Also pushed to both participants' /ws/messages sockets
+    return send_direct_message(db, current_user, message_data.receiver_id, message_data.content)
 
-# Get conversations list
-@app.get("/messages/conversations")
+# Get conversations list - read from the per-user summaries in conversations.py
+@app.get("/messages/conversations", response_model=List[ConversationResponse])
 def get_conversations(
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50
 ):
-    from sqlalchemy import or_, and_
-    
-    messages = db.query(Message).filter(
-        or_(Message.sender_id == current_user.id, Message.receiver_id == current_user.id)
-    ).order_by(Message.timestamp.desc()).all()
-    
-    conversations = {}
-    for msg in messages:
-        other_user_id = msg.receiver_id if msg.sender_id == current_user.id else msg.sender_id
-        if other_user_id not in conversations:
-            other_user = db.query(User).filter(User.id == other_user_id).first()
-            unread = db.query(func.count(Message.id)).filter(
-                and_(Message.sender_id == other_user_id, Message.receiver_id == current_user.id, Message.read == False)
-            ).scalar()
-            conversations[other_user_id] = {
-                "user": other_user,
-                "last_message": msg.content,
-                "last_message_time": msg.timestamp,
-                "unread_count": unread
-            }
-    
-    return list(conversations.values())
+    rows = conversation_page(db, current_user.id, cursor, skip, limit)
+    set_next_cursor(response, next_cursor(rows, limit, "last_message_time"))
+    return [
+        {
+            "user": row.partner,
+            "last_message": row.last_message,
+            "last_message_time": row.last_message_time,
+            "unread_count": row.unread_count
+        }
+        for row in rows
+    ]
 
 # Get messages with a specific user
 @app.get("/messages/{user_id}", response_model=List[MessageResponse])
 def get_messages(
     user_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    after_id: Optional[int] = None
 ):
-    from sqlalchemy import or_, and_
-    
-    messages = db.query(Message).filter(
+    # after_id: only messages newer than the last one the client holds, for
+    # catching up after a WebSocket reconnect instead of reloading the history
+    query = db.query(Message).filter(
         or_(
             and_(Message.sender_id == current_user.id, Message.receiver_id == user_id),
             and_(Message.sender_id == user_id, Message.receiver_id == current_user.id)
         )
-    ).order_by(Message.timestamp.asc()).all()
+    )
+    if after_id is not None:
+        query = query.filter(Message.id > after_id)
     
-    db.query(Message).filter(
-        and_(Message.sender_id == user_id, Message.receiver_id == current_user.id, Message.read == False)
-    ).update({"read": True})
-    db.commit()
+    # Mark first: the commit would expire already-loaded messages and
+    # serializing them would reload each one
+    mark_thread_read(db, current_user.id, user_id)
     
-    return messages
+    return query.order_by(Message.timestamp.asc()).all()
+
+# Real-time direct messages and read receipts - see chat.py for the protocol.
+# Authenticated with the same JWT, as ?token= or an Authorization header.
+@app.websocket("/ws/messages")
+async def messages_socket(websocket: WebSocket):
+    await chat_socket(websocket)
 
 
 # Password reset - verify security question
@@ -726,36 +750,33 @@ def reset_password(data: dict, db: Session = Depends(get_db)):
     if not user or user.security_answer.lower() != answer.lower():
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
-    user.password = hash_password(new_password)
+    user.password = hash_password_offloaded(new_password)
     db.commit()
+    invalidate_principal(user.id)
     return {"message": "Password reset successful"}
 
-# Get trending hashtags
+# Get trending hashtags - window is one of 1h, 24h, 7d
 @app.get("/trending/tags")
-def get_trending_tags(db: Session = Depends(get_db), limit: int = 10):
-    posts = db.query(Post).order_by(Post.timestamp.desc()).limit(100).all()
-    tag_counts = {}
-    for post in posts:
-        if post.tags:
-            for tag in post.tags.split(','):
-                tag = tag.strip()
-                if tag:
-                    tag_counts[tag] = tag_counts.get(tag, 0) + 1
-    sorted_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:limit]
-    return [{"tag": tag, "count": count} for tag, count in sorted_tags]
+def get_trending_tags(limit: int = 10, window: str = trending.DEFAULT_WINDOW, db: Session = Depends(get_read_db)):
+    if window not in trending.WINDOWS:
+        raise HTTPException(status_code=400, detail="Unknown window")
+    # Not in the response cache - trending.py keeps its own top-K, refreshed
+    # on a timer and after committed tag changes
+    return trending.trending_tags(db, window, limit)
 
 # Get trending users
 @app.get("/trending/users", response_model=List[UserResponse])
-def get_trending_users(db: Session = Depends(get_db), limit: int = 10):
-    users = db.query(User).join(Follower, Follower.followed_id == User.id)\
-        .group_by(User.id).order_by(func.count(Follower.id).desc()).limit(limit).all()
-    return users
+def get_trending_users(limit: int = 10):
+    def load(db):
+        # Walks ix_users_followers_count_id from the top - reads `limit` rows
+        users = db.query(User).filter(User.followers_count > 0).order_by(
+            User.followers_count.desc(), User.id.desc()
+        ).limit(limit).all()
+        tags = {"trending-users"} | {f"user:{user.id}" for user in users}
+        return [UserResponse.model_validate(user) for user in users], tags, {}
+    return response_cache.cached("/trending/users", {"limit": limit}, load)
 
 # Get unread notification count
 @app.get("/notifications/unread-count")
-def get_unread_count(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    count = db.query(func.count(Notification.id)).filter(
-        Notification.user_id == current_user.id,
-        Notification.read == False
-    ).scalar()
-    return {"unread_count": count}
+def get_unread_count(current_user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    return {"unread_count": unread_count(db, current_user.id)}
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# Versioned schema migrations for existing databases
+#
+# create_all only creates missing tables, so anything added to models.py after a
+# database was first created (columns, indexes, constraints, derived data) is
+# brought in here. Each migration runs once, in order, and is recorded in
+# schema_migrations. Steps are written to be idempotent so a fresh database
+# (already complete after create_all) passes through them harmlessly.
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from models import Base
+
+def add_missing_columns(db: Session):
+    conn = db.connection()
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"
+            if column.server_default is not None:
+                ddl += f" NOT NULL DEFAULT {column.server_default.arg}" if not column.nullable \
+                    else f" DEFAULT {column.server_default.arg}"
+            conn.execute(text(ddl))
+
+# Create the named indexes declared in models.py, if missing
+def create_indexes(db: Session, *names):
+    conn = db.connection()
+    declared = {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+    for name in names:
+        declared[name].create(bind=conn, checkfirst=True)
+
+# Keep the oldest row of each duplicate group so a unique index can be built
+def _dedupe(db: Session, table: str, columns: str):
+    db.execute(text(
+        f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {columns})"
+    ))
+
+def _engagement_counters(db: Session):
+    from counters import reconcile_counters
+    add_missing_columns(db)
+    reconcile_counters(db)
+    create_indexes(db, "ix_users_followers_count_id")
+
+def _keyset_indexes(db: Session):
+    create_indexes(db, "ix_posts_timestamp_id", "ix_posts_user_timestamp_id")
+
+def _search_index(db: Session):
+    from search import ensure_search_index
+    ensure_search_index(db.connection())
+
+def _timelines(db: Session):
+    from timeline import rebuild_timelines
+    rebuild_timelines(db)
+
+def _trending_tags(db: Session):
+    from trending import rebuild_tags
+    rebuild_tags(db)
+
+# Composite indexes for the hot lookups, plus one-row-per-pair uniqueness on
+# likes, reposts and follows. Duplicates left by earlier double-submits are
+# dropped first and the counters recomputed to match.
+def _hot_path_indexes(db: Session):
+    from counters import reconcile_counters
+    _dedupe(db, "likes", "post_id, user_id")
+    _dedupe(db, "reposts", "post_id, user_id")
+    _dedupe(db, "followers", "follower_id, followed_id")
+    create_indexes(
+        db,
+        "ux_likes_post_user",
+        "ux_reposts_post_user",
+        "ix_reposts_user_post",
+        "ux_followers_follower_followed",
+        "ix_followers_followed_follower",
+        "ix_comments_post_timestamp",
+        "ix_messages_sender_receiver_timestamp",
+        "ix_messages_receiver_sender_timestamp",
+        "ix_notifications_user_read_timestamp",
+        "ix_notifications_user_timestamp",
+    )
+    reconcile_counters(db)
+
+def _conversations(db: Session):
+    from conversations import rebuild_conversations
+    rebuild_conversations(db)
+
+def _row_versions(db: Session):
+    add_missing_columns(db)
+
+def _coalesced_notifications(db: Session):
+    add_missing_columns(db)
+    create_indexes(db, "ix_notifications_user_group_read")
+
+def _notification_actors(db: Session):
+    from notifications import seed_notification_actors
+    create_indexes(db, "ux_notification_actors_notification_actor")
+    seed_notification_actors(db)
+
+def _job_claims(db: Session):
+    add_missing_columns(db)
+
+# (version, name, step) - append only, never renumber
+MIGRATIONS = [
+    (1, "post_engagement_and_follower_counters", _engagement_counters),
+    (2, "keyset_pagination_indexes", _keyset_indexes),
+    (3, "materialized_timelines", _timelines),
+    (4, "fts5_search_index", _search_index),
+    (5, "trending_tag_buckets", _trending_tags),
+    (6, "hot_path_indexes_and_unique_pairs", _hot_path_indexes),
+    (7, "conversation_summaries", _conversations),
+    (8, "user_and_post_row_versions", _row_versions),
+    (9, "coalesced_activity_notifications", _coalesced_notifications),
+    (10, "notification_distinct_actors", _notification_actors),
+    (11, "job_claim_times", _job_claims),
+]
+
+def _ensure_version_table(db: Session):
+    db.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at DATETIME NOT NULL)"
+    ))
+    db.commit()
+
+def applied_versions(db: Session):
+    _ensure_version_table(db)
+    return {row[0] for row in db.execute(text("SELECT version FROM schema_migrations"))}
+
+# Apply every pending migration in order. Returns the names applied.
+def run_migrations(session_factory):
+    db = session_factory()
+    try:
+        done = applied_versions(db)
+        applied = []
+        for version, name, step in MIGRATIONS:
+            if version in done:
+                continue
+            step(db)
+            db.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow()},
+            )
+            db.commit()
+            applied.append(name)
+        return applied
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+    init_db()
+    db = SessionLocal()
+    try:
+        done = applied_versions(db)
+    finally:
+        db.close()
+    for version, name, _ in MIGRATIONS:
+        print(f"  {version:3d} {name} {'✅' if version in done else 'pending'}")
@@ -1,8 +1,9 @@
 # Database models for TechTalk application
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
+import json
 
 Base = declarative_base()
 
@@ -18,6 +19,15 @@ class User(Base):
     security_question = Column(String(255), default="")
     security_answer = Column(String(255), default="")
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Denormalized - kept in sync by follow/unfollow, recomputed by counters.py
+    followers_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped on every change to the row - backs the ETag of /users/{id} and /profile
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    
+    # Backs /trending/users (top-K by followers) as an index scan
+    __table_args__ = (
+        Index("ix_users_followers_count_id", "followers_count", "id"),
+    )
     
     posts = relationship("Post", back_populates="author", cascade="all, delete-orphan")
     comments = relationship("Comment", back_populates="author", cascade="all, delete-orphan")
@@ -34,6 +44,19 @@ class Post(Base):
     image_url = Column(String(255), default="")
     tags = Column(String(500), default="")  # Comma-separated tags
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    # Denormalized engagement counters - kept in sync by the like/comment/repost
+    # routes, recomputed by counters.py
+    likes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comments_count = Column(Integer, nullable=False, default=0, server_default="0")
+    reposts_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped on every edit and counter change - backs the ETag of /posts/{id}
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    
+    # Back keyset pagination on (timestamp, id), globally and per author
+    __table_args__ = (
+        Index("ix_posts_timestamp_id", "timestamp", "id"),
+        Index("ix_posts_user_timestamp_id", "user_id", "timestamp", "id"),
+    )
     
     author = relationship("User", back_populates="posts")
     comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
@@ -49,6 +72,10 @@ class Comment(Base):
     content = Column(Text, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        Index("ix_comments_post_timestamp", "post_id", "timestamp"),
+    )
+    
     author = relationship("User", back_populates="comments")
     post = relationship("Post", back_populates="comments")
 
@@ -59,6 +86,12 @@ class Follower(Base):
     follower_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     followed_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    # One row per pair; the reverse index serves follower lists and fan-out
+    __table_args__ = (
+        Index("ux_followers_follower_followed", "follower_id", "followed_id", unique=True),
+        Index("ix_followers_followed_follower", "followed_id", "follower_id"),
+    )
 
 class Like(Base):
     __tablename__ = "likes"
@@ -68,6 +101,10 @@ class Like(Base):
     post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        Index("ux_likes_post_user", "post_id", "user_id", unique=True),
+    )
+    
     user = relationship("User", back_populates="likes")
     post = relationship("Post", back_populates="likes")
 
@@ -79,9 +116,52 @@ class Repost(Base):
     post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        Index("ux_reposts_post_user", "post_id", "user_id", unique=True),
+        Index("ix_reposts_user_post", "user_id", "post_id"),
+    )
+    
     user = relationship("User", back_populates="reposts")
     post = relationship("Post", back_populates="reposts")
 
+class PostTag(Base):
+    __tablename__ = "post_tags"
+    
+    # Normalized Post.tags - one row per tag per post, maintained by trending.py
+    id = Column(Integer, primary_key=True, index=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False, index=True)
+    tag = Column(String(100), nullable=False, index=True)
+    timestamp = Column(DateTime, nullable=False)  # Copy of Post.timestamp
+
+class TagBucket(Base):
+    __tablename__ = "tag_buckets"
+    
+    # Rolling per-tag post counts, one row per tag per time bucket
+    id = Column(Integer, primary_key=True, index=True)
+    tag = Column(String(100), nullable=False)
+    bucket_start = Column(DateTime, nullable=False, index=True)
+    count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ux_tag_buckets_tag_bucket", "tag", "bucket_start", unique=True),
+    )
+
+class TimelineEntry(Base):
+    __tablename__ = "timelines"
+    
+    # Materialized home feed: one row per (reader, post), written by timeline.py
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    timestamp = Column(DateTime, nullable=False)  # Copy of Post.timestamp for ordering
+    
+    __table_args__ = (
+        Index("ix_timelines_user_timestamp_post", "user_id", "timestamp", "post_id"),
+        Index("ix_timelines_user_author", "user_id", "author_id"),
+        Index("ix_timelines_post", "post_id"),
+    )
+
 class Message(Base):
     __tablename__ = "messages"
     
@@ -91,6 +171,31 @@ class Message(Base):
     content = Column(Text, nullable=False)
     read = Column(Boolean, default=False)
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    # Both directions, so "sent or received by me" is a multi-index OR
+    __table_args__ = (
+        Index("ix_messages_sender_receiver_timestamp", "sender_id", "receiver_id", "timestamp"),
+        Index("ix_messages_receiver_sender_timestamp", "receiver_id", "sender_id", "timestamp"),
+    )
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+    
+    # Inbox summary, one row per side of each messaging pair - written by
+    # conversations.py whenever a message is sent or read
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    partner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    last_message = Column(Text, nullable=False, default="")
+    last_message_time = Column(DateTime, nullable=False)
+    unread_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ux_conversations_user_partner", "user_id", "partner_id", unique=True),
+        Index("ix_conversations_user_time_id", "user_id", "last_message_time", "id"),
+    )
+    
+    partner = relationship("User", foreign_keys=[partner_id])
 
 class Notification(Base):
     __tablename__ = "notifications"
@@ -101,5 +206,54 @@ class Notification(Base):
     message = Column(Text, nullable=False)
     read = Column(Boolean, default=False)
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    # Coalesced activity (likes, reposts, follows): one unread row per
+    # group_key ("like:12") and window, updated in place as actors pile up.
+    # actor_sample is JSON [{"id", "username"}], newest first.
+    target_id = Column(Integer, nullable=True)
+    group_key = Column(String(100), nullable=True)
+    actor_count = Column(Integer, default=1, server_default="1", nullable=False)
+    actor_sample = Column(Text, nullable=True)
+    window_start = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_notifications_user_read_timestamp", "user_id", "read", "timestamp"),
+        Index("ix_notifications_user_timestamp", "user_id", "timestamp"),
+        Index("ix_notifications_user_group_read", "user_id", "group_key", "read"),
+    )
     
     user = relationship("User", back_populates="notifications")
+    
+    @property
+    def actors(self):
+        return json.loads(self.actor_sample) if self.actor_sample else []
+
+# Everyone who has been counted into a coalesced notification's actor_count,
+# one row per actor - actor_sample only holds the newest few
+class NotificationActor(Base):
+    __tablename__ = "notification_actors"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    notification_id = Column(Integer, ForeignKey("notifications.id", ondelete="CASCADE"), nullable=False)
+    actor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    
+    __table_args__ = (
+        Index("ux_notification_actors_notification_actor", "notification_id", "actor_id", unique=True),
+    )
+
+# Outbox for side-effects run after the request's commit - see jobs.py
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)  # When a worker set "running"
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
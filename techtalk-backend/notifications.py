@@ -0,0 +1,184 @@
+# Notification writes and their push events for /notifications/stream
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Callable
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from database import ReadSessionLocal
+from models import Notification, NotificationActor, User
+from schemas import NotificationResponse
+from broker import get_broker, user_channel
+import jobs
+
+HEARTBEAT_SECONDS = 15
+
+# Likes, reposts and follows on the same target merge into one unread
+# notification for this long after the first of them
+COALESCE_WINDOW_SECONDS = int(os.getenv("TECHTALK_NOTIFICATION_WINDOW", "86400"))
+ACTOR_SAMPLE_SIZE = 3
+ACTIVITY_VERBS = {
+    "like": "liked your post",
+    "repost": "reposted your post",
+    "follow": "started following you",
+}
+
+def unread_count(db: Session, user_id: int) -> int:
+    return db.query(func.count(Notification.id)).filter(
+        Notification.user_id == user_id,
+        Notification.read == False
+    ).scalar()
+
+# Push the user's current unread count - call after committing a change to it
+def publish_unread_count(db: Session, user_id: int):
+    get_broker().publish(user_channel(user_id), {
+        "event": "unread_count",
+        "data": {"unread_count": unread_count(db, user_id)},
+    })
+
+# Add a notification to the caller's session. Returns the function that
+# pushes it, with the new unread count, to the user's open streams - call it
+# once the session has committed.
+def notify(db: Session, user_id: int, type: str, message: str) -> Callable[[], None]:
+    notification = Notification(user_id=user_id, type=type, message=message)
+    db.add(notification)
+    return lambda: _publish_notification(db, notification, count_changed=True)
+
+def _publish_notification(db: Session, notification: Notification, count_changed: bool):
+    payload = NotificationResponse.model_validate(notification).model_dump(mode="json")
+    get_broker().publish(user_channel(notification.user_id), {"event": "notification", "data": payload, "id": notification.id})
+    if count_changed:
+        publish_unread_count(db, notification.user_id)
+
+# "alice liked your post", "alice and bob liked your post", "alice and 41 others liked your post"
+def activity_message(type: str, actors: list, actor_count: int) -> str:
+    names = [actor["username"] for actor in actors]
+    verb = ACTIVITY_VERBS[type]
+    if actor_count == 1:
+        return f"{names[0]} {verb}"
+    if actor_count == 2 and len(names) >= 2:
+        return f"{names[0]} and {names[1]} {verb}"
+    others = actor_count - 1
+    return f"{names[0]} and {others} other{'s' if others != 1 else ''} {verb}"
+
+# Record that `actor` did `type` ("like", "repost", "follow") to user_id's
+# post `target_id` (None for follows). Merges into the open unread
+# notification for the same target when there is one, so a viral post costs
+# one row instead of one per like. Adds to the caller's session and, like
+# notify(), returns the push to call after its commit.
+def notify_activity(db: Session, user_id: int, type: str, actor: User, target_id=None) -> Callable[[], None]:
+    group_key = type if target_id is None else f"{type}:{target_id}"
+    now = datetime.utcnow()
+    notification = db.query(Notification).filter(
+        Notification.user_id == user_id,
+        Notification.group_key == group_key,
+        Notification.read == False,
+        Notification.window_start >= now - timedelta(seconds=COALESCE_WINDOW_SECONDS)
+    ).order_by(Notification.id.desc()).first()
+
+    entry = {"id": actor.id, "username": actor.username}
+    created = notification is None
+    if created:
+        notification = Notification(
+            user_id=user_id, type=type, target_id=target_id, group_key=group_key,
+            actor_count=1, window_start=now, timestamp=now,
+            actor_sample=json.dumps([entry]), message=activity_message(type, [entry], 1)
+        )
+        db.add(notification)
+        db.flush()
+    # Record the actor against the notification; someone unliking and liking
+    # again is not a new actor, even after dropping out of the sample
+    new_actor = db.execute(
+        insert(NotificationActor).values(notification_id=notification.id, actor_id=actor.id)
+        .on_conflict_do_nothing()
+    ).rowcount == 1
+    if not created:
+        previous = notification.actors
+        if new_actor:
+            notification.actor_count += 1
+        actors = ([entry] + [sample for sample in previous if sample["id"] != actor.id])[:ACTOR_SAMPLE_SIZE]
+        notification.actor_sample = json.dumps(actors)
+        notification.message = activity_message(type, actors, notification.actor_count)
+        notification.timestamp = now
+    return lambda: _publish_notification(db, notification, count_changed=created)
+
+# Open coalesced notifications written without notification_actors rows
+# (older databases, generated datasets) only know the actors in their sample;
+# record those so they are not counted twice. Commits.
+def seed_notification_actors(db: Session):
+    db.execute(text(
+        "INSERT OR IGNORE INTO notification_actors (notification_id, actor_id) "
+        "SELECT notifications.id, json_extract(sample.value, '$.id') "
+        "FROM notifications, json_each(notifications.actor_sample) AS sample "
+        "WHERE notifications.group_key IS NOT NULL AND notifications.read = 0"
+    ))
+    db.commit()
+
+# Queue notify()/notify_activity() to run after the caller's commit, so a
+# write request does not pay for a second commit. Adds to the caller's session.
+def enqueue_notification(db: Session, user_id: int, type: str, message: str):
+    jobs.enqueue(db, "notification", user_id=user_id, type=type, message=message)
+
+def enqueue_activity(db: Session, user_id: int, type: str, actor: User, target_id=None):
+    jobs.enqueue(db, "activity_notification", user_id=user_id, type=type, actor_id=actor.id, target_id=target_id)
+
+@jobs.handler("notification")
+def _notification_job(db: Session, user_id: int, type: str, message: str):
+    return notify(db, user_id, type, message)
+
+@jobs.handler("activity_notification")
+def _activity_job(db: Session, user_id: int, type: str, actor_id: int, target_id=None):
+    actor = db.query(User).filter(User.id == actor_id).first()
+    if actor is not None:
+        return notify_activity(db, user_id, type, actor, target_id)
+
+def format_sse(event: dict) -> str:
+    lines = []
+    if event.get("id") is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'])}")
+    return "\n".join(lines) + "\n\n"
+
+# SSE body for one connection: the current unread count, then every event
+# published to the user, with a comment line as heartbeat so proxies keep the
+# connection open and disconnects are noticed
+async def event_stream(request: Request, subscription, initial_unread: int):
+    try:
+        yield format_sse({"event": "unread_count", "data": {"unread_count": initial_unread}})
+        while not await request.is_disconnected():
+            try:
+                event = await subscription.get(timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        subscription.close()
+
+def _read_unread_count(user_id: int) -> int:
+    db = ReadSessionLocal()
+    try:
+        return unread_count(db, user_id)
+    finally:
+        db.close()
+
+# Subscribe before reading the initial count so nothing published in between is lost
+async def open_stream(request: Request, user_id: int) -> StreamingResponse:
+    subscription = get_broker().subscribe(user_channel(user_id))
+    try:
+        initial_unread = await run_in_threadpool(_read_unread_count, user_id)
+    except Exception:
+        subscription.close()
+        raise
+    return StreamingResponse(
+        event_stream(request, subscription, initial_unread),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
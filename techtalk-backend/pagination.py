@@ -0,0 +1,60 @@
+# Keyset (cursor) pagination over (timestamp, id) ordered lists
+import base64
+from datetime import datetime
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Order `query` newest-first and, given a cursor, resume strictly after the
+# last row of the previous page via an index range seek
+def keyset_desc(query, timestamp_col, id_col, cursor=None):
+    query = query.order_by(timestamp_col.desc(), id_col.desc())
+    if cursor:
+        query = query.filter(tuple_(timestamp_col, id_col) < decode_cursor(cursor))
+    return query
+
+# Newest-first page of `query`. Without a cursor, `skip` keeps the legacy
+# OFFSET behaviour for older clients.
+def paginate_desc(query, timestamp_col, id_col, cursor=None, skip: int = 0, limit: int = 50):
+    query = keyset_desc(query, timestamp_col, id_col, cursor)
+    if not cursor and skip:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+# Cursor pointing after the last row, or None when the page was the last one
+def next_cursor(rows, limit: int, timestamp_attr: str = "timestamp"):
+    if len(rows) < limit or not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor(getattr(last, timestamp_attr), last.id)
+
+# Cursors over ranked results (e.g. search score, id) - repr keeps floats exact
+def encode_rank_cursor(score: float, row_id: int) -> str:
+    raw = f"{score!r}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_rank_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return float(score), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def set_next_cursor(response: Response, cursor):
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
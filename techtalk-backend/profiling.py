@@ -0,0 +1,238 @@
+# On-demand request profiling - collapsed stacks for flame graphs
+#
+# A request is profiled when an admin (TECHTALK_ADMIN_USERS) sends
+# "X-Profile: 1", or at random with probability TECHTALK_PROFILE_SAMPLE_RATE.
+# A sampler thread then records, every TECHTALK_PROFILE_INTERVAL_MS, the
+# stack of each thread working for that request: the threadpool worker
+# running the sync handler and its dependencies (JWT, SQL, ORM hydration,
+# Pydantic serialization) and the event loop while it runs the request's own
+# task. Threads are matched through the contextvars Context they are running,
+# so concurrent requests do not show up in each other's profiles. In async
+# mode SQL runs on aiosqlite's own thread and shows up as the route awaiting
+# it. Requests that are not profiled pay for one header lookup (plus one
+# random() call when a sample rate is set).
+#
+# Profiles are written to TECHTALK_PROFILE_DIR as <id>.collapsed - one
+# "frame;frame;frame count" line per distinct stack, which flamegraph.pl and
+# speedscope read directly - plus <id>.json metadata. Only the newest
+# TECHTALK_PROFILE_KEEP are kept.
+import json
+import linecache
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextvars import Context, ContextVar
+from datetime import datetime
+from typing import Optional
+
+import anyio.to_thread
+from fastapi import HTTPException
+
+from auth import authenticate_token, is_admin
+from instrumentation import current_stats, route_template
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+SAMPLE_RATE = float(os.getenv("TECHTALK_PROFILE_SAMPLE_RATE", "0"))
+SAMPLE_INTERVAL_SECONDS = float(os.getenv("TECHTALK_PROFILE_INTERVAL_MS", "1")) / 1000
+PROFILE_DIR = os.getenv("TECHTALK_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "techtalk-profiles"))
+PROFILE_KEEP = int(os.getenv("TECHTALK_PROFILE_KEEP", "200"))
+# Long-lived responses (SSE) stop being sampled after this
+MAX_PROFILE_SECONDS = 30
+
+_session: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+
+# Collapsed stacks -> sample count for one request, filled by a sampler thread
+class ProfileSession:
+    def __init__(self):
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        deadline = time.monotonic() + MAX_PROFILE_SECONDS
+        own = threading.get_ident()
+        while not self._stop.wait(SAMPLE_INTERVAL_SECONDS) and time.monotonic() < deadline:
+            stacks = [_request_stack(frame, self) for thread_id, frame in sys._current_frames().items()
+                      if thread_id != own]
+            # Caught stop() itself joining this thread
+            if self._stop.is_set():
+                return
+            for stack in filter(None, stacks):
+                self.samples[stack] = self.samples.get(stack, 0) + 1
+
+_entering_lines = {}
+
+# True while the frame is on a "....run(" line, i.e. inside Context.run - an
+# idle anyio worker still holds its last context in a local
+def _entering_context(frame) -> bool:
+    key = (frame.f_code, frame.f_lineno)
+    entering = _entering_lines.get(key)
+    if entering is None:
+        entering = _entering_lines[key] = ".run(" in linecache.getline(frame.f_code.co_filename, frame.f_lineno)
+    return entering
+
+# The Context a frame is running: anyio's worker thread calls context.run()
+# for each sync handler/dependency, asyncio's Handle._run does the same for
+# every task step on the event loop
+def _frame_context(frame) -> Optional[Context]:
+    if frame.f_code.co_name not in ("run", "_run") or not _entering_context(frame):
+        return None
+    local = frame.f_locals
+    context = local.get("context")
+    if not isinstance(context, Context):
+        context = getattr(local.get("self"), "_context", None)
+    return context if isinstance(context, Context) else None
+
+def _label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+# Outermost-first "a;b;c" stack below the frame that entered the request's
+# context, or None when the thread is not working for this request
+def _request_stack(frame, session: ProfileSession) -> Optional[str]:
+    frames = []
+    while frame is not None:
+        context = _frame_context(frame)
+        if context is not None and context.get(_session) is session:
+            return ";".join(_label(f) for f in reversed(frames)) or None
+        frames.append(frame)
+        frame = frame.f_back
+    return None
+
+_PROFILE_ID = re.compile(r"^\d{8}T\d{12}-[0-9a-f]{8}$")
+
+# Bounded on-disk ring buffer of profiles, oldest dropped first
+class ProfileStore:
+    def __init__(self, directory: str, keep: int):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def new_id(self) -> str:
+        return f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+
+    def save(self, profile_id: str, meta: dict, samples: dict):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{profile_id}.collapsed"), "w") as f:
+                for stack, count in sorted(samples.items()):
+                    f.write(f"{stack} {count}\n")
+            with open(os.path.join(self.directory, f"{profile_id}.json"), "w") as f:
+                json.dump(meta, f)
+            ids = self._ids()
+            for stale in ids[:max(0, len(ids) - self.keep)]:
+                for suffix in (".collapsed", ".json"):
+                    try:
+                        os.remove(os.path.join(self.directory, stale + suffix))
+                    except FileNotFoundError:
+                        pass
+
+    def _ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.directory)
+                      if name.endswith(".json") and _PROFILE_ID.match(name[:-5]))
+
+    # Metadata of the stored profiles, newest first
+    def list(self):
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.json")) as f:
+                    profiles.append(json.load(f))
+            except FileNotFoundError:
+                pass  # pruned meanwhile
+        return profiles
+
+    # Path of a profile's collapsed stacks, or None
+    def path(self, profile_id: str) -> Optional[str]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.collapsed")
+        return path if os.path.exists(path) else None
+
+store = ProfileStore(PROFILE_DIR, PROFILE_KEEP)
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+def _requested_by_admin(authorization: Optional[str]) -> bool:
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        return is_admin(authenticate_token(authorization[7:]))
+    except HTTPException:
+        return False
+
+# Why this request should be profiled ("header" or "sampled"), or None
+async def _profile_reason(scope) -> Optional[str]:
+    if _header(scope, PROFILE_HEADER.lower().encode()) == "1":
+        authorization = _header(scope, b"authorization")
+        if await anyio.to_thread.run_sync(_requested_by_admin, authorization):
+            return "header"
+    if SAMPLE_RATE and random.random() < SAMPLE_RATE:
+        return "sampled"
+    return None
+
+# ASGI middleware; added inside InstrumentationMiddleware so the request's
+# SQL counts are available for the profile metadata
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        reason = await _profile_reason(scope)
+        if reason is None:
+            return await self.app(scope, receive, send)
+
+        profile_id = store.new_id()
+        session = ProfileSession()
+        status = []
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER.encode(), profile_id.encode())
+                ]
+            await send(message)
+
+        token = _session.set(session)
+        started = time.perf_counter()
+        session.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            session.stop()
+            _session.reset(token)
+            stats = current_stats()
+            meta = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_template(scope["app"], scope),
+                "status": status[0] if status else None,
+                "reason": reason,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "samples": sum(session.samples.values()),
+                "queries": stats.queries if stats else None,
+                "created_at": datetime.utcnow().isoformat(),
+            }
+            await anyio.to_thread.run_sync(store.save, profile_id, meta, session.samples)
@@ -0,0 +1,253 @@
+# Response cache for the public read routes
+#
+# A cached route hands `cached()` a loader that builds its payload from a fresh
+# read session. The serialized JSON is stored under the route and its params,
+# together with invalidation tags ("post:12", "user:3", "feed:public") that
+# the mutating handlers fire after they commit. Past its TTL an entry is still
+# served for `stale` more seconds while one background thread reloads it, so
+# a hot key never sends every caller to SQLite at once.
+#
+# The in-process LRU is the default backend; anything implementing
+# CacheBackend (e.g. a shared Redis) can be installed with set_backend().
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from database import ReadSessionLocal
+from etags import ETAG_HEADER, etag_matches, not_modified
+
+RESPONSE_CACHE_ENABLED = os.getenv("TECHTALK_RESPONSE_CACHE", "on") != "off"
+RESPONSE_CACHE_SIZE = int(os.getenv("TECHTALK_RESPONSE_CACHE_SIZE", "2048"))
+CACHE_STATUS_HEADER = "X-Cache"
+
+# Route -> (ttl, stale) in seconds
+ROUTE_TTLS = {
+    "/feed/public": (5, 30),
+    "/trending/users": (30, 60),
+    "/users/{user_id}": (60, 300),
+    "/users/{user_id}/posts": (15, 60),
+    "/posts/{post_id}/comments": (15, 60),
+}
+
+# Entries are dicts: body (bytes), headers, tags, expires, stale_until
+class CacheBackend:
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, entry):
+        raise NotImplementedError
+
+    # Drop every entry carrying any of `tags`
+    def invalidate_tags(self, tags):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+class MemoryBackend(CacheBackend):
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._keys_by_tag = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = entry
+            for tag in entry["tags"]:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._keys_by_tag.pop(tag, ()):
+                    self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry["tags"]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+_backend = MemoryBackend(RESPONSE_CACHE_SIZE)
+_refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="response-cache")
+_state_lock = threading.Lock()
+_refreshing = set()
+# Miss loads in progress, key -> Future of (entry, stored)
+_flights = {}
+# Invalidation clock: a load is not stored if one of its tags was
+# invalidated (or everything was cleared) after the load started
+_epoch = 0
+_invalidated_at = {}
+_cleared_at = 0
+# Start epochs of loads in progress, to forget invalidations none can see
+_load_starts = {}
+MAX_TRACKED_TAGS = 4096
+stats = {"hits": 0, "stale": 0, "misses": 0}
+
+def set_backend(backend: CacheBackend):
+    global _backend
+    _backend = backend
+
+def invalidate(*tags):
+    global _epoch
+    with _state_lock:
+        _epoch += 1
+        if _load_starts:
+            for tag in tags:
+                _invalidated_at[tag] = _epoch
+    _backend.invalidate_tags(tags)
+
+def clear():
+    global _epoch, _cleared_at
+    with _state_lock:
+        _epoch += 1
+        _cleared_at = _epoch
+    _backend.clear()
+
+def _begin_load():
+    token = object()
+    with _state_lock:
+        _load_starts[token] = _epoch
+    return token
+
+# Whether a load may be stored, i.e. none of its tags changed since it began
+def _end_load(token, tags) -> bool:
+    with _state_lock:
+        started = _load_starts.pop(token)
+        current = started >= _cleared_at and all(_invalidated_at.get(tag, 0) <= started for tag in tags)
+        if not _load_starts:
+            _invalidated_at.clear()
+        elif len(_invalidated_at) > MAX_TRACKED_TAGS:
+            oldest = min(_load_starts.values())
+            for tag in [tag for tag, epoch in _invalidated_at.items() if epoch <= oldest]:
+                del _invalidated_at[tag]
+    return current
+
+# A loader that sets an ETag header makes the route answer If-None-Match with
+# a 304 straight from the cache
+def _response(entry, status, if_none_match=None):
+    etag = entry["headers"].get(ETAG_HEADER)
+    if etag and etag_matches(if_none_match, etag):
+        response = not_modified(etag)
+    else:
+        response = Response(content=entry["body"], media_type="application/json", headers=entry["headers"])
+    response.headers[CACHE_STATUS_HEADER] = status
+    return response
+
+# Run the loader on its own read session and store the result unless one of
+# its tags was invalidated meanwhile. Loaders return (payload, tags, headers).
+# Returns (entry, stored).
+def _load(key, route, loader, store=True):
+    token = _begin_load()
+    try:
+        db = ReadSessionLocal()
+        try:
+            payload, tags, headers = loader(db)
+        finally:
+            db.close()
+    except BaseException:
+        _end_load(token, ())
+        raise
+    ttl, stale = ROUTE_TTLS[route]
+    now = time.monotonic()
+    entry = {
+        "body": JSONResponse(jsonable_encoder(payload)).body,
+        "headers": {name: value for name, value in headers.items() if value},
+        "tags": list(tags),
+        "expires": now + ttl,
+        "stale_until": now + ttl + stale,
+    }
+    stored = _end_load(token, entry["tags"]) and store
+    if stored:
+        _backend.set(key, entry)
+    return entry, stored
+
+def _refresh(key, route, loader):
+    try:
+        _load(key, route, loader)
+    finally:
+        with _state_lock:
+            _refreshing.discard(key)
+
+def cached(route: str, params: dict, loader, if_none_match=None) -> Response:
+    key = route + "?" + "&".join(f"{name}={params[name]}" for name in sorted(params))
+    if not RESPONSE_CACHE_ENABLED:
+        return _response(_load(key, route, loader, store=False)[0], "BYPASS", if_none_match)
+
+    entry = _backend.get(key)
+    now = time.monotonic()
+    if entry is not None and now < entry["expires"]:
+        stats["hits"] += 1
+        return _response(entry, "HIT", if_none_match)
+    if entry is not None and now < entry["stale_until"]:
+        with _state_lock:
+            start = key not in _refreshing
+            _refreshing.add(key)
+        if start:
+            _refresher.submit(_refresh, key, route, loader)
+        stats["stale"] += 1
+        return _response(entry, "STALE", if_none_match)
+
+    stats["misses"] += 1
+    return _response(_load_once(key, route, loader), "MISS", if_none_match)
+
+# Miss path: one load per key at a time, concurrent callers share its result.
+# A caller that joined a load whose result was invalidated before it could be
+# stored loads again - it may have arrived after the write.
+def _load_once(key, route, loader):
+    while True:
+        with _state_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = Future()
+        if not leader:
+            entry, stored = flight.result()
+            if stored:
+                return entry
+            continue
+        try:
+            entry = _backend.get(key)
+            if entry is not None and time.monotonic() < entry["expires"]:
+                result = (entry, True)
+            else:
+                result = _load(key, route, loader)
+        except BaseException as e:
+            with _state_lock:
+                _flights.pop(key, None)
+            flight.set_exception(e)
+            raise
+        with _state_lock:
+            _flights.pop(key, None)
+        flight.set_result(result)
+        return result[0]
+
+# Tags for a page of posts - each post and each embedded author
+def post_tags(posts):
+    return {f"post:{post.id}" for post in posts} | {f"user:{post.user_id}" for post in posts}
@@ -1,7 +1,7 @@
 # Pydantic schemas for request/response validation
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class UserCreate(BaseModel):
     username: str
@@ -37,6 +37,7 @@ class PostCreate(BaseModel):
 class PostUpdate(BaseModel):
     content: str
     image_url: Optional[str] = None
+    tags: Optional[str] = None  # Comma-separated tags
 
 class PostResponse(BaseModel):
     id: int
@@ -68,6 +69,10 @@ class CommentResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class NotificationActor(BaseModel):
+    id: int
+    username: str
+
 class NotificationResponse(BaseModel):
     id: int
     user_id: int
@@ -75,6 +80,9 @@ class NotificationResponse(BaseModel):
     message: str
     read: bool
     timestamp: datetime
+    target_id: Optional[int] = None
+    actor_count: int = 1
+    actors: List[NotificationActor] = []
     
     class Config:
         from_attributes = True
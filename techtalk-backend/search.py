@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Full-text search - SQLite FTS5 indexes over posts and users, kept in sync by triggers
+import re
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from models import Post, User
+from engagement import post_query
+from pagination import encode_rank_cursor, decode_rank_cursor
+
+# External-content FTS5 tables: the index stores only tokens, rows live in
+# posts/users. prefix='2 3' keeps short prefix queries off full index scans.
+SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+        content, tags, content='posts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, content, tags) VALUES (new.id, new.content, new.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_ad AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, content, tags) VALUES ('delete', old.id, old.content, old.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_fts_au AFTER UPDATE OF content, tags ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, content, tags) VALUES ('delete', old.id, old.content, old.tags);
+        INSERT INTO posts_fts(rowid, content, tags) VALUES (new.id, new.content, new.tags);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        username, bio, content='users', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, username, bio) VALUES (new.id, new.username, new.bio);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, bio) VALUES ('delete', old.id, old.username, old.bio);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username, bio ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, bio) VALUES ('delete', old.id, old.username, old.bio);
+        INSERT INTO users_fts(rowid, username, bio) VALUES (new.id, new.username, new.bio);
+    END""",
+]
+
+# BM25 column weights - a tag or username hit outranks a passing mention
+POST_WEIGHTS = "1.0, 2.0"   # content, tags
+USER_WEIGHTS = "3.0, 1.0"   # username, bio
+
+def rebuild_search_index(conn):
+    conn.execute(text("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')"))
+    conn.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+
+# Create the FTS tables and triggers; index existing rows the first time
+def ensure_search_index(conn):
+    is_new = not inspect(conn).has_table("posts_fts")
+    for ddl in SEARCH_DDL:
+        conn.execute(text(ddl))
+    if is_new:
+        rebuild_search_index(conn)
+
+# Turn free text into an FTS5 query: every word must match, as a prefix.
+# Quoting each token keeps user input from being parsed as FTS5 syntax.
+def match_expression(q: str):
+    tokens = re.findall(r"\w+", q)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+# One page of (rowid, score) matches, best first, resuming after `cursor`
+def _ranked_ids(db: Session, table: str, weights: str, q: str, cursor, limit: int):
+    expression = match_expression(q)
+    if not expression:
+        return [], None
+    score = f"bm25({table}, {weights})"
+    sql = f"SELECT rowid, {score} AS score FROM {table} WHERE {table} MATCH :q"
+    params = {"q": expression, "limit": limit}
+    if cursor:
+        params["score"], params["rowid"] = decode_rank_cursor(cursor)
+        sql += f" AND ({score}, rowid) > (:score, :rowid)"
+    sql += " ORDER BY score, rowid LIMIT :limit"
+    rows = db.execute(text(sql), params).all()
+    next_cursor = encode_rank_cursor(rows[-1].score, rows[-1].rowid) if rows and len(rows) == limit else None
+    return [row.rowid for row in rows], next_cursor
+
+def _in_order(rows, ids):
+    by_id = {row.id: row for row in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+def search_post_page(db: Session, q: str, cursor=None, limit: int = 20):
+    ids, next_cursor = _ranked_ids(db, "posts_fts", POST_WEIGHTS, q, cursor, limit)
+    if not ids:
+        return [], next_cursor
+    return _in_order(post_query(db).filter(Post.id.in_(ids)).all(), ids), next_cursor
+
+def search_user_page(db: Session, q: str, cursor=None, limit: int = 20):
+    ids, next_cursor = _ranked_ids(db, "users_fts", USER_WEIGHTS, q, cursor, limit)
+    if not ids:
+        return [], next_cursor
+    return _in_order(db.query(User).filter(User.id.in_(ids)).all(), ids), next_cursor
+
+if __name__ == "__main__":
+    from database import engine
+    with engine.begin() as conn:
+        for ddl in SEARCH_DDL:
+            conn.execute(text(ddl))
+        rebuild_search_index(conn)
+    print("✅ Search index rebuilt")
@@ -3,6 +3,9 @@ from sqlalchemy.orm import Session
 from database import SessionLocal, init_db
 from models import User, Post, Comment, Like, Follower
 from auth import hash_password
+from counters import reconcile_counters
+from timeline import rebuild_timelines
+from trending import rebuild_tags
 
 def seed_database():
     init_db()
@@ -157,6 +160,11 @@ def seed_database():
         db.add(follow)
     
     db.commit()
+    
+    # Rows above bypass the API routes - rebuild the derived data they maintain
+    reconcile_counters(db)
+    rebuild_timelines(db)
+    rebuild_tags(db)
     db.close()
     
     print("✅ Database seeded successfully with 15 users and 30+ posts!")
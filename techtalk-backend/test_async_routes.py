@@ -0,0 +1,91 @@
+# The async read routes return exactly what the sync handlers do
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import async_routes
+from jobs import queue
+
+@pytest.fixture(scope="module")
+def async_client(client):
+    app = FastAPI()
+    app.include_router(async_routes.router)
+    with TestClient(app) as test_client:
+        yield test_client
+
+def test_async_routes_match_sync(client, async_client, users):
+    alice, bob = users["alice"], users["bob"]
+    post = client.post("/posts", headers=bob["headers"], json={"content": "Async parity", "tags": "async"}).json()
+    client.post(f"/posts/{post['id']}/comments", headers=alice["headers"], json={"content": "Same bytes?"})
+    client.post("/messages", headers=bob["headers"], json={"receiver_id": alice["id"], "content": "Ping"})
+    assert queue.wait_idle()
+
+    paths = [
+        ("/profile", alice["headers"]),
+        ("/feed?limit=2", alice["headers"]),
+        (f"/posts/{post['id']}", alice["headers"]),
+        ("/notifications", bob["headers"]),
+        ("/notifications/unread-count", bob["headers"]),
+        ("/messages/conversations", alice["headers"]),
+    ]
+    for path, headers in paths:
+        expected, actual = client.get(path, headers=headers), async_client.get(path, headers=headers)
+        assert actual.status_code == expected.status_code == 200, path
+        assert actual.json() == expected.json(), path
+        assert actual.headers.get("x-next-cursor") == expected.headers.get("x-next-cursor"), path
+        assert actual.headers.get("etag") == expected.headers.get("etag"), path
+        if expected.headers.get("etag"):
+            revalidated = async_client.get(path, headers={**headers, "If-None-Match": expected.headers["etag"]})
+            assert revalidated.status_code == 304, path
+
+    # Reading a thread marks it read on both paths
+    assert async_client.get(f"/messages/{bob['id']}", headers=alice["headers"]).json()[-1]["read"] is True
+    assert client.get("/messages/conversations", headers=alice["headers"]).json()[0]["unread_count"] == 0
+    assert async_client.get("/posts/999999", headers=alice["headers"]).status_code == 404
+
+# The cached routes have no async version, so they keep the response cache
+def test_cached_routes_stay_on_the_sync_path():
+    paths = {route.path for route in async_routes.router.routes}
+    assert not paths & {"/feed/public", "/users/{user_id}", "/users/{user_id}/posts", "/posts/{post_id}/comments"}
+
+# The whole app with TECHTALK_ASYNC=1, against the test database
+ASYNC_APP_CHECK = textwrap.dedent("""
+    import json, sys
+    from fastapi.testclient import TestClient
+    from auth import create_access_token
+    from main import app
+    user_id, post_id = int(sys.argv[1]), int(sys.argv[2])
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+    with TestClient(app) as client:
+        out = {}
+        for path in ["/feed/public?limit=3", f"/posts/{post_id}/comments", f"/users/{user_id}/posts"]:
+            client.get(path)
+            out[path] = client.get(path).headers.get("x-cache")
+        for path in ["/profile", f"/posts/{post_id}", f"/users/{user_id}"]:
+            etag = client.get(path, headers=headers).headers["etag"]
+            out[path] = client.get(path, headers={**headers, "If-None-Match": etag}).status_code
+        out["async"] = any(getattr(route.endpoint, "__module__", "") == "async_routes" for route in app.routes)
+        print(json.dumps(out))
+""")
+
+def test_async_mode_keeps_cache_and_etags(client, users):
+    alice = users["alice"]
+    post = client.post("/posts", headers=alice["headers"], json={"content": "Async mode"}).json()
+    result = subprocess.run(
+        [sys.executable, "-c", ASYNC_APP_CHECK, str(alice["id"]), str(post["id"])],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+        env={**os.environ, "TECHTALK_ASYNC": "1"}, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    out = json.loads(result.stdout.strip().splitlines()[-1])
+    assert out.pop("async") is True
+    assert out == {
+        "/feed/public?limit=3": "HIT", f"/posts/{post['id']}/comments": "HIT", f"/users/{alice['id']}/posts": "HIT",
+        "/profile": 304, f"/posts/{post['id']}": 304, f"/users/{alice['id']}": 304,
+    }
@@ -0,0 +1,26 @@
+# Benchmark summaries and the regression gate
+from bench_api import compare, percentile, summarize
+
+def _result(p95, queries, errors=0):
+    return {"routes": {"GET /feed": {"p95_ms": p95, "queries": queries, "errors": errors}}}
+
+def test_summarize_percentiles_and_queries():
+    samples = {"GET /feed": [(float(ms), 200, 3) for ms in range(1, 101)]}
+    route = summarize(samples, seconds=10)["GET /feed"]
+    assert route["requests"] == 100 and route["rps"] == 10.0
+    assert (route["p50_ms"], route["p95_ms"], route["p99_ms"]) == (51.0, 96.0, 100.0)
+    assert route["queries"] == 3 and route["errors"] == 0
+    assert percentile([], 0.95) == 0.0
+
+def test_compare_flags_slowdowns_and_extra_queries():
+    baseline = _result(p95=20.0, queries=4)
+    assert compare(baseline, _result(p95=24.0, queries=4), threshold=0.25) == []
+    # Tiny absolute slowdowns are noise even past the threshold
+    assert compare(_result(p95=4.0, queries=4), _result(p95=8.0, queries=4), threshold=0.25) == []
+
+    [slow] = compare(baseline, _result(p95=30.0, queries=4), threshold=0.25)
+    assert slow.startswith("GET /feed: p95 30.0ms")
+    # One more query per request is an N+1 in the making
+    [n_plus_one] = compare(baseline, _result(p95=20.0, queries=5), threshold=0.25)
+    assert "5 queries/request, baseline 4" in n_plus_one
+    assert len(compare(baseline, _result(p95=20.0, queries=4, errors=2), threshold=0.25)) == 1
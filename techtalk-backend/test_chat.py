@@ -0,0 +1,45 @@
+# /ws/messages delivers messages and read receipts to both participants
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from chat import hub
+
+def _token(user):
+    return user["headers"]["Authorization"].removeprefix("Bearer ")
+
+def test_socket_delivers_messages_and_receipts(client, users):
+    alice, bob = users["alice"], users["bob"]
+    with client.websocket_connect(f"/ws/messages?token={_token(alice)}") as alice_ws, \
+            client.websocket_connect("/ws/messages", headers=bob["headers"]) as bob_ws:
+        alice_ws.send_json({"type": "ping"})
+        assert alice_ws.receive_json() == {"type": "pong"}
+        assert hub.is_online(alice["id"]) and hub.is_online(bob["id"])
+
+        alice_ws.send_json({"type": "send", "receiver_id": bob["id"], "content": "Over the wire", "client_id": "c1"})
+        sent, received = alice_ws.receive_json(), bob_ws.receive_json()
+        assert sent["client_id"] == "c1" and sent["message"]["content"] == "Over the wire"
+        assert received["message"] == sent["message"]
+
+        # REST sends are pushed too, and reading the thread sends a receipt both ways
+        client.post("/messages", headers=alice["headers"], json={"receiver_id": bob["id"], "content": "Via REST"})
+        assert bob_ws.receive_json()["message"]["content"] == "Via REST"
+        alice_ws.receive_json()
+        bob_ws.send_json({"type": "read", "partner_id": alice["id"]})
+        receipt = {"type": "read", "reader_id": bob["id"], "partner_id": alice["id"]}
+        assert alice_ws.receive_json() == receipt
+        assert bob_ws.receive_json() == receipt
+
+        # Catching up only fetches what the client doesn't hold yet
+        newer = client.get(f"/messages/{alice['id']}?after_id={sent['message']['id']}", headers=bob["headers"]).json()
+        assert [message["content"] for message in newer] == ["Via REST"]
+
+        bob_ws.send_json({"type": "send", "receiver_id": 999999, "content": "Nobody", "client_id": "c2"})
+        assert bob_ws.receive_json() == {"type": "error", "detail": "User not found", "client_id": "c2"}
+        bob_ws.send_text("not json")
+        assert bob_ws.receive_json()["detail"] == "Malformed frame"
+
+def test_socket_rejects_bad_token(client):
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        with client.websocket_connect("/ws/messages?token=garbage") as ws:
+            ws.receive_json()
+    assert excinfo.value.code == 1008
@@ -0,0 +1,57 @@
+# Conversation summaries - newest thread first, per-partner unread counts
+from conversations import rebuild_conversations
+from database import SessionLocal
+from pagination import NEXT_CURSOR_HEADER
+
+def _send(client, sender, receiver, content):
+    response = client.post("/messages", headers=sender["headers"], json={"receiver_id": receiver["id"], "content": content})
+    assert response.status_code == 200
+
+def _summaries(client, user, **params):
+    response = client.get("/messages/conversations", headers=user["headers"], params=params)
+    assert response.status_code == 200
+    rows = [(row["user"]["id"], row["last_message"], row["unread_count"]) for row in response.json()]
+    return rows, response.headers.get(NEXT_CURSOR_HEADER)
+
+def test_summaries_order_and_unread_counts(client, make_user):
+    me, ann, ben, cat = make_user(), make_user(), make_user(), make_user()
+    _send(client, ann, me, "Hi")
+    _send(client, ann, me, "Are you there?")
+    _send(client, me, ben, "Lunch?")
+    _send(client, cat, me, "Ping")
+    # My own reply moves the thread up but does not mark Ann's messages read
+    _send(client, me, ann, "Yes")
+
+    rows, _ = _summaries(client, me)
+    assert rows == [(ann["id"], "Yes", 2), (cat["id"], "Ping", 1), (ben["id"], "Lunch?", 0)]
+    assert _summaries(client, ann)[0] == [(me["id"], "Yes", 1)]
+
+    # Opening a thread clears only that partner's count
+    client.get(f"/messages/{ann['id']}", headers=me["headers"])
+    rows, _ = _summaries(client, me)
+    assert [unread for _, _, unread in rows] == [0, 1, 0]
+
+    _send(client, ben, me, "Sure")
+    rows, _ = _summaries(client, me)
+    assert rows[0] == (ben["id"], "Sure", 1)
+
+    # Cursor pages walk the same order
+    first, cursor = _summaries(client, me, limit=2)
+    second, end = _summaries(client, me, limit=2, cursor=cursor)
+    assert first + second == rows and end is None
+
+def test_rebuild_matches_the_maintained_summaries(client, make_user):
+    me, ann, ben = make_user(), make_user(), make_user()
+    _send(client, ann, me, "One")
+    _send(client, me, ben, "Two")
+    _send(client, ben, me, "Three")
+    _send(client, ann, me, "Four")
+    client.get(f"/messages/{ben['id']}", headers=me["headers"])
+    maintained, _ = _summaries(client, me)
+
+    db = SessionLocal()
+    try:
+        rebuild_conversations(db)
+    finally:
+        db.close()
+    assert _summaries(client, me)[0] == maintained == [(ann["id"], "Four", 2), (ben["id"], "Three", 0)]
@@ -0,0 +1,60 @@
+# SQLite connection profiles - pragmas per engine, legacy undoes WAL
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+from sqlalchemy import text
+
+from bench_db import copy_database
+from database import SQLITE_PROFILES, read_engine, write_engine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _pragmas(engine, *names):
+    with engine.connect() as conn:
+        return {name: conn.execute(text(f"PRAGMA {name}")).scalar() for name in names}
+
+def test_production_profile_on_both_engines(client):
+    names = ("journal_mode", "synchronous", "foreign_keys", "busy_timeout", "mmap_size", "query_only")
+    assert _pragmas(write_engine, *names) == {
+        "journal_mode": "wal", "synchronous": 1, "foreign_keys": 1,
+        "busy_timeout": 5000, "mmap_size": 256 * 1024 * 1024, "query_only": 0,
+    }
+    read = _pragmas(read_engine, *names)
+    assert read["query_only"] == 1 and read["journal_mode"] == "wal" and read["foreign_keys"] == 1
+
+def test_legacy_profile_restores_sqlite_defaults(tmp_path):
+    path = tmp_path / "legacy.db"
+    setup = sqlite3.connect(path)
+    setup.execute("PRAGMA journal_mode=WAL")
+    setup.close()
+    script = (
+        "import json; from sqlalchemy import text; from database import write_engine\n"
+        "with write_engine.connect() as conn:\n"
+        "    print(json.dumps({name: conn.execute(text(f'PRAGMA {name}')).scalar()\n"
+        "        for name in ('journal_mode', 'synchronous', 'foreign_keys', 'mmap_size')}))"
+    )
+    env = dict(os.environ, TECHTALK_SQLITE_PROFILE="legacy", TECHTALK_DATABASE_URL=f"sqlite:///{path}")
+    output = subprocess.run([sys.executable, "-c", script], cwd=HERE, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert json.loads(output) == {"journal_mode": "delete", "synchronous": 2, "foreign_keys": 0, "mmap_size": 0}
+    assert set(SQLITE_PROFILES["legacy"]) >= {"journal_mode", "synchronous", "foreign_keys", "mmap_size"}
+
+def test_copy_includes_rows_still_in_the_wal(tmp_path):
+    source = sqlite3.connect(tmp_path / "source.db")
+    source.execute("PRAGMA journal_mode=WAL")
+    source.execute("PRAGMA wal_autocheckpoint=0")
+    source.execute("CREATE TABLE notes (body TEXT)")
+    source.executemany("INSERT INTO notes VALUES (?)", [("one",), ("two",)])
+    source.commit()
+    assert os.path.getsize(tmp_path / "source.db-wal") > 0
+
+    copy_database(str(tmp_path / "source.db"), str(tmp_path / "copy.db"))
+    source.close()
+    copy = sqlite3.connect(tmp_path / "copy.db")
+    try:
+        assert copy.execute("SELECT count(*) FROM notes").fetchone() == (2,)
+    finally:
+        copy.close()
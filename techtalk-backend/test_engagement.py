@@ -0,0 +1,62 @@
+# Batched engagement hydration - flags, counts and authors for post lists
+from instrumentation import SERVER_TIMING_HEADER, queries_from_header
+from jobs import queue
+
+def _feed(client, viewer):
+    response = client.get("/feed", headers=viewer["headers"], params={"limit": 50})
+    assert response.status_code == 200
+    return response.json(), queries_from_header(response.headers[SERVER_TIMING_HEADER])
+
+def test_feed_hydrates_flags_counts_and_authors(client, make_user):
+    author, viewer, fan = make_user(), make_user(), make_user()
+    client.post(f"/users/{author['id']}/follow", headers=viewer["headers"])
+    posts = [client.post("/posts", headers=author["headers"], json={"content": f"Post {n}"}).json() for n in range(3)]
+    client.post(f"/posts/{posts[0]['id']}/likes", headers=viewer["headers"])
+    client.post(f"/posts/{posts[0]['id']}/likes", headers=fan["headers"])
+    client.post(f"/posts/{posts[1]['id']}/repost", headers=viewer["headers"])
+    client.post(f"/posts/{posts[2]['id']}/comments", headers=fan["headers"], json={"content": "Nice"})
+    assert queue.wait_idle()
+
+    feed, _ = _feed(client, viewer)
+    by_id = {post["id"]: post for post in feed}
+    assert set(by_id) == {post["id"] for post in posts}
+    assert all(post["author"]["username"] == author["username"] for post in feed)
+    assert (by_id[posts[0]["id"]]["is_liked"], by_id[posts[0]["id"]]["likes_count"]) == (True, 2)
+    assert (by_id[posts[1]["id"]]["is_reposted"], by_id[posts[1]["id"]]["reposts_count"]) == (True, 1)
+    assert by_id[posts[2]["id"]]["comments_count"] == 1
+    assert not by_id[posts[2]["id"]]["is_liked"] and not by_id[posts[2]["id"]]["is_reposted"]
+
+    # The same page seen by someone else carries their flags, not the viewer's
+    fan_view = {post["id"]: post for post in client.get(f"/users/{author['id']}/posts").json()}
+    assert not fan_view[posts[0]["id"]]["is_liked"] and fan_view[posts[0]["id"]]["likes_count"] == 2
+
+def test_feed_query_count_does_not_grow_with_the_page(client, make_user):
+    author, viewer = make_user(), make_user()
+    client.post(f"/users/{author['id']}/follow", headers=viewer["headers"])
+    for n in range(2):
+        post = client.post("/posts", headers=author["headers"], json={"content": f"Small page {n}"}).json()
+        client.post(f"/posts/{post['id']}/likes", headers=viewer["headers"])
+    assert queue.wait_idle()
+    small, small_queries = _feed(client, viewer)
+
+    for n in range(10):
+        post = client.post("/posts", headers=author["headers"], json={"content": f"Big page {n}"}).json()
+        client.post(f"/posts/{post['id']}/likes", headers=viewer["headers"])
+    assert queue.wait_idle()
+    big, big_queries = _feed(client, viewer)
+
+    assert (len(small), len(big)) == (2, 12)
+    assert big_queries == small_queries
+    assert all(post["is_liked"] for post in big)
+
+def test_anonymous_lists_have_no_viewer_flags(client, make_user):
+    author, reposter = make_user(), make_user()
+    post = client.post("/posts", headers=author["headers"], json={"content": "Share me"}).json()
+    client.post(f"/posts/{post['id']}/repost", headers=reposter["headers"])
+    client.post(f"/posts/{post['id']}/likes", headers=reposter["headers"])
+
+    reposts = client.get(f"/users/{reposter['id']}/reposts").json()
+    assert [item["id"] for item in reposts] == [post["id"]]
+    assert reposts[0]["author"]["id"] == author["id"]
+    assert reposts[0]["likes_count"] == reposts[0]["reposts_count"] == 1
+    assert not reposts[0]["is_liked"] and not reposts[0]["is_reposted"]
@@ -0,0 +1,58 @@
+# Conditional GETs: unchanged resources answer If-None-Match with 304
+def _revalidate(client, path, headers=None):
+    first = client.get(path, headers=headers)
+    etag = first.headers["etag"]
+    again = client.get(path, headers={**(headers or {}), "If-None-Match": etag})
+    return etag, again
+
+def test_user_and_profile(client, users):
+    alice = users["alice"]
+    etag, again = _revalidate(client, f"/users/{alice['id']}")
+    assert again.status_code == 304 and again.headers["etag"] == etag and again.content == b""
+
+    profile_etag, again = _revalidate(client, "/profile", alice["headers"])
+    assert again.status_code == 304
+
+    client.put("/profile", headers=alice["headers"], json={"bio": "Versioned"})
+    changed = client.get(f"/users/{alice['id']}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    changed = client.get("/profile", headers={**alice["headers"], "If-None-Match": profile_etag})
+    assert changed.status_code == 200 and changed.json()["bio"] == "Versioned"
+
+def test_post_and_comments(client, users):
+    alice, bob = users["alice"], users["bob"]
+    post = client.post("/posts", headers=bob["headers"], json={"content": "Conditional"}).json()
+    post_path, comments_path = f"/posts/{post['id']}", f"/posts/{post['id']}/comments"
+
+    post_etag, again = _revalidate(client, post_path, alice["headers"])
+    assert again.status_code == 304
+    comments_etag, again = _revalidate(client, comments_path)
+    assert again.status_code == 304
+
+    client.post(f"{post_path}/likes", headers=alice["headers"])
+    client.post(f"{post_path}/comments", headers=alice["headers"], json={"content": "New"})
+    changed = client.get(post_path, headers={**alice["headers"], "If-None-Match": post_etag})
+    assert changed.status_code == 200 and changed.json()["is_liked"] is True
+    changed = client.get(comments_path, headers={"If-None-Match": comments_etag})
+    assert changed.status_code == 200 and len(changed.json()) == 1
+
+# SQLite reuses the id of a deleted newest row - the ETag must still change
+def test_recreated_rows_get_new_etags(client, users):
+    alice, bob = users["alice"], users["bob"]
+    post = client.post("/posts", headers=bob["headers"], json={"content": "Thread"}).json()
+    comments_path = f"/posts/{post['id']}/comments"
+    comment = client.post(comments_path, headers=alice["headers"], json={"content": "Deleted soon"}).json()
+    etag = client.get(comments_path).headers["etag"]
+    client.delete(f"/comments/{comment['id']}", headers=alice["headers"])
+    replacement = client.post(comments_path, headers=alice["headers"], json={"content": "Replacement"}).json()
+    assert replacement["id"] == comment["id"]
+    changed = client.get(comments_path, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json()[0]["content"] == "Replacement"
+
+    old = client.post("/posts", headers=bob["headers"], json={"content": "Deleted soon"}).json()
+    etag = client.get(f"/posts/{old['id']}", headers=alice["headers"]).headers["etag"]
+    client.delete(f"/posts/{old['id']}", headers=bob["headers"])
+    new = client.post("/posts", headers=bob["headers"], json={"content": "Replacement"}).json()
+    assert new["id"] == old["id"]
+    changed = client.get(f"/posts/{new['id']}", headers={**alice["headers"], "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json()["content"] == "Replacement"
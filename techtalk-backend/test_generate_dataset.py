@@ -0,0 +1,33 @@
+# The dataset generator is reproducible and leaves the derived data consistent
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from counters import reconcile_counters
+from generate_dataset import generate, parse_args
+from models import User, Post, Like, Follower, Notification
+
+def _generate(path):
+    engine = create_engine(f"sqlite:///{path}")
+    args = parse_args(["--db", str(path), "--users", "150", "--posts", "3", "--end", "2026-01-01", "--seed", "7"])
+    counts = generate(engine, args, "not-a-real-hash")
+    return engine, counts
+
+def test_generator_is_reproducible_and_consistent(tmp_path):
+    first, counts = _generate(tmp_path / "a.db")
+    second, _ = _generate(tmp_path / "b.db")
+    assert counts["users"] == 150 and counts["posts"] == 450 and counts["likes"] > 0
+
+    with sessionmaker(bind=first)() as db, sessionmaker(bind=second)() as other:
+        for model in (Post, Like, Follower, Notification):
+            columns = [column for column in model.__table__.columns]
+            assert db.query(*columns).order_by(model.id).all() == other.query(*columns).order_by(model.id).all()
+
+        assert reconcile_counters(db, fix=False) == []
+        # Likes arrive already coalesced - one notification per liked post
+        liked_posts = db.query(func.count(func.distinct(Like.post_id))).scalar()
+        like_groups = db.query(func.count(Notification.id), func.sum(Notification.actor_count)).filter(Notification.type == "like").one()
+        assert like_groups == (liked_posts, counts["likes"])
+
+        # Power-law follower counts - the top account is far above the median
+        followers = sorted(count for (count,) in db.query(User.followers_count))
+        assert followers[-1] > 5 * max(1, followers[len(followers) // 2])
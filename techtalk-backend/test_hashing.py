@@ -0,0 +1,38 @@
+# Password hashing runs behind admission control and upgrades old hashes on login
+import threading
+from passlib.context import CryptContext
+
+import hashing
+from database import SessionLocal
+from models import User
+
+def test_saturated_pool_fails_fast(client, monkeypatch):
+    monkeypatch.setattr(hashing, "_admission", threading.BoundedSemaphore(1))
+    hashing._admission.acquire()
+    db = SessionLocal()
+    try:
+        db.add(User(username="erin", email="erin@example.com", password=hashing.hash_password("pw")))
+        db.commit()
+    finally:
+        db.close()
+    response = client.post("/login", json={"email": "erin@example.com", "password": "pw"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(hashing.RETRY_AFTER_SECONDS)
+
+def test_login_rehashes_old_cost(client):
+    old = CryptContext(schemes=["bcrypt"], bcrypt__rounds=hashing.BCRYPT_ROUNDS + 1).hash("pw")
+    db = SessionLocal()
+    try:
+        db.add(User(username="frank", email="frank@example.com", password=old))
+        db.commit()
+    finally:
+        db.close()
+
+    assert client.post("/login", json={"email": "frank@example.com", "password": "pw"}).status_code == 200
+    db = SessionLocal()
+    try:
+        stored = db.query(User).filter(User.username == "frank").one().password
+    finally:
+        db.close()
+    assert stored != old and not hashing.needs_rehash(stored)
+    assert hashing.verify_password("pw", stored)
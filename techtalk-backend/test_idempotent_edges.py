@@ -0,0 +1,38 @@
+# Like, follow and repost are single conflict-aware inserts; repeats are no-ops
+def test_like_and_repost_are_idempotent(client, users):
+    alice, bob = users["alice"], users["bob"]
+    post = client.post("/posts", headers=bob["headers"], json={"content": "Double click me"}).json()
+
+    for path in (f"/posts/{post['id']}/likes", f"/posts/{post['id']}/repost"):
+        first = client.post(path, headers=alice["headers"])
+        second = client.post(path, headers=alice["headers"])
+        assert first.status_code == second.status_code == 200
+        assert first.json()["created"] is True and second.json()["created"] is False
+
+    counts = client.get(f"/posts/{post['id']}", headers=alice["headers"]).json()
+    assert counts["likes_count"] == 1 and counts["reposts_count"] == 1
+
+    assert client.delete(f"/posts/{post['id']}/likes", headers=alice["headers"]).status_code == 200
+    assert client.delete(f"/posts/{post['id']}/likes", headers=alice["headers"]).status_code == 404
+    assert client.delete(f"/posts/{post['id']}/repost", headers=alice["headers"]).status_code == 200
+    counts = client.get(f"/posts/{post['id']}", headers=alice["headers"]).json()
+    assert counts["likes_count"] == 0 and counts["reposts_count"] == 0
+
+def test_missing_targets_are_not_found(client, users):
+    alice = users["alice"]
+    assert client.post("/posts/999999/likes", headers=alice["headers"]).status_code == 404
+    assert client.post("/posts/999999/repost", headers=alice["headers"]).status_code == 404
+    assert client.post("/users/999999/follow", headers=alice["headers"]).status_code == 404
+
+def test_follow_is_idempotent(client, users):
+    alice, carol = users["alice"], users["carol"]
+    client.delete(f"/users/{carol['id']}/follow", headers=alice["headers"])
+    followers = lambda: [user["id"] for user in client.get(f"/users/{carol['id']}/followers").json()]
+    assert alice["id"] not in followers()
+
+    assert client.post(f"/users/{carol['id']}/follow", headers=alice["headers"]).json()["created"] is True
+    assert client.post(f"/users/{carol['id']}/follow", headers=alice["headers"]).json()["created"] is False
+    assert followers().count(alice["id"]) == 1
+
+    assert client.delete(f"/users/{carol['id']}/follow", headers=alice["headers"]).status_code == 200
+    assert client.delete(f"/users/{carol['id']}/follow", headers=alice["headers"]).status_code == 404
@@ -0,0 +1,141 @@
+# Outbox jobs run after the enqueuing commit, with retries and a draining shutdown
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+from database import SessionLocal
+from models import Job, Notification
+from notifications import notify
+
+calls = []
+
+@jobs.handler("test_flaky")
+def _flaky(db, key):
+    calls.append(key)
+    if calls.count(key) == 1:
+        raise RuntimeError("first attempt fails")
+
+@jobs.handler("test_broken")
+def _broken(db, key):
+    raise RuntimeError("always fails")
+
+# Writes a notification, then fails before the queue could commit it
+@jobs.handler("test_write_then_fail")
+def _write_then_fail(db, key):
+    db.add(Notification(user_id=1, type="test", message=key))
+    calls.append(key)
+    if calls.count(key) == 1:
+        raise RuntimeError("died mid-job")
+    def push():
+        raise RuntimeError("stream push failed")
+    return push
+
+def _enqueue(kind, key, commit=True):
+    db = SessionLocal()
+    try:
+        jobs.enqueue(db, kind, key=key)
+        db.commit() if commit else db.rollback()
+    finally:
+        db.close()
+
+def _jobs(kind):
+    db = SessionLocal()
+    try:
+        return db.query(Job).filter(Job.kind == kind).all()
+    finally:
+        db.close()
+
+def test_failed_jobs_are_retried_then_given_up(client, monkeypatch):
+    monkeypatch.setattr(jobs, "RETRY_BASE_SECONDS", 0)
+    monkeypatch.setattr(jobs, "MAX_ATTEMPTS", 2)
+
+    _enqueue("test_flaky", "a")
+    _enqueue("test_flaky", "rolled-back", commit=False)
+    _enqueue("test_broken", "b")
+    assert jobs.queue.wait_idle()
+
+    assert calls == ["a", "a"]
+    assert _jobs("test_flaky") == []
+    [broken] = _jobs("test_broken")
+    assert broken.status == "failed" and broken.attempts == 2
+    assert broken.last_error == "RuntimeError: always fails"
+
+def test_shutdown_drains_due_jobs(client):
+    # Only this queue's worker may run the jobs below
+    jobs.queue.shutdown()
+    try:
+        _enqueue("test_flaky", "c")
+        _enqueue("test_flaky", "d")
+        queue = jobs.JobQueue(SessionLocal, 1)
+        queue.start()
+        queue.shutdown()
+        assert not queue._threads
+        assert calls.count("c") == calls.count("d") == 1
+        assert queue.backlog(due_only=True) == 0
+        # The failed first attempts wait for their retry in the outbox
+        assert queue.backlog() == 2
+    finally:
+        jobs.queue.start()
+
+def _messages(key):
+    db = SessionLocal()
+    try:
+        return [row.message for row in db.query(Notification).filter(Notification.message == key)]
+    finally:
+        db.close()
+
+# The handler's writes commit together with the job's deletion: a failed
+# attempt leaves nothing behind, and a failing push afterwards is not retried
+def test_handler_writes_commit_with_the_job(client, users, monkeypatch):
+    monkeypatch.setattr(jobs, "RETRY_BASE_SECONDS", 0)
+    _enqueue("test_write_then_fail", "written once")
+    assert jobs.queue.wait_idle()
+    assert calls.count("written once") == 2
+    assert _messages("written once") == ["written once"]
+    assert _jobs("test_write_then_fail") == []
+
+    # The notification handlers leave the commit to the queue too
+    db = SessionLocal()
+    try:
+        notify(db, users["alice"]["id"], "comment", "never committed")
+        db.rollback()
+    finally:
+        db.close()
+    assert _messages("never committed") == []
+
+# start() only takes back claims old enough to belong to a dead worker
+def test_start_requeues_only_stale_claims(client):
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        live = Job(kind="test_flaky", payload='{"key": "live"}', status="running", attempts=1, claimed_at=now)
+        dead = Job(kind="test_flaky", payload='{"key": "dead"}', status="running", attempts=1,
+                   claimed_at=now - timedelta(seconds=jobs.CLAIM_TIMEOUT_SECONDS + 1))
+        db.add_all([live, dead])
+        db.commit()
+        live_id, dead_id = live.id, dead.id
+    finally:
+        db.close()
+
+    queue = jobs.JobQueue(SessionLocal, 0)
+    try:
+        queue.start()
+        statuses = {job.id: job.status for job in _jobs("test_flaky")}
+        assert statuses[live_id] == "running"
+        assert statuses.get(dead_id, "done") != "running"
+    finally:
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id.in_([live_id, dead_id])).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+def test_enqueue_rejects_unknown_kind():
+    db = SessionLocal()
+    try:
+        with pytest.raises(ValueError):
+            jobs.enqueue(db, "no_such_job")
+    finally:
+        db.close()
@@ -0,0 +1,28 @@
+# Server-Timing on every response and Prometheus text on /metrics
+from instrumentation import metrics, queries_from_header
+
+def test_server_timing_counts_queries(client, users):
+    alice = users["alice"]
+    response = client.get("/feed", headers=alice["headers"])
+    timing = response.headers["server-timing"]
+    assert timing.startswith("db;dur=") and "app;dur=" in timing
+    assert queries_from_header(timing) >= 1
+
+    # /metrics itself runs no SQL
+    assert queries_from_header(client.get("/metrics").headers["server-timing"]) == 0
+
+def test_metrics_use_route_templates(client, users):
+    alice = users["alice"]
+    metrics.clear()
+    post = client.post("/posts", headers=alice["headers"], json={"content": "Measure me"}).json()
+    client.get(f"/posts/{post['id']}", headers=alice["headers"])
+    client.get("/posts/999999", headers=alice["headers"])
+
+    text = client.get("/metrics").text
+    assert 'techtalk_http_requests_total{method="GET",route="/posts/{post_id}",status="200"} 1' in text
+    assert 'techtalk_http_requests_total{method="GET",route="/posts/{post_id}",status="404"} 1' in text
+    assert f"/posts/{post['id']}" not in text
+    assert 'techtalk_http_request_duration_seconds_bucket{method="POST",route="/posts",le="+Inf"} 1' in text
+    assert 'techtalk_db_queries_per_request_count{method="GET",route="/posts/{post_id}"} 2' in text
+    assert 'techtalk_db_pool_connections{engine="write",state="checked_out"}' in text
+    assert "# TYPE techtalk_jobs gauge" in text
@@ -0,0 +1,73 @@
+# Likes, reposts and follows on one target merge into a single notification
+from database import SessionLocal
+from models import Notification
+from notifications import activity_message
+from jobs import queue
+
+def _like_rows(user_id, post_id):
+    db = SessionLocal()
+    try:
+        return db.query(Notification).filter(
+            Notification.user_id == user_id, Notification.group_key == f"like:{post_id}"
+        ).order_by(Notification.id).all()
+    finally:
+        db.close()
+
+def test_likes_merge_into_one_notification(client, users):
+    alice, bob, carol = users["alice"], users["bob"], users["carol"]
+    post = client.post("/posts", headers=carol["headers"], json={"content": "Going viral"}).json()
+    assert queue.wait_idle()
+    before = client.get("/notifications/unread-count", headers=carol["headers"]).json()["unread_count"]
+
+    client.post(f"/posts/{post['id']}/likes", headers=alice["headers"])
+    client.post(f"/posts/{post['id']}/likes", headers=bob["headers"])
+    # Unlike and like again - still two actors
+    client.delete(f"/posts/{post['id']}/likes", headers=alice["headers"])
+    client.post(f"/posts/{post['id']}/likes", headers=alice["headers"])
+    assert queue.wait_idle()
+
+    rows = _like_rows(carol["id"], post["id"])
+    assert len(rows) == 1
+    assert rows[0].actor_count == 2
+    assert rows[0].message == "alice and bob liked your post"
+    assert client.get("/notifications/unread-count", headers=carol["headers"]).json()["unread_count"] == before + 1
+
+    listed = [n for n in client.get("/notifications", headers=carol["headers"]).json() if n["id"] == rows[0].id]
+    assert listed[0]["actor_count"] == 2 and listed[0]["target_id"] == post["id"]
+    assert [actor["username"] for actor in listed[0]["actors"]] == ["alice", "bob"]
+
+    # Once read, the next like opens a new group
+    client.put("/notifications/read-all", headers=carol["headers"])
+    client.delete(f"/posts/{post['id']}/likes", headers=bob["headers"])
+    client.post(f"/posts/{post['id']}/likes", headers=bob["headers"])
+    assert queue.wait_idle()
+    rows = _like_rows(carol["id"], post["id"])
+    assert len(rows) == 2 and rows[-1].actor_count == 1 and not rows[-1].read
+
+# actor_sample keeps three names; the count must still see every actor
+def test_repeat_actor_outside_sample_is_not_recounted(client, make_user):
+    author = make_user()
+    likers = [make_user() for _ in range(5)]
+    post = client.post("/posts", headers=author["headers"], json={"content": "Crowd pleaser"}).json()
+    for liker in likers:
+        client.post(f"/posts/{post['id']}/likes", headers=liker["headers"])
+    assert queue.wait_idle()
+
+    first = likers[0]
+    assert first["username"] not in [actor["username"] for actor in _like_rows(author["id"], post["id"])[0].actors]
+    client.delete(f"/posts/{post['id']}/likes", headers=first["headers"])
+    client.post(f"/posts/{post['id']}/likes", headers=first["headers"])
+    assert queue.wait_idle()
+
+    rows = _like_rows(author["id"], post["id"])
+    assert len(rows) == 1
+    assert rows[0].actor_count == 5
+    assert rows[0].actors[0]["username"] == first["username"]
+    assert rows[0].message == f"{first['username']} and 4 others liked your post"
+
+def test_activity_message():
+    actors = [{"id": 1, "username": "alice"}, {"id": 2, "username": "bob"}]
+    assert activity_message("like", actors[:1], 1) == "alice liked your post"
+    assert activity_message("follow", actors, 2) == "alice and bob started following you"
+    assert activity_message("repost", actors, 3) == "alice and 2 others reposted your post"
+    assert activity_message("like", actors, 42) == "alice and 41 others liked your post"
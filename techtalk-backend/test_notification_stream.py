@@ -0,0 +1,60 @@
+# Notification writes are pushed to the user's subscribers and rendered as SSE
+import asyncio
+
+from broker import LocalBroker, get_broker, user_channel
+from notifications import event_stream, format_sse
+
+def test_like_pushes_notification_and_count(client, users):
+    alice, bob = users["alice"], users["bob"]
+    post = client.post("/posts", headers=bob["headers"], json={"content": "Push me"}).json()
+
+    async def run():
+        subscription = get_broker().subscribe(user_channel(bob["id"]))
+        try:
+            await asyncio.to_thread(client.post, f"/posts/{post['id']}/likes", headers=alice["headers"])
+            first = await subscription.get(timeout=5)
+            second = await subscription.get(timeout=5)
+            await asyncio.to_thread(client.put, "/notifications/read-all", headers=bob["headers"])
+            third = await subscription.get(timeout=5)
+            return first, second, third
+        finally:
+            subscription.close()
+
+    notification, count, after_read = asyncio.run(run())
+    assert notification["event"] == "notification" and notification["data"]["type"] == "like"
+    assert count["event"] == "unread_count" and count["data"]["unread_count"] >= 1
+    assert after_read["data"] == {"unread_count": 0}
+
+def test_event_stream_format_and_overflow():
+    class Request:
+        def __init__(self):
+            self.polls = 0
+
+        async def is_disconnected(self):
+            self.polls += 1
+            return self.polls > 1
+
+    async def run():
+        broker = LocalBroker()
+        subscription = broker.subscribe("user:1")
+        broker.publish("user:1", {"event": "notification", "data": {"id": 7}, "id": 7})
+        await asyncio.sleep(0)
+        chunks = [chunk async for chunk in event_stream(Request(), subscription, 3)]
+        assert broker.subscriber_count("user:1") == 0
+
+        slow = broker.subscribe("user:2")
+        for i in range(slow.queue.maxsize + 1):
+            broker.publish("user:2", {"event": "notification", "data": {"id": i}})
+        await asyncio.sleep(0)
+        events = [await slow.get(timeout=1) for _ in range(slow.queue.maxsize + 1)]
+        return chunks, events[-1]
+
+    chunks, last = asyncio.run(run())
+    assert chunks[0] == 'event: unread_count\ndata: {"unread_count": 3}\n\n'
+    assert chunks[1] == format_sse({"event": "notification", "data": {"id": 7}, "id": 7})
+    assert chunks[1].startswith("id: 7\n")
+    assert last["event"] == "resync"
+
+def test_stream_requires_token(client):
+    assert client.get("/notifications/stream").status_code == 401
+    assert client.get("/notifications/stream?token=garbage").status_code == 401
@@ -0,0 +1,75 @@
+# Keyset cursors - stable pages while rows are inserted, 400 on bad cursors
+from datetime import datetime
+
+import pytest
+
+from database import SessionLocal
+from jobs import queue
+from models import Post
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, next_cursor, paginate_desc
+
+def _page(client, path, **kwargs):
+    response = client.get(path, **kwargs)
+    assert response.status_code == 200
+    return [row["id"] for row in response.json()], response.headers.get(NEXT_CURSOR_HEADER)
+
+def test_feed_pages_survive_new_posts(client, make_user):
+    author, viewer = make_user(), make_user()
+    client.post(f"/users/{author['id']}/follow", headers=viewer["headers"])
+    posted = [client.post("/posts", headers=author["headers"], json={"content": f"Old {n}"}).json()["id"] for n in range(5)]
+    assert queue.wait_idle()
+
+    first, cursor = _page(client, "/feed", headers=viewer["headers"], params={"limit": 3})
+    assert first == posted[:1:-1] and cursor
+    # Newer posts land on top, not in the middle of the next page
+    for n in range(2):
+        client.post("/posts", headers=author["headers"], json={"content": f"New {n}"})
+    assert queue.wait_idle()
+
+    second, cursor = _page(client, "/feed", headers=viewer["headers"], params={"limit": 3, "cursor": cursor})
+    assert second == posted[1::-1] and cursor is None
+
+def test_public_feed_pages_do_not_overlap(client, make_user):
+    author = make_user()
+    for n in range(4):
+        client.post("/posts", headers=author["headers"], json={"content": f"Public {n}"})
+
+    first, cursor = _page(client, "/feed/public", params={"limit": 3})
+    client.post("/posts", headers=author["headers"], json={"content": "Public late"})
+    second, _ = _page(client, "/feed/public", params={"limit": 3, "cursor": cursor})
+    assert len(second) == 3
+    assert not set(first) & set(second)
+    assert max(second) < min(first)
+
+def test_equal_timestamps_page_by_id(client, make_user):
+    author = make_user()
+    at = datetime(2020, 1, 1)
+    db = SessionLocal()
+    try:
+        db.add_all([Post(user_id=author["id"], content=f"Same second {n}", timestamp=at) for n in range(5)])
+        db.commit()
+        query = lambda: db.query(Post).filter(Post.user_id == author["id"])
+        pages, cursor = [], None
+        while True:
+            page = paginate_desc(query(), Post.timestamp, Post.id, cursor, limit=2)
+            pages.append([post.id for post in page])
+            cursor = next_cursor(page, 2)
+            if cursor is None:
+                break
+        ids = [post_id for page in pages for post_id in page]
+        assert ids == sorted(ids, reverse=True) and len(ids) == 5
+        assert [len(page) for page in pages] == [2, 2, 1]
+    finally:
+        db.close()
+
+def test_cursor_round_trip():
+    at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    assert decode_cursor(encode_cursor(at, 42)) == (at, 42)
+
+@pytest.mark.parametrize("cursor", ["garbage", encode_cursor(datetime(2024, 1, 1), 1)[:-3], "bm90LWEtY3Vyc29y"])
+def test_invalid_cursor_is_rejected(client, users, cursor):
+    headers = users["alice"]["headers"]
+    for path in ("/feed", "/feed/public", "/messages/conversations"):
+        response = client.get(path, headers=headers, params={"cursor": cursor})
+        assert response.status_code == 400, path
+        assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,76 @@
+# get_current_user serves repeat requests from the principal cache
+from sqlalchemy import event
+
+from auth import PrincipalCache, principal_cache
+from database import engine, read_engine
+
+def _count_queries(fn):
+    seen = []
+    listener = lambda *args: seen.append(args[2])
+    for bound in (engine, read_engine):
+        event.listen(bound, "before_cursor_execute", listener)
+    try:
+        fn()
+    finally:
+        for bound in (engine, read_engine):
+            event.remove(bound, "before_cursor_execute", listener)
+    return len(seen)
+
+def test_cached_principal_skips_database(client, users):
+    headers = users["carol"]["headers"]
+    principal_cache.invalidate(users["carol"]["id"])
+    assert _count_queries(lambda: client.get("/profile", headers=headers)) == 1
+    assert _count_queries(lambda: client.get("/profile", headers=headers)) == 0
+
+def test_profile_update_invalidates(client, users):
+    headers = users["carol"]["headers"]
+    client.get("/profile", headers=headers)
+    client.put("/profile", headers=headers, json={"bio": "Cache invalidation enjoyer"})
+    assert client.get("/profile", headers=headers).json()["bio"] == "Cache invalidation enjoyer"
+
+def test_lru_and_ttl():
+    from models import User
+    cache = PrincipalCache(ttl=60, max_size=2)
+    for user_id in (1, 2, 3):
+        cache.put(User(id=user_id, username=f"u{user_id}", email=f"u{user_id}@example.com", password="x"), cache.begin_load())
+    assert cache.get(1) is None and cache.get(3).username == "u3"
+    assert cache.stats()["evictions"] == 1
+
+    expired = PrincipalCache(ttl=-1, max_size=2)
+    expired.put(User(id=1, username="u1", email="u1@example.com", password="x"), expired.begin_load())
+    assert expired.get(1) is None
+
+def test_load_started_before_invalidation_is_not_stored():
+    from models import User
+    cache = PrincipalCache(ttl=60, max_size=2)
+    stale = User(id=1, username="u1", email="u1@example.com", password="x", bio="old")
+    started = cache.begin_load()
+    cache.invalidate(1)  # e.g. update_profile committed meanwhile
+    cache.put(stale, started)
+    assert cache.get(1) is None
+    cache.put(stale, cache.begin_load())
+    assert cache.get(1).bio == "old"
+
+    # Once an invalidation is forgotten, loads from before it are not trusted
+    started = cache.begin_load()
+    for user_id in (2, 3, 4):
+        cache.invalidate(user_id)
+    cache.put(User(id=5, username="u5", email="u5@example.com", password="x"), started)
+    assert cache.get(5) is None
+
+# The race through the app: a request reads carol's row, /profile updates it,
+# then the first request finishes
+def test_profile_update_during_load_is_not_cached_stale(client, users, monkeypatch):
+    import auth
+    carol = users["carol"]
+    principal_cache.invalidate(carol["id"])
+    original_put = principal_cache.put
+
+    def put_after_update(user, started):
+        monkeypatch.undo()
+        client.put("/profile", headers=carol["headers"], json={"bio": "Updated mid-load"})
+        original_put(user, started)
+    monkeypatch.setattr(auth.principal_cache, "put", put_after_update)
+
+    client.get("/profile", headers=carol["headers"])
+    assert client.get("/profile", headers=carol["headers"]).json()["bio"] == "Updated mid-load"
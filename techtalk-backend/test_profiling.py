@@ -0,0 +1,57 @@
+# Opt-in request profiles: admin header or sampling, stored as collapsed stacks
+import re
+import time
+
+import pytest
+
+import auth
+import main
+import profiling
+from profiling import PROFILE_ID_HEADER, ProfileStore
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ProfileStore(str(tmp_path), keep=3)
+    monkeypatch.setattr(profiling, "store", store)
+    monkeypatch.setattr(auth, "ADMIN_USERNAMES", {"alice"})
+    return store
+
+# Slow enough for the sampler to catch the handler in the act
+def _slow_hydrate(db, posts, viewer_id=None):
+    time.sleep(0.05)
+    return posts
+
+def test_admin_header_profiles_the_handler(client, users, store, monkeypatch):
+    alice = users["alice"]
+    monkeypatch.setattr(main, "hydrate_posts", _slow_hydrate)
+    response = client.get("/feed", headers={**alice["headers"], "X-Profile": "1"})
+    profile_id = response.headers[PROFILE_ID_HEADER]
+
+    listed = client.get("/admin/profiles", headers=alice["headers"]).json()
+    assert listed[0]["id"] == profile_id
+    assert listed[0]["route"] == "/feed" and listed[0]["reason"] == "header"
+    assert listed[0]["status"] == 200 and listed[0]["samples"] > 0
+
+    collapsed = client.get(f"/admin/profiles/{profile_id}", headers=alice["headers"]).text
+    lines = collapsed.splitlines()
+    assert all(re.match(r"^\S+ \d+$", line) for line in lines)
+    assert any("main:get_feed;test_profiling:_slow_hydrate" in line for line in lines)
+
+def test_non_admins_are_not_profiled(client, users, store):
+    bob = users["bob"]
+    response = client.get("/feed", headers={**bob["headers"], "X-Profile": "1"})
+    assert PROFILE_ID_HEADER not in response.headers
+    assert client.get("/admin/profiles", headers=bob["headers"]).status_code == 403
+    assert store.list() == []
+
+def test_sampling_and_ring_buffer(client, users, store, monkeypatch):
+    monkeypatch.setattr(profiling, "SAMPLE_RATE", 1.0)
+    ids = [client.get("/feed/public").headers[PROFILE_ID_HEADER] for _ in range(5)]
+    monkeypatch.setattr(profiling, "SAMPLE_RATE", 0)
+
+    listed = client.get("/admin/profiles", headers=users["alice"]["headers"]).json()
+    assert [profile["id"] for profile in listed] == ids[:-4:-1]
+    assert {profile["reason"] for profile in listed} == {"sampled"}
+    assert store.path(ids[0]) is None
+    assert client.get(f"/admin/profiles/{ids[0]}", headers=users["alice"]["headers"]).status_code == 404
+    assert client.get("/admin/profiles/..%2Fsecrets", headers=users["alice"]["headers"]).status_code == 404
@@ -0,0 +1,56 @@
+# Per-route SQL budgets and the N+1 detector in instrumentation.py
+import logging
+
+import pytest
+
+import instrumentation
+from database import SessionLocal
+from instrumentation import NPlusOneError, RequestStats, fingerprint
+from jobs import queue
+from models import User
+
+# Budgets hold however many rows the route returns
+def test_list_routes_stay_within_budget(client, users, query_budget):
+    alice, bob, carol = users["alice"], users["bob"], users["carol"]
+    client.post(f"/users/{bob['id']}/follow", headers=alice["headers"])
+    post = client.post("/posts", headers=bob["headers"], json={"content": "Count my queries"}).json()
+    for round in range(4):
+        for user in (alice, bob, carol):
+            client.post(f"/posts/{post['id']}/comments", headers=user["headers"], json={"content": f"Reply {round}"})
+        client.post("/messages", headers=bob["headers"], json={"receiver_id": alice["id"], "content": f"Ping {round}"})
+    queue.wait_idle()
+
+    assert len(query_budget("GET", f"/posts/{post['id']}/comments", 1).json()) == 12
+    assert len(query_budget("GET", f"/messages/{bob['id']}", 3, headers=alice["headers"]).json()) >= 4
+    query_budget("GET", "/messages/conversations", 1, headers=alice["headers"])
+    query_budget("GET", "/notifications", 1, headers=bob["headers"])
+    # Timeline, pull authors, posts, then the viewer's likes and reposts
+    assert query_budget("GET", "/feed", 5, headers=alice["headers"]).json()
+    query_budget("GET", f"/users/{bob['id']}/posts", 1)
+
+def test_fingerprint_ignores_literals_and_list_lengths():
+    assert fingerprint("SELECT * FROM posts WHERE id = 12") == fingerprint("SELECT * FROM posts WHERE id = 13")
+    assert fingerprint("SELECT * FROM users WHERE id IN (?, ?)") == fingerprint("SELECT * FROM users\n WHERE id IN (?)")
+    assert fingerprint("SELECT 'a' FROM t1") == "SELECT ? FROM t1"
+
+def _repeat_lookups(times):
+    db = SessionLocal()
+    token = instrumentation._current.set(RequestStats())
+    try:
+        for user_id in range(times):
+            db.query(User).filter(User.id == user_id).first()
+    finally:
+        instrumentation._current.reset(token)
+        db.close()
+
+def test_repeated_statement_raises_with_origin(users):
+    _repeat_lookups(instrumentation.NPLUSONE_THRESHOLD)
+    with pytest.raises(NPlusOneError, match=r"test_query_budgets\.py:\d+ in _repeat_lookups"):
+        _repeat_lookups(instrumentation.NPLUSONE_THRESHOLD + 1)
+
+def test_log_mode_warns_once(users, monkeypatch, caplog):
+    monkeypatch.setattr(instrumentation, "NPLUSONE_MODE", "log")
+    with caplog.at_level(logging.WARNING, logger="techtalk.nplusone"):
+        _repeat_lookups(instrumentation.NPLUSONE_THRESHOLD * 2)
+    assert len(caplog.records) == 1
+    assert "in _repeat_lookups: SELECT users.id" in caplog.records[0].getMessage()
@@ -0,0 +1,155 @@
+# Every SQL statement issued by the routes in main.py must be served by an index
+import re
+import pytest
+from sqlalchemy import event
+
+from database import engine, read_engine
+
+# Routes whose plan legitimately walks a table, with the table and the reason
+ALLOWED_SCANS = {
+    ("GET", "/users/suggested"): ("users", "NOT IN over a handful of ids, stops after `limit` rows"),
+}
+
+# Routes the scenario cannot drive with plain requests, and where they are tested
+UNPLANNED_ROUTES = {
+    ("GET", "/notifications/stream"): "long-lived SSE response - test_notification_stream.py",
+    ("GET", "/metrics"): "no SQL - test_metrics.py",
+    ("GET", "/admin/profiles"): "reads profile files, not SQL - test_profiling.py",
+    ("GET", "/admin/profiles/{profile_id}"): "reads profile files, not SQL - test_profiling.py",
+}
+
+# SQLite reports a full table scan as a bare "SCAN <table>". "SCAN <table>
+# USING INDEX" walks a whole index and only counts as a seek when a LIMIT stops
+# it early (ORDER BY ... LIMIT served from the index). Virtual tables (FTS5)
+# and subquery/constant rows carry other detail and are not matched.
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+INDEX_SCAN = re.compile(r"^SCAN (\w+) USING (?:COVERING )?INDEX ")
+HAS_LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+
+def _scenario(users):
+    alice, bob = users["alice"], users["bob"]
+    a, b = alice["headers"], bob["headers"]
+    ids = {}
+
+    # (method, route path, request path or callable(ids, last response), headers, json)
+    return ids, [
+        ("GET", "/", "/", None, None),
+        ("POST", "/users/{user_id}/follow", f"/users/{bob['id']}/follow", a, None),
+        ("POST", "/users/{user_id}/follow", f"/users/{alice['id']}/follow", b, None),
+        ("POST", "/posts", "/posts", b, {"content": "Indexes make SQLite fast", "tags": "sqlite,perf"}),
+        ("POST", "/posts", "/posts", a, {"content": "Keyset pagination rocks", "tags": "sqlite"}),
+        ("GET", "/feed/public", "/feed/public?limit=1", None, None),
+        ("GET", "/feed/public", lambda ids, last: f"/feed/public?limit=1&cursor={last.headers['x-next-cursor']}", None, None),
+        ("GET", "/feed", "/feed?limit=1", a, None),
+        ("GET", "/feed", lambda ids, last: f"/feed?limit=1&cursor={last.headers['x-next-cursor']}", a, None),
+        ("GET", "/posts/{post_id}", lambda ids, last: f"/posts/{ids['bob_post']}", a, None),
+        ("PUT", "/posts/{post_id}", lambda ids, last: f"/posts/{ids['alice_post']}", a, {"content": "Edited", "tags": "perf"}),
+        ("POST", "/posts/{post_id}/likes", lambda ids, last: f"/posts/{ids['bob_post']}/likes", a, None),
+        ("POST", "/posts/{post_id}/repost", lambda ids, last: f"/posts/{ids['bob_post']}/repost", a, None),
+        ("POST", "/posts/{post_id}/comments", lambda ids, last: f"/posts/{ids['bob_post']}/comments", a, {"content": "Nice"}),
+        ("GET", "/posts/{post_id}/comments", lambda ids, last: f"/posts/{ids['bob_post']}/comments", None, None),
+        ("GET", "/users/{user_id}", f"/users/{bob['id']}", None, None),
+        ("GET", "/users/{user_id}/posts", f"/users/{bob['id']}/posts", None, None),
+        ("GET", "/users/{user_id}/reposts", f"/users/{alice['id']}/reposts", None, None),
+        ("GET", "/users/{user_id}/followers", f"/users/{bob['id']}/followers", None, None),
+        ("GET", "/users/{user_id}/following", f"/users/{alice['id']}/following", None, None),
+        ("GET", "/users/{user_id}/is-following", f"/users/{bob['id']}/is-following", a, None),
+        ("GET", "/users/suggested", "/users/suggested", a, None),
+        ("GET", "/search/posts", "/search/posts?q=index", a, None),
+        ("GET", "/search/users", "/search/users?q=car", None, None),
+        ("GET", "/trending/tags", "/trending/tags?window=7d", None, None),
+        ("GET", "/trending/users", "/trending/users", None, None),
+        ("POST", "/messages", "/messages", a, {"receiver_id": bob["id"], "content": "Hi Bob"}),
+        ("GET", "/messages/conversations", "/messages/conversations", b, None),
+        ("GET", "/messages/{user_id}", f"/messages/{alice['id']}", b, None),
+        ("GET", "/notifications", "/notifications", b, None),
+        ("GET", "/notifications/unread-count", "/notifications/unread-count", b, None),
+        ("PUT", "/notifications/{notification_id}/read", lambda ids, last: f"/notifications/{ids['notification']}/read", b, None),
+        ("PUT", "/notifications/read-all", "/notifications/read-all", b, None),
+        ("GET", "/profile", "/profile", a, None),
+        ("PUT", "/profile", "/profile", a, {"bio": "Query planner fan"}),
+        ("DELETE", "/posts/{post_id}/likes", lambda ids, last: f"/posts/{ids['bob_post']}/likes", a, None),
+        ("DELETE", "/posts/{post_id}/repost", lambda ids, last: f"/posts/{ids['bob_post']}/repost", a, None),
+        ("DELETE", "/comments/{comment_id}", lambda ids, last: f"/comments/{ids['comment']}", a, None),
+        ("DELETE", "/users/{user_id}/follow", f"/users/{bob['id']}/follow", a, None),
+        ("DELETE", "/posts/{post_id}", lambda ids, last: f"/posts/{ids['alice_post']}", a, None),
+        ("POST", "/register", "/register", None, {"username": "dave", "email": "dave@example.com", "password": "pw"}),
+        ("POST", "/login", "/login", None, {"email": "dave@example.com", "password": "pw"}),
+        ("POST", "/password-reset/verify", "/password-reset/verify", None, {"email": "dave@example.com", "security_answer": ""}),
+        ("POST", "/password-reset/reset", "/password-reset/reset", None, {"email": "dave@example.com", "security_answer": "", "new_password": "pw2"}),
+    ]
+
+@pytest.fixture(scope="module")
+def captured(client, users):
+    ids, scenario = _scenario(users)
+    statements = []
+    current = {}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "route" in current and not executemany:
+            statements.append((current["route"], statement, parameters))
+
+    for bound in (engine, read_engine):
+        event.listen(bound, "before_cursor_execute", capture)
+    last = None
+    try:
+        for method, route, path, headers, body in scenario:
+            current["route"] = (method, route)
+            if callable(path):
+                path = path(ids, last)
+            last = client.request(method, path, headers=headers, json=body)
+            assert last.status_code < 400, (method, path, last.status_code, last.text)
+
+            data = last.json()
+            if (method, route) == ("POST", "/posts"):
+                ids["alice_post" if headers is users["alice"]["headers"] else "bob_post"] = data["id"]
+            elif (method, route) == ("POST", "/posts/{post_id}/comments"):
+                ids["comment"] = data["id"]
+            elif (method, route) == ("GET", "/notifications"):
+                ids["notification"] = data[0]["id"]
+    finally:
+        current.clear()
+        for bound in (engine, read_engine):
+            event.remove(bound, "before_cursor_execute", capture)
+    return statements
+
+def _plan(statement, parameters):
+    with engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        try:
+            rows = cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+        finally:
+            cursor.close()
+    return [row[-1] for row in rows]
+
+# New endpoints must be added to the scenario above
+def test_every_route_is_exercised(users):
+    from main import app
+    _, scenario = _scenario(users)
+    covered = {(method, route) for method, route, _, _, _ in scenario}
+    routes = {
+        (method, route.path)
+        for route in app.routes
+        if getattr(route, "methods", None) and not route.path.startswith(("/docs", "/redoc", "/openapi"))
+        for method in route.methods - {"HEAD", "OPTIONS"}
+    }
+    missing = routes - covered - set(UNPLANNED_ROUTES)
+    assert not missing, sorted(missing)
+
+def test_hot_queries_use_indexes(captured):
+    offenders = []
+    for route, statement, parameters in captured:
+        verb = statement.lstrip().upper()
+        if not (verb.startswith(("SELECT", "UPDATE", "DELETE")) or (verb.startswith("INSERT") and "SELECT" in verb)):
+            continue
+        for detail in _plan(statement, parameters):
+            match = FULL_SCAN.match(detail)
+            if not match and not HAS_LIMIT.search(statement):
+                match = INDEX_SCAN.match(detail)
+            if not match:
+                continue
+            allowed = ALLOWED_SCANS.get(route)
+            if allowed and allowed[0] == match.group(1):
+                continue
+            offenders.append(f"{route[0]} {route[1]}: {detail}\n    {' '.join(statement.split())}")
+    assert not offenders, "Full table scans:\n" + "\n".join(offenders)
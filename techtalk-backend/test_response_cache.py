@@ -0,0 +1,98 @@
+# Public read routes are served from the response cache and invalidated by writes
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import response_cache
+from response_cache import MemoryBackend
+
+def test_hit_then_invalidated_by_like(client, users):
+    alice, bob = users["alice"], users["bob"]
+    post = client.post("/posts", headers=bob["headers"], json={"content": "Cache me"}).json()
+
+    first = client.get("/feed/public?limit=5")
+    assert first.headers["x-cache"] == "MISS"
+    assert client.get("/feed/public?limit=5").headers["x-cache"] == "HIT"
+
+    client.post(f"/posts/{post['id']}/likes", headers=alice["headers"])
+    after = client.get("/feed/public?limit=5")
+    assert after.headers["x-cache"] == "MISS"
+    liked = next(p for p in after.json() if p["id"] == post["id"])
+    assert liked["likes_count"] == 1
+
+def test_comments_and_profile_invalidation(client, users):
+    alice, bob = users["alice"], users["bob"]
+    post = client.post("/posts", headers=bob["headers"], json={"content": "Discuss"}).json()
+    assert client.get(f"/posts/{post['id']}/comments").json() == []
+    client.post(f"/posts/{post['id']}/comments", headers=alice["headers"], json={"content": "First"})
+    comments = client.get(f"/posts/{post['id']}/comments").json()
+    assert [c["content"] for c in comments] == ["First"]
+
+    client.get(f"/users/{alice['id']}")
+    client.put("/profile", headers=alice["headers"], json={"bio": "Renamed bio"})
+    assert client.get(f"/users/{alice['id']}").json()["bio"] == "Renamed bio"
+    assert client.get(f"/posts/{post['id']}/comments").json()[0]["author"]["bio"] == "Renamed bio"
+
+def test_stale_while_revalidate(client, monkeypatch):
+    monkeypatch.setitem(response_cache.ROUTE_TTLS, "/trending/users", (0, 60))
+    client.get("/trending/users?limit=3")
+    stale = client.get("/trending/users?limit=3")
+    assert stale.headers["x-cache"] == "STALE"
+    deadline = time.monotonic() + 5
+    while response_cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not response_cache._refreshing
+
+def test_memory_backend_lru_and_tags():
+    backend = MemoryBackend(max_entries=2)
+    entry = lambda *tags: {"body": b"[]", "headers": {}, "tags": list(tags), "expires": 0, "stale_until": 0}
+    backend.set("a", entry("post:1"))
+    backend.set("b", entry("post:2"))
+    backend.get("a")
+    backend.set("c", entry("post:1"))
+    assert backend.get("b") is None
+    backend.invalidate_tags(["post:1"])
+    assert backend.get("a") is None and backend.get("c") is None
+
+def _blocking_loader(release, tags):
+    calls = []
+    def load(db):
+        calls.append(1)
+        release.wait(5)
+        return {"loads": len(calls)}, tags, {}
+    return load, calls
+
+def _concurrent_misses(monkeypatch, tags, during):
+    monkeypatch.setitem(response_cache.ROUTE_TTLS, "/test/flight", (60, 0))
+    release = threading.Event()
+    load, calls = _blocking_loader(release, tags)
+    params = {"tag": tags[0]}
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(response_cache.cached, "/test/flight", params, load) for _ in range(4)]
+        # Let the first caller start loading and the others queue behind it
+        deadline = time.monotonic() + 5
+        while not calls and time.monotonic() < deadline:
+            time.sleep(0.005)
+        time.sleep(0.05)
+        during()
+        release.set()
+        responses = [future.result() for future in futures]
+    after = response_cache.cached("/test/flight", params, load)
+    return responses, calls, after
+
+def test_concurrent_misses_share_one_load(client, monkeypatch):
+    responses, calls, after = _concurrent_misses(
+        monkeypatch, ["flight:a"], lambda: response_cache.invalidate("post:999999", "unrelated")
+    )
+    assert len(calls) == 1
+    assert {response.body for response in responses} == {b'{"loads":1}'}
+    # The unrelated invalidation did not stop the result from being stored
+    assert after.headers["x-cache"] == "HIT"
+
+def test_invalidated_load_is_not_stored(client, monkeypatch):
+    responses, calls, after = _concurrent_misses(
+        monkeypatch, ["flight:b"], lambda: response_cache.invalidate("flight:b")
+    )
+    # The callers that were waiting reload once, together
+    assert len(calls) == 2
+    assert after.headers["x-cache"] == "HIT" and after.body == b'{"loads":2}'
@@ -0,0 +1,68 @@
+# Ranked full-text search over posts and users (search.py)
+import os
+import subprocess
+import sys
+
+from sqlalchemy import text
+
+from database import SessionLocal, engine
+from search import search_user_page
+from pagination import NEXT_CURSOR_HEADER
+
+def test_prefix_matching_and_bm25_order(client, users):
+    alice = users["alice"]
+    mention = client.post("/posts", headers=alice["headers"], json={"content": "A passing word on quokkaland"}).json()
+    tagged = client.post("/posts", headers=alice["headers"], json={"content": "Weekend trip", "tags": "quokkaland"}).json()
+    other = client.post("/posts", headers=alice["headers"], json={"content": "Nothing relevant"}).json()
+
+    found = [post["id"] for post in client.get("/search/posts?q=quokk", headers=alice["headers"]).json()]
+    # Tags weigh double - the tagged post ranks first
+    assert found == [tagged["id"], mention["id"]]
+    assert other["id"] not in found
+    # Every word must match; FTS5 syntax in the input is treated as text
+    assert client.get("/search/posts?q=quokk weekend", headers=alice["headers"]).json()[0]["id"] == tagged["id"]
+    assert client.get('/search/posts?q=quokk" OR "nothing', headers=alice["headers"]).status_code == 200
+
+def test_user_search_prefers_username(client, make_user):
+    named = make_user()
+    mentioned = make_user()
+    client.put("/profile", headers=mentioned["headers"], json={"bio": f"Friends with {named['username']}"})
+    found = [user["id"] for user in client.get(f"/search/users?q={named['username']}").json()]
+    assert found == [named["id"], mentioned["id"]]
+
+def test_cursor_pages(client, users):
+    alice = users["alice"]
+    ids = {client.post("/posts", headers=alice["headers"], json={"content": f"wombatpage number {i}"}).json()["id"]
+           for i in range(5)}
+    seen, cursor = [], None
+    while True:
+        url = "/search/posts?q=wombatpage&limit=2" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url, headers=alice["headers"])
+        seen += [post["id"] for post in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(ids)
+    assert client.get("/search/posts?q=wombatpage&cursor=garbage", headers=alice["headers"]).status_code == 400
+
+def test_limit_is_validated(client, users):
+    assert client.get("/search/users?q=alice&limit=0").status_code == 422
+    assert client.get("/search/posts?q=alice&limit=101", headers=users["alice"]["headers"]).status_code == 422
+    db = SessionLocal()
+    try:
+        assert search_user_page(db, "alice", limit=0) == ([], None)
+    finally:
+        db.close()
+
+# `python search.py` against the test database (TECHTALK_DATABASE_URL is inherited)
+def test_rebuild_command_restores_the_index(client, users):
+    alice = users["alice"]
+    post = client.post("/posts", headers=alice["headers"], json={"content": "platypusrebuild"}).json()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO posts_fts(posts_fts) VALUES ('delete-all')"))
+    assert client.get("/search/posts?q=platypusrebuild", headers=alice["headers"]).json() == []
+    result = subprocess.run([sys.executable, "search.py"], cwd=os.path.dirname(__file__),
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "Search index rebuilt" in result.stdout
+    assert [p["id"] for p in client.get("/search/posts?q=platypusrebuild", headers=alice["headers"]).json()] == [post["id"]]
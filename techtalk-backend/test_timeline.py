@@ -0,0 +1,63 @@
+# Home timelines: fan-out on write, pull path above TECHTALK_FANOUT_THRESHOLD
+import pytest
+
+import timeline
+from database import SessionLocal
+from models import TimelineEntry
+
+@pytest.fixture
+def threshold_one(monkeypatch):
+    # Two followers make an author a pull author
+    monkeypatch.setattr(timeline, "FANOUT_FOLLOWER_THRESHOLD", 1)
+
+def _post(client, user, content):
+    return client.post("/posts", headers=user["headers"], json={"content": content}).json()["id"]
+
+def _feed(client, user):
+    return [post["id"] for post in client.get("/feed", headers=user["headers"]).json()]
+
+def _timeline_readers(post_id):
+    db = SessionLocal()
+    try:
+        return sorted(r[0] for r in db.query(TimelineEntry.user_id).filter(TimelineEntry.post_id == post_id))
+    finally:
+        db.close()
+
+def test_fan_out_and_backfill(client, make_user):
+    author, reader = make_user(), make_user()
+    old = _post(client, author, "Before the follow")
+    client.post(f"/users/{author['id']}/follow", headers=reader["headers"])
+    new = _post(client, author, "After the follow")
+    assert _feed(client, reader) == [new, old]
+    assert _timeline_readers(new) == sorted([author["id"], reader["id"]])
+
+    client.delete(f"/users/{author['id']}/follow", headers=reader["headers"])
+    assert _feed(client, reader) == []
+
+def test_crossing_threshold_upward_keeps_pushed_posts(client, make_user, threshold_one):
+    author, first, second = make_user(), make_user(), make_user()
+    client.post(f"/users/{author['id']}/follow", headers=first["headers"])
+    pushed = _post(client, author, "Fanned out")
+    client.post(f"/users/{author['id']}/follow", headers=second["headers"])
+    pulled = _post(client, author, "Pulled")
+
+    # Not written to followers' timelines, read live instead - and no duplicates
+    assert _timeline_readers(pulled) == [author["id"]]
+    assert _feed(client, first) == [pulled, pushed]
+    assert _feed(client, second) == [pulled, pushed]
+
+def test_crossing_threshold_downward_keeps_pulled_posts(client, make_user, threshold_one):
+    author, first, second = make_user(), make_user(), make_user()
+    client.post(f"/users/{author['id']}/follow", headers=first["headers"])
+    client.post(f"/users/{author['id']}/follow", headers=second["headers"])
+    pulled = _post(client, author, "Made while pulled")
+    assert _feed(client, first) == [pulled]
+
+    client.delete(f"/users/{author['id']}/follow", headers=second["headers"])
+    assert _feed(client, first) == [pulled]
+    assert _timeline_readers(pulled) == sorted([author["id"], first["id"]])
+
+    # Back on fan-out
+    pushed = _post(client, author, "Fanned out again")
+    assert _feed(client, first) == [pushed, pulled]
+    assert _feed(client, second) == []
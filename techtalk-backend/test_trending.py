@@ -0,0 +1,65 @@
+# Trending tags: decayed bucket scores, windows, retagging, refresh on commit
+from datetime import datetime, timedelta
+
+import trending
+from database import SessionLocal
+from models import Post, TagBucket
+
+def _tags(client, window="1h"):
+    return {row["tag"]: row["count"] for row in client.get(f"/trending/tags?window={window}&limit=50").json()}
+
+def test_fresh_activity_outranks_older_volume(client):
+    now = datetime(2100, 1, 1, 12, 0)
+    db = SessionLocal()
+    try:
+        db.add_all([
+            TagBucket(tag="decayfresh", bucket_start=trending.bucket_start(now), count=3),
+            TagBucket(tag="decayold", bucket_start=trending.bucket_start(now - timedelta(hours=20)), count=5),
+        ])
+        db.flush()
+        day = {row["tag"]: row for row in trending.compute_top(db, "24h", now)}
+        assert day["decayfresh"]["score"] > day["decayold"]["score"]
+        assert day["decayold"]["count"] == 5
+        assert [row["tag"] for row in trending.compute_top(db, "1h", now)] == ["decayfresh"]
+    finally:
+        db.rollback()
+        db.close()
+
+def test_unknown_window_is_rejected(client):
+    assert client.get("/trending/tags?window=2h").status_code == 400
+    assert client.get("/trending/tags?window=7d").status_code == 200
+
+def test_new_and_retagged_posts_show_up(client, users, monkeypatch):
+    monkeypatch.setattr(trending, "MIN_REFRESH_SECONDS", 0)
+    alice = users["alice"]
+    post = client.post("/posts", headers=alice["headers"], json={"content": "Tagged", "tags": "retagold, retagshared"}).json()
+    tags = _tags(client)
+    assert tags["retagold"] == 1 and tags["retagshared"] == 1
+
+    client.put(f"/posts/{post['id']}", headers=alice["headers"], json={"content": "Tagged", "tags": "retagnew,retagshared"})
+    tags = _tags(client)
+    assert "retagold" not in tags
+    assert tags["retagnew"] == 1 and tags["retagshared"] == 1
+
+    client.delete(f"/posts/{post['id']}", headers=alice["headers"])
+    assert not {"retagnew", "retagshared"} & set(_tags(client))
+
+def test_dirty_only_after_commit(users):
+    db = SessionLocal()
+    try:
+        post = Post(user_id=users["alice"]["id"], content="Uncommitted", tags="dirtycheck", timestamp=datetime.utcnow())
+        db.add(post)
+        db.flush()
+        trending._dirty.clear()
+        trending.index_post_tags(db, post)
+        assert not trending._dirty
+        db.rollback()
+        assert not trending._dirty
+
+        db.add(post)
+        db.flush()
+        trending.index_post_tags(db, post)
+        db.commit()
+        assert trending._dirty == set(trending.WINDOWS)
+    finally:
+        db.close()
@@ -0,0 +1,46 @@
+# /trending/users - ordered by followers_count, refreshed on follow and unfollow
+from sqlalchemy import func
+
+from database import SessionLocal
+from models import User
+
+def _top_followers():
+    db = SessionLocal()
+    try:
+        return db.query(func.max(User.followers_count)).scalar() or 0
+    finally:
+        db.close()
+
+def _trending(client, limit=3):
+    return [user["id"] for user in client.get("/trending/users", params={"limit": limit}).json()]
+
+def test_most_followed_users_lead(client, make_user, query_budget):
+    # Enough followers to beat anything the other tests have built
+    top = _top_followers()
+    star, runner_up = make_user(), make_user()
+    fans = [make_user() for _ in range(top + 3)]
+    for fan in fans:
+        client.post(f"/users/{star['id']}/follow", headers=fan["headers"])
+    for fan in fans[:top + 2]:
+        client.post(f"/users/{runner_up['id']}/follow", headers=fan["headers"])
+
+    response = query_budget("GET", "/trending/users", 1, params={"limit": 2})
+    assert [user["id"] for user in response.json()] == [star["id"], runner_up["id"]]
+    assert _trending(client, limit=1) == [star["id"]]
+
+    # Unfollows reorder the list without waiting for a cache expiry
+    for fan in fans[:2]:
+        client.delete(f"/users/{star['id']}/follow", headers=fan["headers"])
+    assert _trending(client, limit=2) == [runner_up["id"], star["id"]]
+
+def test_ties_prefer_the_newer_user(client, make_user):
+    top = _top_followers()
+    older, newer = make_user(), make_user()
+    for fan in [make_user() for _ in range(top + 1)]:
+        client.post(f"/users/{older['id']}/follow", headers=fan["headers"])
+        client.post(f"/users/{newer['id']}/follow", headers=fan["headers"])
+    assert _trending(client, limit=2) == [newer["id"], older["id"]]
+
+def test_users_without_followers_are_not_trending(client, make_user):
+    loner = make_user()
+    assert loner["id"] not in _trending(client, limit=100)
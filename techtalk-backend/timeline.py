@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# Materialized home timelines - fan-out-on-write with a pull path for big accounts
+import os
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select, literal, true
+
+from models import User, Post, Follower, TimelineEntry
+from engagement import post_query
+from pagination import keyset_desc
+
+# Authors with more followers than this are not fanned out; their posts are
+# pulled into readers' feeds at read time instead
+FANOUT_FOLLOWER_THRESHOLD = int(os.getenv("TECHTALK_FANOUT_THRESHOLD", "1000"))
+
+# How many of a newly followed user's recent posts get copied into the timeline
+BACKFILL_LIMIT = 200
+
+def is_pull_author(db: Session, user_id: int) -> bool:
+    count = db.query(User.followers_count).filter(User.id == user_id).scalar()
+    return (count or 0) > FANOUT_FOLLOWER_THRESHOLD
+
+# Followed accounts of `user_id` that are served by the pull path
+def pull_author_ids(db: Session, user_id: int):
+    rows = db.query(Follower.followed_id).join(User, User.id == Follower.followed_id).filter(
+        Follower.follower_id == user_id, User.followers_count > FANOUT_FOLLOWER_THRESHOLD
+    ).all()
+    return [r[0] for r in rows]
+
+def _entry_columns():
+    return [TimelineEntry.user_id, TimelineEntry.post_id, TimelineEntry.author_id, TimelineEntry.timestamp]
+
+# New post: one INSERT ... SELECT into the author's and every follower's timeline.
+# Big accounts only write their own entry.
+def fan_out_post(db: Session, post: Post):
+    db.add(TimelineEntry(user_id=post.user_id, post_id=post.id, author_id=post.user_id, timestamp=post.timestamp))
+    if is_pull_author(db, post.user_id):
+        return
+    readers = select(
+        Follower.follower_id, literal(post.id), literal(post.user_id), literal(post.timestamp)
+    ).where(Follower.followed_id == post.user_id)
+    db.execute(insert(TimelineEntry).from_select(_entry_columns(), readers))
+
+def remove_post(db: Session, post_id: int):
+    db.query(TimelineEntry).filter(TimelineEntry.post_id == post_id).delete(synchronize_session=False)
+
+# New follow: copy the followed user's recent posts in (pull authors are read live)
+def backfill(db: Session, follower_id: int, followed_id: int):
+    if is_pull_author(db, followed_id):
+        return
+    recent = select(
+        literal(follower_id), Post.id, Post.user_id, Post.timestamp
+    ).where(Post.user_id == followed_id).order_by(Post.timestamp.desc()).limit(BACKFILL_LIMIT)
+    db.execute(insert(TimelineEntry).from_select(_entry_columns(), recent))
+
+# Author back at the threshold after an unfollow: they are fanned out again,
+# so copy their recent posts - including the ones made on the pull path,
+# which no follower timeline holds - into every follower's timeline
+def rejoin_fan_out(db: Session, author_id: int):
+    count = db.query(User.followers_count).filter(User.id == author_id).scalar()
+    if count != FANOUT_FOLLOWER_THRESHOLD:
+        return
+    recent = select(Post.id, Post.timestamp).where(Post.user_id == author_id).order_by(
+        Post.timestamp.desc()
+    ).limit(BACKFILL_LIMIT).subquery()
+    already = select(TimelineEntry.id).where(
+        TimelineEntry.user_id == Follower.follower_id, TimelineEntry.post_id == recent.c.id
+    ).exists()
+    missing = select(
+        Follower.follower_id, recent.c.id, literal(author_id), recent.c.timestamp
+    ).join_from(Follower, recent, true()).where(Follower.followed_id == author_id, ~already)
+    db.execute(insert(TimelineEntry).from_select(_entry_columns(), missing))
+
+# Unfollow: drop the followed user's posts from the timeline
+def prune(db: Session, follower_id: int, followed_id: int):
+    db.query(TimelineEntry).filter(
+        TimelineEntry.user_id == follower_id, TimelineEntry.author_id == followed_id
+    ).delete(synchronize_session=False)
+
+# Newest-first page of a user's home feed: an indexed range scan over their
+# timeline, merged with the newest posts of any followed pull authors
+def read_timeline(db: Session, user_id: int, cursor=None, skip: int = 0, limit: int = 50):
+    window = limit if cursor else skip + limit
+    pushed = keyset_desc(
+        db.query(TimelineEntry.timestamp, TimelineEntry.post_id).filter(TimelineEntry.user_id == user_id),
+        TimelineEntry.timestamp, TimelineEntry.post_id, cursor
+    ).limit(window).all()
+
+    pulled = []
+    pull_ids = pull_author_ids(db, user_id)
+    if pull_ids:
+        pulled = keyset_desc(
+            db.query(Post.timestamp, Post.id).filter(Post.user_id.in_(pull_ids)),
+            Post.timestamp, Post.id, cursor
+        ).limit(window).all()
+
+    # An author can cross the threshold after their posts were fanned out - dedupe
+    keys = sorted(set(pushed) | set(pulled), reverse=True)
+    page_ids = [post_id for _, post_id in keys[0 if cursor else skip:][:limit]]
+    if not page_ids:
+        return []
+    posts = {p.id: p for p in post_query(db).filter(Post.id.in_(page_ids)).all()}
+    return [posts[post_id] for post_id in page_ids if post_id in posts]
+
+# Rebuild every timeline from the follow graph (existing databases, repairs)
+def rebuild_timelines(db: Session):
+    db.query(TimelineEntry).delete(synchronize_session=False)
+    own = select(Post.user_id, Post.id, Post.user_id, Post.timestamp)
+    db.execute(insert(TimelineEntry).from_select(_entry_columns(), own))
+
+    big_accounts = select(User.id).where(User.followers_count > FANOUT_FOLLOWER_THRESHOLD)
+    followed = select(
+        Follower.follower_id, Post.id, Post.user_id, Post.timestamp
+    ).join(Post, Post.user_id == Follower.followed_id).where(
+        Follower.followed_id.notin_(big_accounts)
+    )
+    db.execute(insert(TimelineEntry).from_select(_entry_columns(), followed))
+    db.commit()
+    return db.query(func.count(TimelineEntry.id)).scalar()
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt timelines: {rebuild_timelines(db)} entries")
+    finally:
+        db.close()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# Trending tags - normalized tags, rolling time-bucketed counters and a cached top-K
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from sqlalchemy import event, func
+from sqlalchemy.dialects.sqlite import insert
+
+from models import Post, PostTag, TagBucket
+
+BUCKET = timedelta(minutes=10)
+
+# Window name -> (span, decay half-life). A post's weight halves every
+# half-life, so fresh activity outranks the tail of the window.
+WINDOWS = {
+    "1h": (timedelta(hours=1), timedelta(minutes=15)),
+    "24h": (timedelta(hours=24), timedelta(hours=6)),
+    "7d": (timedelta(days=7), timedelta(days=1)),
+}
+DEFAULT_WINDOW = "24h"
+RETENTION = max(span for span, _ in WINDOWS.values()) + BUCKET
+
+TOP_K = 50
+REFRESH_SECONDS = 30
+# A dirty top-K is recomputed at most this often under a stream of writes
+MIN_REFRESH_SECONDS = 1
+
+def parse_tags(tags: str):
+    seen = []
+    for tag in (tags or "").split(","):
+        tag = tag.strip()
+        if tag and tag not in seen:
+            seen.append(tag)
+    return seen
+
+def bucket_start(ts: datetime) -> datetime:
+    epoch = datetime(1970, 1, 1)
+    step = int(BUCKET.total_seconds())
+    return epoch + timedelta(seconds=int((ts - epoch).total_seconds()) // step * step)
+
+def _bump_bucket(db: Session, tag: str, start: datetime, delta: int):
+    if delta > 0:
+        stmt = insert(TagBucket).values(tag=tag, bucket_start=start, count=delta)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["tag", "bucket_start"],
+            set_={"count": TagBucket.count + delta},
+        ))
+    else:
+        # Buckets past retention are pruned - never resurrect them as negatives
+        db.query(TagBucket).filter(
+            TagBucket.tag == tag, TagBucket.bucket_start == start
+        ).update({TagBucket.count: TagBucket.count + delta}, synchronize_session=False)
+
+# Post created (or tags edited): add its tags, in the caller's transaction.
+# The cached top-K is marked dirty when that transaction commits.
+def index_post_tags(db: Session, post: Post):
+    prune_buckets(db)
+    start = bucket_start(post.timestamp)
+    for tag in parse_tags(post.tags):
+        db.add(PostTag(post_id=post.id, tag=tag, timestamp=post.timestamp))
+        _bump_bucket(db, tag, start, 1)
+    db.info["trending_dirty"] = True
+
+# Post deleted (or tags edited): take its tags back out
+def unindex_post_tags(db: Session, post: Post):
+    start = bucket_start(post.timestamp)
+    rows = db.query(PostTag.tag).filter(PostTag.post_id == post.id).all()
+    for (tag,) in rows:
+        _bump_bucket(db, tag, start, -1)
+    db.query(PostTag).filter(PostTag.post_id == post.id).delete(synchronize_session=False)
+    db.info["trending_dirty"] = True
+
+def reindex_post_tags(db: Session, post: Post):
+    unindex_post_tags(db, post)
+    index_post_tags(db, post)
+
+# Decayed score per tag over the buckets inside one window
+def compute_top(db: Session, window: str, now: datetime = None):
+    span, half_life = WINDOWS[window]
+    now = now or datetime.utcnow()
+    rows = db.query(TagBucket.tag, TagBucket.bucket_start, TagBucket.count).filter(
+        TagBucket.bucket_start >= bucket_start(now - span), TagBucket.count > 0
+    ).all()
+    scores, counts = {}, {}
+    for tag, start, count in rows:
+        age = max((now - (start + BUCKET / 2)).total_seconds(), 0)
+        scores[tag] = scores.get(tag, 0.0) + count * math.pow(0.5, age / half_life.total_seconds())
+        counts[tag] = counts.get(tag, 0) + count
+    ranked = sorted(scores, key=lambda tag: (-scores[tag], tag))[:TOP_K]
+    return [{"tag": tag, "count": counts[tag], "score": round(scores[tag], 4)} for tag in ranked]
+
+def prune_buckets(db: Session, now: datetime = None):
+    cutoff = bucket_start((now or datetime.utcnow()) - RETENTION)
+    db.query(TagBucket).filter(TagBucket.bucket_start < cutoff).delete(synchronize_session=False)
+
+# Top-K per window, recomputed from tag_buckets at most every REFRESH_SECONDS
+# or after a write marked it dirty; readers get the cached list
+_cache = {}
+_dirty = set(WINDOWS)
+_lock = threading.Lock()
+
+def mark_dirty():
+    _dirty.update(WINDOWS)
+
+# Only once the tag change is committed - marking earlier lets a concurrent
+# refresh clear the flag and cache a top-K without it
+@event.listens_for(Session, "after_commit")
+def _dirty_after_commit(session):
+    if session.info.pop("trending_dirty", False):
+        mark_dirty()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("trending_dirty", None)
+
+def trending_tags(db: Session, window: str = DEFAULT_WINDOW, limit: int = 10):
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(window)
+        stale = cached is None or now - cached[0] >= REFRESH_SECONDS
+        if stale or (window in _dirty and now - cached[0] >= MIN_REFRESH_SECONDS):
+            _dirty.discard(window)
+            cached = (now, compute_top(db, window))
+            _cache[window] = cached
+    return cached[1][:limit]
+
+# Rebuild post_tags and tag_buckets from Post.tags (existing databases, repairs)
+def rebuild_tags(db: Session):
+    db.query(PostTag).delete(synchronize_session=False)
+    db.query(TagBucket).delete(synchronize_session=False)
+    cutoff = datetime.utcnow() - RETENTION
+    buckets = {}
+    for post_id, tags, timestamp in db.query(Post.id, Post.tags, Post.timestamp).yield_per(1000):
+        for tag in parse_tags(tags):
+            db.add(PostTag(post_id=post_id, tag=tag, timestamp=timestamp))
+            if timestamp >= cutoff:
+                key = (tag, bucket_start(timestamp))
+                buckets[key] = buckets.get(key, 0) + 1
+    db.add_all(TagBucket(tag=tag, bucket_start=start, count=count) for (tag, start), count in buckets.items())
+    db.commit()
+    mark_dirty()
+    return db.query(func.count(PostTag.id)).scalar()
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt tag index: {rebuild_tags(db)} post tags")
+    finally:
+        db.close()
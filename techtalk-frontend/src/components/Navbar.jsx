@@ -2,19 +2,30 @@
 import { useState, useEffect, useContext } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { AuthContext } from '../context/AuthContext';
-import api from '../utils/api';
+import api, { API_URL } from '../utils/api';
 
 const Navbar = () => {
   const { user, logout } = useContext(AuthContext);
   const navigate = useNavigate();
   const [unreadCount, setUnreadCount] = useState(0);
 
+  // Unread count is pushed over Server-Sent Events; fall back to polling
+  // only if the browser has no EventSource
   useEffect(() => {
-    if (user) {
+    if (!user) return;
+    const token = localStorage.getItem('token');
+    if (typeof EventSource === 'undefined' || !token) {
       loadUnreadCount();
       const interval = setInterval(loadUnreadCount, 30000);
       return () => clearInterval(interval);
     }
+
+    const source = new EventSource(`${API_URL}/notifications/stream?token=${encodeURIComponent(token)}`);
+    source.addEventListener('unread_count', (event) => {
+      setUnreadCount(JSON.parse(event.data).unread_count);
+    });
+    source.addEventListener('resync', loadUnreadCount);
+    return () => source.close();
   }, [user]);
 
   const loadUnreadCount = async () => {
@@ -1,9 +1,9 @@
 // Messages page - Direct messaging
-import { useState, useEffect, useContext } from 'react';
+import { useState, useEffect, useContext, useRef } from 'react';
 import { Link, Navigate } from 'react-router-dom';
 import { AuthContext } from '../context/AuthContext';
 import { formatDate } from '../utils/date';
-import api from '../utils/api';
+import api, { API_URL } from '../utils/api';
 import LoginRequired from './LoginRequired';
 
 const Messages = () => {
@@ -12,6 +12,8 @@ const Messages = () => {
   const [selectedUser, setSelectedUser] = useState(null);
   const [messages, setMessages] = useState([]);
   const [newMessage, setNewMessage] = useState('');
+  const socketRef = useRef(null);
+  const selectedRef = useRef(null);
 
   if (!user) {
     return <LoginRequired />;
@@ -21,6 +23,46 @@ const Messages = () => {
     loadConversations();
   }, []);
 
+  useEffect(() => {
+    selectedRef.current = selectedUser;
+  }, [selectedUser]);
+
+  // Live messages and read receipts over /ws/messages; REST is the fallback
+  useEffect(() => {
+    const token = localStorage.getItem('token');
+    if (typeof WebSocket === 'undefined' || !token) return;
+
+    const socket = new WebSocket(`${API_URL.replace(/^http/, 'ws')}/ws/messages?token=${encodeURIComponent(token)}`);
+    socket.onmessage = (event) => {
+      const frame = JSON.parse(event.data);
+      const partner = selectedRef.current;
+      if (frame.type === 'message') {
+        const msg = frame.message;
+        const partnerId = msg.sender_id === user.id ? msg.receiver_id : msg.sender_id;
+        if (partner && partner.id === partnerId) {
+          setMessages((prev) => (prev.some((m) => m.id === msg.id) ? prev : [...prev, msg]));
+          if (msg.sender_id === partnerId) {
+            socket.send(JSON.stringify({ type: 'read', partner_id: partnerId }));
+          }
+        }
+        loadConversations();
+      } else if (frame.type === 'read') {
+        if (partner && frame.reader_id === partner.id) {
+          setMessages((prev) => prev.map((m) => (m.sender_id === user.id ? { ...m, read: true } : m)));
+        }
+      } else if (frame.type === 'resync') {
+        loadConversations();
+        if (partner) loadMessages(partner.id);
+      }
+    };
+    socketRef.current = socket;
+
+    return () => {
+      socketRef.current = null;
+      socket.close();
+    };
+  }, []);
+
   const loadConversations = async () => {
     try {
       const response = await api.get('/messages/conversations');
@@ -48,13 +90,21 @@ const Messages = () => {
     e.preventDefault();
     if (!newMessage.trim() || !selectedUser) return;
 
+    const socket = socketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      // The server echoes the stored message back on this socket
+      socket.send(JSON.stringify({ type: 'send', receiver_id: selectedUser.id, content: newMessage }));
+      setNewMessage('');
+      return;
+    }
+
     try {
-      await api.post('/messages', {
+      const response = await api.post('/messages', {
         receiver_id: selectedUser.id,
         content: newMessage
       });
       setNewMessage('');
-      loadMessages(selectedUser.id);
+      setMessages((prev) => (prev.some((m) => m.id === response.data.id) ? prev : [...prev, response.data]));
       loadConversations();
     } catch (error) {
       console.error('Error sending message:', error);